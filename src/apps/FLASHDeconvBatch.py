@@ -0,0 +1,262 @@
+"""
+Headless FLASHDeconv annotation of a whole run. For every spectrum of the
+selected MS level, all listed masses eluting at its RT are matched
+(all charges and isotopes) and every matched peak is written as one row:
+
+    FLASHDeconvBatch.py run.mzML masses.tsv annotations.tsv
+
+Spectra are streamed from the mzML file and annotated in a process pool,
+the output is written chunk by chunk in spectrum order. Output files
+ending with .parquet are written with pyarrow (if installed).
+"""
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# runs from any directory, without the Qt stack of the viewer
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "view"))
+from MassMatching import DEFAULT_TOL, MassList, initMatchWorker, matchSpectrum
+
+CHUNK_SIZE = 16  # spectra per process pool job
+MAX_PENDING = 8  # jobs in flight per worker, bounds the memory
+
+# output columns with their dtype and TSV format
+COLUMNS = (
+    ("ScanIndex", np.int64, "%d"),
+    ("RetentionTime", np.float64, "%.4f"),
+    ("MonoisotopicMass", np.float64, "%.6f"),
+    ("Charge", np.int64, "%d"),
+    ("Isotope", np.int64, "%d"),
+    ("PeakMZ", np.float64, "%.6f"),
+    ("Intensity", np.float64, "%.6g"),
+    ("PPMError", np.float64, "%.3f"),
+    ("IsotopeScore", np.float64, "%.4f"),
+)
+
+
+def _annotateChunk(jobs):
+    """
+    Matches the masses eluting at each spectrum of the chunk, runs inside
+    a worker process. Returns the rows of all matched peaks as columns.
+
+    """
+    parts = []
+    for spec_index, rt, mzs, ints in jobs:
+        masses, matches, scores = matchSpectrum(rt, mzs, ints)
+        n = matches.peak_index.size
+        parts.append((
+            np.full(n, spec_index),
+            np.full(n, rt),
+            masses[matches.mass_index],
+            matches.charges,
+            matches.isotopes,
+            matches.mz,
+            matches.intensity,
+            matches.ppm,
+            scores.score[matches.mass_index],
+        ))
+    return {
+        name: np.concatenate([p[i] for p in parts]).astype(dtype)
+        if parts else np.array([], dtype=dtype)
+        for i, (name, dtype, _) in enumerate(COLUMNS)
+    }
+
+
+class TSVTableWriter:
+    def __init__(self, file_path):
+        self.out = open(file_path, "w")
+        self.out.write("\t".join(c[0] for c in COLUMNS) + "\n")
+
+    def write(self, columns):
+        rows = zip(*(columns[name] for name, _, _ in COLUMNS))
+        fmt = "\t".join(c[2] for c in COLUMNS) + "\n"
+        self.out.writelines(fmt % row for row in rows)
+
+    def close(self):
+        self.out.close()
+
+
+class ParquetTableWriter:
+    # every chunk becomes a row group of the parquet file
+    def __init__(self, file_path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                "Writing .parquet files requires pyarrow") from None
+
+        self.pa = pyarrow
+        schema = pyarrow.schema(
+            [(name, pyarrow.from_numpy_dtype(dtype))
+             for name, dtype, _ in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(file_path, schema)
+
+    def write(self, columns):
+        self.writer.write_table(self.pa.table(
+            {name: columns[name] for name, _, _ in COLUMNS}))
+
+    def close(self):
+        self.writer.close()
+
+
+class SpectrumStreamConsumer:
+    """
+    Consumer for MzMLFile.transform, collects the peaks of the spectra of
+    one MS level into jobs and hands each full job to a callback.
+
+    """
+
+    def __init__(self, ms_level, on_chunk):
+        self.ms_level = ms_level
+        self.on_chunk = on_chunk
+        self.index = 0
+        self.jobs = []
+
+    def setExpectedSize(self, n_spectra, n_chromatograms):
+        pass
+
+    def setExperimentalSettings(self, settings):
+        pass
+
+    def consumeChromatogram(self, chromatogram):
+        pass
+
+    def consumeSpectrum(self, spec):
+        if spec.getMSLevel() == self.ms_level:
+            mzs, ints = spec.get_peaks()
+            self.jobs.append((self.index, spec.getRT(),
+                              np.asarray(mzs), np.asarray(ints)))
+            if len(self.jobs) >= CHUNK_SIZE:
+                self.flush()
+        self.index += 1
+
+    def flush(self):
+        if self.jobs:
+            self.on_chunk(self.jobs)
+            self.jobs = []
+
+
+def annotateRun(mzml_path, mass_path, out_path, tolerance=DEFAULT_TOL,
+                cs_range=(2, 100), ms_level=1, is_avg=False,
+                max_workers=None):
+    """
+    Annotates all spectra of an MS level with the masses of a mass list
+    and writes the matched peaks incrementally.
+
+    Parameters
+    ----------
+    mzml_path : str
+        The mzML file, streamed spectrum by spectrum
+
+    mass_path : str
+        A FLASHDeconv result file or a plain mass list
+
+    out_path : str
+        The output table (.tsv or .parquet)
+
+    tolerance : float
+        The m/z tolerance in ppm
+
+    cs_range : list of two ints
+        The minimum and maximum charge state
+
+    ms_level : int
+        Only spectra of this MS level are annotated
+
+    is_avg : bool
+        The plain mass list contains average masses
+
+    max_workers : int or None
+        Number of worker processes, default is the number of CPUs
+
+    Returns
+    -------
+    int
+        The number of written rows
+
+    """
+    import pyopenms  # imported on first use, slow to import
+
+    mass_list = MassList(mass_path, is_avg)
+    masses = np.array(mass_list.mass_list, dtype=np.float64)
+    starts = np.zeros(masses.size)
+    ends = np.full(masses.size, float(sys.maxsize))
+    if mass_list.isFDresult:
+        starts = mass_list.columns["StartRetentionTime"].astype(np.float64)
+        ends = mass_list.columns["EndRetentionTime"].astype(np.float64)
+
+    if str(out_path).endswith(".parquet"):
+        writer = ParquetTableWriter(out_path)
+    else:
+        writer = TSVTableWriter(out_path)
+
+    pending = deque()
+    n_rows = 0
+
+    def writeNext():
+        nonlocal n_rows
+        columns = pending.popleft().result()
+        writer.write(columns)
+        n_rows += columns["ScanIndex"].size
+
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=initMatchWorker,
+        initargs=(masses, starts, ends, tuple(cs_range), tolerance),
+    )
+    max_pending = MAX_PENDING * (max_workers or os.cpu_count() or 1)
+
+    def submit(jobs):
+        pending.append(executor.submit(_annotateChunk, jobs))
+        # results are written in order, the oldest job is waited for
+        while len(pending) > max_pending:
+            writeNext()
+
+    try:
+        consumer = SpectrumStreamConsumer(ms_level, submit)
+        pyopenms.MzMLFile().transform(mzml_path.encode(), consumer)
+        consumer.flush()
+        while pending:
+            writeNext()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Annotates all spectra of a run with FLASHDeconv "
+                    "masses and writes the matched peaks as table.")
+    parser.add_argument("mzml", help="input mzML file")
+    parser.add_argument("masses", help="FLASHDeconv result or mass list")
+    parser.add_argument("out", help="output .tsv or .parquet file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOL,
+                        help="m/z tolerance in ppm")
+    parser.add_argument("--min-charge", type=int, default=2)
+    parser.add_argument("--max-charge", type=int, default=100)
+    parser.add_argument("--ms-level", type=int, default=1)
+    parser.add_argument("--average", action="store_true",
+                        help="the mass list contains average masses")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    n_rows = annotateRun(
+        args.mzml, args.masses, args.out,
+        tolerance=args.tolerance,
+        cs_range=(args.min_charge, args.max_charge),
+        ms_level=args.ms_level,
+        is_avg=args.average,
+        max_workers=args.workers,
+    )
+    print("%d matched peaks written to %s" % (n_rows, args.out))
+
+
+if __name__ == "__main__":
+    main()
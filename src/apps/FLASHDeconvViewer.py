@@ -3,12 +3,17 @@ import sys
 from collections import namedtuple
 
 import numpy as np
-import pandas as pd
 import pyqtgraph as pg
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import (
+    Qt,
+    QLineF,
+    QRectF,
+    QAbstractTableModel,
+    QModelIndex,
+    pyqtSignal,
+)
 from PyQt5.QtGui import (
-    QStandardItemModel,
-    QStandardItem,
+    QPicture,
     QPainter,
     QIcon,
     QBrush,
@@ -38,25 +43,22 @@ from PyQt5.QtWidgets import (
     QFormLayout,
     QDialogButtonBox,
 )
-from matplotlib import cm
 from pyqtgraph import PlotWidget
 
 sys.path.insert(0, "../view")
 from SpecViewer import ScanBrowserWidget, App
-
-# import pyopenms.Constants
-# define Constant locally until bug in pyOpenMS is fixed
-PROTON_MASS_U = 1.0072764667710
-C13C12_MASSDIFF_U = 1.0033548378
-
-# structure for each input masses
-MassDataStruct = namedtuple(
-    "MassDataStruct",
-    "mz_theo_arr \
-                            startRT endRT maxIntensity scanCount \
-                            color marker",
+from FileLoader import FileLoaderMixin
+from IsotopeScoring import AveragineModel, supportedCharges
+from MassMatching import (
+    DEFAULT_TOL,
+    MassList,
+    RTIntervalIndex,
+    matchTheoreticalPeaks,
+    scoreExperiment,
+    scoreMassStructs,
+    writeScores,
 )
-#                            isMono isAvg
+
 PeakAnnoStruct = namedtuple(
     "PeakAnnoStruct",
     "mz intensity text_label \
@@ -67,113 +69,119 @@ LadderAnnoStruct = namedtuple(
     "mz_list \
                             text_label_list color",
 )
-TOL = 1e-5  # ppm
-
-SymbolSet = ("o", "s", "t", "t1", "t2", "t3", "d", "p", "star")
-RGBs = [
-    [0, 0, 200],
-    [0, 128, 0],
-    [19, 234, 201],
-    [195, 46, 212],
-    [237, 177, 32],
-    [54, 55, 55],
-    [0, 114, 189],
-    [217, 83, 25],
-    [126, 47, 142],
-    [119, 172, 48],
-]
-Symbols = pg.graphicsItems.ScatterPlotItem.Symbols
+# per scan rows of the mass table, arrays in the order of the masses
+MassTableStruct = namedtuple(
+    "MassTableStruct",
+    "masses mass_structs intensity min_charge max_charge score",
+)
 
+# matplotlib's plasma colormap as 8 bit RGB lookup table
+PLASMA_LUT = np.array([
+    [12, 7, 134], [16, 7, 135], [19, 6, 137], [21, 6, 138],
+    [24, 6, 139], [27, 6, 140], [29, 6, 141], [31, 5, 142],
+    [33, 5, 143], [35, 5, 144], [37, 5, 145], [39, 5, 146],
+    [41, 5, 147], [43, 5, 148], [45, 4, 148], [47, 4, 149],
+    [49, 4, 150], [51, 4, 151], [52, 4, 152], [54, 4, 152],
+    [56, 4, 153], [58, 4, 154], [59, 3, 154], [61, 3, 155],
+    [63, 3, 156], [64, 3, 156], [66, 3, 157], [68, 3, 158],
+    [69, 3, 158], [71, 2, 159], [73, 2, 159], [74, 2, 160],
+    [76, 2, 161], [78, 2, 161], [79, 2, 162], [81, 1, 162],
+    [82, 1, 163], [84, 1, 163], [86, 1, 163], [87, 1, 164],
+    [89, 1, 164], [90, 0, 165], [92, 0, 165], [94, 0, 165],
+    [95, 0, 166], [97, 0, 166], [98, 0, 166], [100, 0, 167],
+    [101, 0, 167], [103, 0, 167], [104, 0, 167], [106, 0, 167],
+    [108, 0, 168], [109, 0, 168], [111, 0, 168], [112, 0, 168],
+    [114, 0, 168], [115, 0, 168], [117, 0, 168], [118, 1, 168],
+    [120, 1, 168], [121, 1, 168], [123, 2, 168], [124, 2, 167],
+    [126, 3, 167], [127, 3, 167], [129, 4, 167], [130, 4, 167],
+    [132, 5, 166], [133, 6, 166], [134, 7, 166], [136, 7, 165],
+    [137, 8, 165], [139, 9, 164], [140, 10, 164], [142, 12, 164],
+    [143, 13, 163], [144, 14, 163], [146, 15, 162], [147, 16, 161],
+    [149, 17, 161], [150, 18, 160], [151, 19, 160], [153, 20, 159],
+    [154, 21, 158], [155, 23, 158], [157, 24, 157], [158, 25, 156],
+    [159, 26, 155], [160, 27, 155], [162, 28, 154], [163, 29, 153],
+    [164, 30, 152], [165, 31, 151], [167, 33, 151], [168, 34, 150],
+    [169, 35, 149], [170, 36, 148], [172, 37, 147], [173, 38, 146],
+    [174, 39, 145], [175, 40, 144], [176, 42, 143], [177, 43, 143],
+    [178, 44, 142], [180, 45, 141], [181, 46, 140], [182, 47, 139],
+    [183, 48, 138], [184, 50, 137], [185, 51, 136], [186, 52, 135],
+    [187, 53, 134], [188, 54, 133], [189, 55, 132], [190, 56, 131],
+    [191, 57, 130], [192, 59, 129], [193, 60, 128], [194, 61, 128],
+    [195, 62, 127], [196, 63, 126], [197, 64, 125], [198, 65, 124],
+    [199, 66, 123], [200, 68, 122], [201, 69, 121], [202, 70, 120],
+    [203, 71, 119], [204, 72, 118], [205, 73, 117], [206, 74, 117],
+    [207, 75, 116], [208, 77, 115], [209, 78, 114], [209, 79, 113],
+    [210, 80, 112], [211, 81, 111], [212, 82, 110], [213, 83, 109],
+    [214, 85, 109], [215, 86, 108], [215, 87, 107], [216, 88, 106],
+    [217, 89, 105], [218, 90, 104], [219, 91, 103], [220, 93, 102],
+    [220, 94, 102], [221, 95, 101], [222, 96, 100], [223, 97, 99],
+    [223, 98, 98], [224, 100, 97], [225, 101, 96], [226, 102, 96],
+    [227, 103, 95], [227, 104, 94], [228, 106, 93], [229, 107, 92],
+    [229, 108, 91], [230, 109, 90], [231, 110, 90], [232, 112, 89],
+    [232, 113, 88], [233, 114, 87], [234, 115, 86], [234, 116, 85],
+    [235, 118, 84], [236, 119, 84], [236, 120, 83], [237, 121, 82],
+    [237, 123, 81], [238, 124, 80], [239, 125, 79], [239, 126, 78],
+    [240, 128, 77], [240, 129, 77], [241, 130, 76], [242, 132, 75],
+    [242, 133, 74], [243, 134, 73], [243, 135, 72], [244, 137, 71],
+    [244, 138, 71], [245, 139, 70], [245, 141, 69], [246, 142, 68],
+    [246, 143, 67], [246, 145, 66], [247, 146, 65], [247, 147, 65],
+    [248, 149, 64], [248, 150, 63], [248, 152, 62], [249, 153, 61],
+    [249, 154, 60], [250, 156, 59], [250, 157, 58], [250, 159, 58],
+    [250, 160, 57], [251, 162, 56], [251, 163, 55], [251, 164, 54],
+    [252, 166, 53], [252, 167, 53], [252, 169, 52], [252, 170, 51],
+    [252, 172, 50], [252, 173, 49], [253, 175, 49], [253, 176, 48],
+    [253, 178, 47], [253, 179, 46], [253, 181, 45], [253, 182, 45],
+    [253, 184, 44], [253, 185, 43], [253, 187, 43], [253, 188, 42],
+    [253, 190, 41], [253, 192, 41], [253, 193, 40], [253, 195, 40],
+    [253, 196, 39], [253, 198, 38], [252, 199, 38], [252, 201, 38],
+    [252, 203, 37], [252, 204, 37], [252, 206, 37], [251, 208, 36],
+    [251, 209, 36], [251, 211, 36], [250, 213, 36], [250, 214, 36],
+    [250, 216, 36], [249, 217, 36], [249, 219, 36], [248, 221, 36],
+    [248, 223, 36], [247, 224, 36], [247, 226, 37], [246, 228, 37],
+    [246, 229, 37], [245, 231, 38], [245, 233, 38], [244, 234, 38],
+    [243, 236, 38], [243, 238, 38], [242, 240, 38], [242, 241, 38],
+    [241, 243, 38], [240, 245, 37], [240, 246, 35], [239, 248, 33],
+], dtype=np.ubyte)
 
-class MassList:
-    def __init__(self, file_path):
-        if not file_path:
-            self.mass_list = []
-            return
+Symbols = pg.graphicsItems.ScatterPlotItem.Symbols
 
-        self.data = pd.read_csv(file_path, sep="\t", header=0)
-        self.isFDresult = self.isValidFLASHDeconvFile()
-        self.setRTMassDict()
-        self.setMassList(self.data)
 
-    def setMassList(self, df):
-        if self.isFDresult:  # parsing a result file from FLASHDeconv
-            self.mass_list = df["MonoisotopicMass"].to_numpy().ravel().tolist()
+class FeatureSegmentItem(pg.GraphicsObject):
+    """
+    Draws all mass features as horizontal segments (start RT to end RT at
+    the mass) in one graphics item. The segments are grouped by their
+    color bin and recorded into a QPicture, so the pen changes once per
+    bin and no item is created per mass.
+
+    """
+
+    def __init__(self, masses, starts, ends, color_bins, lut):
+        pg.GraphicsObject.__init__(self)
+        self.picture = QPicture()
+        qp = QPainter(self.picture)
+        for b in np.unique(color_bins):
+            sel = np.nonzero(color_bins == b)[0]
+            pen = QPen(QColor(*lut[b][:3]), 5)
+            pen.setCosmetic(True)  # width in pixels at every zoom level
+            qp.setPen(pen)
+            qp.drawLines([
+                QLineF(starts[i], masses[i], ends[i], masses[i]) for i in sel
+            ])
+        qp.end()
+        if masses.size:
+            self._rect = QRectF(
+                float(starts.min()), float(masses.min()),
+                float(ends.max() - starts.min()),
+                float(masses.max() - masses.min()),
+            )
         else:
-            self.mass_list = df.to_numpy().ravel().tolist()
-
-    def setMassStruct(self, cs_range=[2, 100]):
-        mds_dict = {}
-
-        for mNum, mass in enumerate(self.mass_list):
-            mds_dict[mass] = self.setMassDataStructItem(mNum, mass, cs_range)
-        return mds_dict
-
-    def getMassStruct(self, masslist, cs_range=[2, 100]):
-        mds_dict = {}
-
-        for mass in masslist:
-            mNum = self.mass_list.index(mass)
-            mds_dict[mass] = self.setMassDataStructItem(mNum, mass, cs_range)
-        return mds_dict
-
-    def setMassDataStructItem(self, index, mass, cs_range):
-        marker = SymbolSet[index % len(SymbolSet)]
-        color = RGBs[index % len(RGBs)]
-        theo_mz = self.calculateTheoMzList(mass, cs_range)
-        rt_s = 0
-        rt_e = sys.maxsize
-        mi = 0
-        c = 0
-        try:
-            if mass in self.RTMassDict.keys():
-                rt_s = float(self.RTMassDict[mass]["StartRetentionTime"])
-                rt_e = float(self.RTMassDict[mass]["EndRetentionTime"])
-                mi = float(self.RTMassDict[mass]["MaxIntensity"])
-                c = int(self.RTMassDict[mass]["MassCount"])
-        except (AttributeError, NameError):  # no input mass file
-            pass
-
-        return MassDataStruct(
-            mz_theo_arr=theo_mz,
-            startRT=rt_s,
-            endRT=rt_e,
-            maxIntensity=mi,
-            scanCount=c,
-            marker=marker,
-            color=color,
-        )
+            self._rect = QRectF()
 
-    def calculateTheoMzList(self, mass, cs_range, mz_range=(0, 0)):
-        theo_mz_list = []
-        for cs in range(cs_range[0], cs_range[1] + 1):
-            mz = (mass + cs * PROTON_MASS_U) / cs
-            iso = [
-                C13C12_MASSDIFF_U / cs * i + mz for i in range(10)
-            ]  # 10 should be changed based on the mass, later.
-            theo_mz_list.append((cs, np.array(iso)))
-        return theo_mz_list
-
-    def addNewMass(self, new_mass, index, cs_range):
-        return self.setMassDataStructItem(index, new_mass, cs_range)
-
-    def isValidFLASHDeconvFile(self):
-        col_needed = [
-            "MonoisotopicMass",
-            "AverageMass",
-            "StartRetentionTime",
-            "EndRetentionTime",
-        ]
-        result = all(elem in list(self.data) for elem in col_needed)
-        if result:
-            return True
-        return False
+    def paint(self, p, *args):
+        p.drawPicture(0, 0, self.picture)
 
-    def setRTMassDict(self):
-        self.RTMassDict = dict()
-        if self.isFDresult:
-            self.RTMassDict = self.data.set_index(
-                "MonoisotopicMass").to_dict("index")
+    def boundingRect(self):
+        return self._rect
 
 
 class FeatureMapPlotWidget(PlotWidget):
@@ -197,36 +205,73 @@ class FeatureMapPlotWidget(PlotWidget):
     #     # self.addItem(self.hist)
 
     def drawPlot(self):
-        cmap = self.getColorMap()
-
-        for mass, mds in self.data.items():
-            spi = pg.ScatterPlotItem(
-                size=10,  # pen=pg.mkPen(None),
-                brush=pg.mkBrush(cmap.mapToQColor(mds.maxIntensity)),
-            )
-            self.addItem(spi)
-            spots = [{"pos": [i, mass]}
-                     for i in np.arange(mds.startRT, mds.endRT, 1)]
-            # print([i for i in np.arange(mds.startRT, mds.endRT, 1)])
-            spi.addPoints(spots)
+        mds_list = list(self.data.values())
+        masses = np.fromiter(self.data.keys(), dtype=np.float64,
+                             count=len(mds_list))
+        starts = np.array([m.startRT for m in mds_list], dtype=np.float64)
+        ends = np.array([m.endRT for m in mds_list], dtype=np.float64)
+        intensities = np.array(
+            [m.maxIntensity for m in mds_list], dtype=np.float64)
+
+        lut = self.getColorMap()
+        color_bins = self.getColorBins(intensities, len(lut))
+        self.addItem(FeatureSegmentItem(
+            masses, starts, ends, color_bins, lut))
+
+        # sorted by mass for the hover lookup
+        order = np.argsort(masses)
+        self._masses = masses[order]
+        self._starts = starts[order]
+        self._ends = ends[order]
+        self._intensities = intensities[order]
+
+        self.hoverText = pg.TextItem(color="k", anchor=(0, 1))
+        self.hoverText.setZValue(10)
+        self.addItem(self.hoverText)
+        self.scene().sigMouseMoved.connect(self.onMouseMoved)
+
+    def getColorBins(self, intensities, n_colors):
+        # log scaled intensity, mapped to the LUT entries
+        log_int = np.log10(np.maximum(intensities, 1.0))
+        lo, hi = (log_int.min(), log_int.max()) if log_int.size else (0, 0)
+        if hi <= lo:
+            return np.zeros(log_int.size, dtype=np.int64)
+        scaled = (log_int - lo) / (hi - lo)
+        return np.minimum((scaled * n_colors).astype(np.int64), n_colors - 1)
 
     def getColorMap(self):
-        miList = self.getMassIntensityDict()
-        colormap = cm.get_cmap("plasma")
-        colormap._init()
-        lut = \
-            (colormap._lut * 255).view(np.ndarray)[: colormap.N]
-        # Convert matplotlib colormap from 0-1 to 0 -255 for Qt
-        self.pg_cmap = pg.ColorMap(pos=miList, color=lut)
-        return self.pg_cmap
-
-    def getMassIntensityDict(self):
-        # miDict = dict()
-        miList = list()
-        for m, mds in self.data.items():
-            # miDict[m] = mds.maxIntensity
-            miList.append(mds.maxIntensity)
-        return miList
+        lut = PLASMA_LUT
+        self.pg_cmap = pg.ColorMap(
+            pos=np.linspace(0.0, 1.0, len(lut)), color=lut)
+        return lut
+
+    def findFeature(self, rt, mass, mass_tol):
+        """index (in mass order) of the nearest feature at rt or -1"""
+        lo = np.searchsorted(self._masses, mass - mass_tol, "left")
+        hi = np.searchsorted(self._masses, mass + mass_tol, "right")
+        cand = np.arange(lo, hi)
+        cand = cand[(self._starts[cand] <= rt) & (self._ends[cand] >= rt)]
+        if cand.size == 0:
+            return -1
+        return int(cand[np.argmin(np.abs(self._masses[cand] - mass))])
+
+    def onMouseMoved(self, pos):
+        vb = self.getPlotItem().getViewBox()
+        if not vb.sceneBoundingRect().contains(pos):
+            return
+        point = vb.mapSceneToView(pos)
+        # a few pixels around the cursor
+        mass_tol = 5 * vb.viewPixelSize()[1]
+        index = self.findFeature(point.x(), point.y(), mass_tol)
+        if index < 0:
+            self.hoverText.setText("")
+            return
+        self.hoverText.setText(
+            "%.4f Da\nRT %.1f - %.1f sec\nmax. intensity %.3g"
+            % (self._masses[index], self._starts[index], self._ends[index],
+               self._intensities[index])
+        )
+        self.hoverText.setPos(point)
 
 
 class PlotWindow(QMainWindow):
@@ -255,25 +300,168 @@ class PlotWindow(QMainWindow):
         self.layout.addWidget(self.img)
 
 
-class ControllerWidget(QWidget):
-    def __init__(self, mass_path, plot, *args):
+class MassTableModel(QAbstractTableModel):
+    """
+    Table model of the masses of the current scan, the cells are read
+    from the arrays of a MassTableStruct and no item is created per row.
+    Check states are kept in a bool array, the symbol icons are painted
+    once per (symbol, color). Sorting only permutes a row index.
+
+    ...
+
+    Signals
+    -------
+    massChecked(float, bool)
+        Emitted when the check state of a mass changes
+
+    """
+
+    massChecked = pyqtSignal(float, bool)
+    HEADER = ("Masses", "Intensity", "Charges", "Score")
+    _icons: dict = {}  # (symbol, color) -> QIcon, shared by all models
+
+    def __init__(self, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        empty = np.array([])
+        self.table = MassTableStruct(empty, [], empty, empty, empty, empty)
+        self.checked = np.zeros(0, dtype=bool)
+        self.order = np.zeros(0, dtype=np.int64)  # table row -> mass
+        self._sort = None  # (column, Qt.SortOrder) of the last sort
+
+    def setMassTable(self, table: MassTableStruct) -> None:
+        self.beginResetModel()
+        self.table = table
+        self.checked = np.zeros(len(table.masses), dtype=bool)
+        self.order = np.arange(len(table.masses))
+        if self._sort is not None:
+            self._sortOrder(*self._sort)
+        self.endResetModel()
+
+    def checkedMasses(self):
+        return [float(m) for m in np.asarray(self.table.masses)[self.checked]]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.order.size
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADER)
+
+    def headerData(self, col, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADER[col]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        i = self.order[index.row()]
+        col = index.column()
+        t = self.table
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return str(t.masses[i])
+            if col == 1:
+                return "%.3g" % t.intensity[i] if t.intensity[i] > 0 else ""
+            if col == 2:
+                if t.min_charge[i] == 0:
+                    return ""
+                return "%d-%d" % (t.min_charge[i], t.max_charge[i])
+            return "%.3f" % t.score[i]
+        if col == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.checked[i] else Qt.Unchecked
+            if role == Qt.DecorationRole:
+                mds = t.mass_structs[i]
+                return self.symbolIcon(mds.marker, mds.color)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 0 or \
+                role != Qt.CheckStateRole:
+            return False
+        i = self.order[index.row()]
+        checked = value == Qt.Checked
+        if self.checked[i] == checked:
+            return True
+        self.checked[i] = checked
+        self.dataChanged.emit(index, index, [role])
+        self.massChecked.emit(float(self.table.masses[i]), checked)
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self._sortOrder(column, order)
+        self.layoutChanged.emit()
+
+    def _sortOrder(self, column, order):
+        self._sort = (column, order)
+        t = self.table
+        keys = (t.masses, t.intensity, t.min_charge, t.score)[column]
+        self.order = np.argsort(np.asarray(keys), kind="stable")
+        if order == Qt.DescendingOrder:
+            self.order = self.order[::-1]
+
+    @classmethod
+    def symbolIcon(cls, symbol, color):
+        key = (symbol, tuple(color))
+        icon = cls._icons.get(key)
+        if icon is None:
+            px = QPixmap(20, 20)
+            px.fill(Qt.transparent)
+            qp = QPainter(px)
+            qpen = QPen(Qt.black, 0.05)
+            qc = QColor()
+            qc.setRgb(color[0], color[1], color[2])
+
+            qp.setRenderHint(QPainter.Antialiasing)
+            qp.setPen(qpen)
+            qp.setBrush(QBrush(qc))
+            qp.translate(10, 10)
+            qp.scale(20, 20)
+            qp.drawPath(Symbols[symbol])
+            qp.end()
+            icon = cls._icons[key] = QIcon(px)
+        return icon
+
+
+class ControllerWidget(QWidget, FileLoaderMixin):
+    def __init__(self, mass_path, plot, *args, tolerance=DEFAULT_TOL,
+                 ms_experiment=None, is_avg=False):
         QWidget.__init__(self, *args)
         self.mass_path = mass_path
+        self.tolerance = tolerance  # ppm
+        self.ms_experiment = ms_experiment
+        self.isoModel = AveragineModel()
         hbox = QVBoxLayout()
-        self.setMaximumWidth(350)
+        self.setMaximumWidth(400)
         self.spectrum_widget = plot
 
         # data processing
-        self.mlc = MassList(mass_path)
+        self.mlc = MassList(mass_path, is_avg)
         self.total_masses = self.mlc.setMassStruct()
+        self.setRTIndex()
         self.masses = dict()  # initialization
 
         self.setFeatureMapButton()
+        self.setScoreExportButton()
         self.setMassTableView()
         self.setMassLineEdit()
         self.setParameterBox()
 
         hbox.addWidget(self.fmButton)
+        hbox.addWidget(self.scoreExportButton)
         hbox.addWidget(self.massTable)
         hbox.addLayout(self.massLineEditLayout)
         hbox.addWidget(self.paramBox)
@@ -281,18 +469,14 @@ class ControllerWidget(QWidget):
         self.setLayout(hbox)
 
     def _updatePlot(self):
-        # uncheck all checkboxes
-        for index in range(self.model.rowCount()):
-            item = self.model.item(index)
-            if item.isCheckable():
-                item.setCheckState(Qt.Unchecked)
-
         # reset parameter default value
         self.csMinLineEdit.setText("2")
         self.csMaxLineEdit.setText("100")
 
+        # the new table has all masses unchecked
         self._data_visible = []
         self.spectrum_widget.setPeakAnnotations(self.getPeakAnnoStruct())
+        self.model.setMassTable(self.massTableData)
         self.spectrum_widget.setLadderAnnotations(self.getLadderAnnoStruct())
 
         self.spectrum_widget.redrawPlot()
@@ -302,14 +486,21 @@ class ControllerWidget(QWidget):
         self.fmButton.setText("Draw feature map")
         self.fmButton.clicked.connect(self.loadFeatureMapPlot)
 
+    def setScoreExportButton(self):
+        self.scoreExportButton = QPushButton()
+        self.scoreExportButton.setText("Export isotope scores")
+        self.scoreExportButton.clicked.connect(self.exportScores)
+
     def setMassTableView(self):
         # set controller widgets
         self.massTable = QTableView()
-        self.model = QStandardItemModel(self)
-        self.model.setHorizontalHeaderLabels(["Masses"])
-        self.model.itemChanged.connect(self.check_check_state)
+        self.model = MassTableModel(self)
+        self.model.massChecked.connect(self.check_check_state)
         self.massTable.setModel(self.model)
-        self.massTable.setColumnWidth(0, 300)
+        self.massTable.setSortingEnabled(True)
+        for col, width in enumerate((120, 80, 60, 55)):
+            self.massTable.setColumnWidth(col, width)
+        self.massTable.verticalHeader().hide()
         self._data_visible = []
 
     def setMassLineEdit(self):
@@ -379,24 +570,26 @@ class ControllerWidget(QWidget):
     def updateMassTableView(self, scan_rt):
 
         self.masses = self.getMassStructWithRT(scan_rt)
-        self.model.removeRows(0, self.model.rowCount())
-        self.model.setHorizontalHeaderLabels(["Masses"])
-        for mass, mStruct in self.masses.items():
-            self.setListViewWithMass(mass, mStruct)
-        self.massTable.setColumnWidth(0, 300)
-        # update annotation lists
+        # update annotation lists, the table rows come from the matching
         self._data_visible = []
         self.spectrum_widget.setPeakAnnotations(self.getPeakAnnoStruct())
+        self.model.setMassTable(self.massTableData)
         self.spectrum_widget.setLadderAnnotations(self.getLadderAnnoStruct())
 
+    def setRTIndex(self):
+        # masses without elution window span [0, sys.maxsize]
+        self.total_mass_keys = list(self.total_masses.keys())
+        self.rtIndex = RTIntervalIndex(
+            [mds.startRT for mds in self.total_masses.values()],
+            [mds.endRT for mds in self.total_masses.values()],
+        )
+
     def getMassStructWithRT(self, scan_rt):
-        new_dict = dict()
-        for mass, mds in self.total_masses.items():
-            if (mds.startRT == 0 and mds.endRT == sys.maxsize) or (
-                    scan_rt >= mds.startRT and scan_rt <= mds.endRT
-            ):
-                new_dict[mass] = mds
-        return new_dict
+        keys = self.total_mass_keys
+        return {
+            keys[i]: self.total_masses[keys[i]]
+            for i in self.rtIndex.query(scan_rt)
+        }
 
     def redrawAnnotationsWithParam(self):
         minCs = self.csMinLineEdit.text()
@@ -423,44 +616,41 @@ class ControllerWidget(QWidget):
 
         return False
 
-    def getSymbolIcon(self, symbol, color):
-
-        px = QPixmap(20, 20)
-        px.fill(Qt.transparent)
-        qp = QPainter(px)
-        qpen = QPen(Qt.black, 0.05)
-        qc = QColor()
-        qc.setRgb(color[0], color[1], color[2])
-
-        qp.setRenderHint(QPainter.Antialiasing)
-        qp.setPen(qpen)
-        qp.setBrush(QBrush(qc))
-        qp.translate(10, 10)
-        qp.scale(20, 20)
-        qp.drawPath(Symbols[symbol])
-        qp.end()
-
-        return QIcon(px)
-
     def getPeakAnnoStruct(self):
+        mass_structs = list(self.masses.values())
+        exp_mzs, exp_ints = self.spectrum_widget.spec.get_peaks()
+        matches = matchTheoreticalPeaks(
+            mass_structs, exp_mzs, exp_ints, self.tolerance)
+        masses = list(self.masses.keys())
+        scores = scoreMassStructs(
+            self.isoModel, masses, mass_structs, matches)
+
+        key = matches.mass_index * (int(matches.charges.max(initial=0)) + 1) \
+            + matches.charges
+        # the same charge states support the masses in the isotope scores
+        supported = np.flatnonzero(supportedCharges(
+            matches.mass_index, matches.charges, matches.isotopes))
+        self.massTableData = self.getMassTableStruct(
+            masses, mass_structs, matches, supported, scores)
+        if supported.size == 0:
+            return []
+
+        # one annotation per mass and charge at its most intense isotope
+        order = supported[
+            np.lexsort((-matches.intensity[supported], key[supported]))]
+        _, first = np.unique(key[order], return_index=True)
         pStructList = []
-        for mass, mass_strc in self.masses.items():
-            theo_list = mass_strc.mz_theo_arr
-
-            for theo in theo_list:  # theo : [0] cs [1] iso mz list
-                exp_p = self.findNearestPeakWithTheoPos(
-                    theo[1][0])  # Monoisotopic only
-                if exp_p is None:
-                    continue
-                pStructList.append(
-                    PeakAnnoStruct(
-                        mz=exp_p.getMZ(),
-                        intensity=exp_p.getIntensity(),
-                        text_label="+" + str(theo[0]),
-                        symbol=mass_strc.marker,
-                        symbol_color=mass_strc.color,
-                    )
+        for i in order[first]:
+            mass_strc = mass_structs[matches.mass_index[i]]
+            pStructList.append(
+                PeakAnnoStruct(
+                    mz=matches.mz[i],
+                    intensity=matches.intensity[i],
+                    text_label="+" + str(matches.charges[i]),
+                    symbol=mass_strc.marker,
+                    symbol_color=mass_strc.color,
                 )
+            )
 
         return pStructList
 
@@ -472,19 +662,18 @@ class ControllerWidget(QWidget):
             mass = str(mass)
             if mass in self._data_visible:
                 # calculating charge ladder
-                theo_list = mass_strc.mz_theo_arr
                 t_mz_list = []
                 txt_list = []
 
-                for theo in theo_list:  # theo : [0] cs [1] iso mz list
+                for cs, iso in zip(mass_strc.charges, mass_strc.mz_theo_arr):
                     # plotting only theoretical mz valule
                     # within experimental mz range
-                    if (theo[1][0] <= xlimit[0]) | (theo[1][-1] >= xlimit[1]):
+                    if (iso[0] <= xlimit[0]) | (iso[-1] >= xlimit[1]):
                         continue
 
-                    for index, mz in enumerate(theo[1]):
+                    for index, mz in enumerate(iso):
                         t_mz_list.append(mz)
-                        txt_list.append("+%d[%d]" % (theo[0], index))
+                        txt_list.append("+%d[%d]" % (cs, index))
                 lStructDict[mass] = LadderAnnoStruct(
                     mz_list=np.array(t_mz_list),
                     text_label_list=np.array(txt_list),
@@ -494,33 +683,69 @@ class ControllerWidget(QWidget):
                 self.spectrum_widget.clearLadderAnnotation(mass)
         return lStructDict
 
-    def findNearestPeakWithTheoPos(self, theo_mz, tol=-1):
-        nearest_p = self.spectrum_widget.spec[
-            self.spectrum_widget.spec.findNearest(theo_mz)
-        ]
-        if tol == -1:
-            tol = TOL * theo_mz  # ppm
-        if abs(theo_mz - nearest_p.getMZ()) > tol:
-            return None
-        if nearest_p.getIntensity() == 0:
-            return None
-        return nearest_p
-
-    def setListViewWithMass(self, mass, mStruct):
-
-        icon = self.getSymbolIcon(mStruct.marker, mStruct.color)
-        item = QStandardItem(icon, str(mass))
-        item.setCheckable(True)
-
-        self.model.appendRow([item])
+    def getMassTableStruct(self, masses, mass_structs, matches, supported,
+                           scores):
+        # summed intensity and charge range of the supported charge states
+        n = len(masses)
+        mass_index = matches.mass_index[supported]
+        charges = matches.charges[supported]
+        intensity = np.bincount(
+            mass_index, weights=matches.intensity[supported], minlength=n)
+        min_charge = np.full(n, np.iinfo(np.int64).max)
+        max_charge = np.zeros(n, dtype=np.int64)
+        np.minimum.at(min_charge, mass_index, charges)
+        np.maximum.at(max_charge, mass_index, charges)
+        min_charge[max_charge == 0] = 0
+        return MassTableStruct(
+            masses=np.array(masses, dtype=np.float64),
+            mass_structs=mass_structs,
+            intensity=intensity,
+            min_charge=min_charge,
+            max_charge=max_charge,
+            score=scores.score,
+        )
 
-    def check_check_state(self, i):
-        if not i.isCheckable():  # Skip data columns.
+    def exportScores(self):
+        if self.ms_experiment is None or not self.mlc.isFDresult:
+            self.errorDlg = QMessageBox()
+            self.errorDlg.setIcon(QMessageBox.Critical)
+            self.errorDlg.setWindowTitle("ERROR")
+            self.errorDlg.setText(
+                "Scores can only be exported for FLASHDeconv result files."
+            )
+            self.errorDlg.exec_()
+            return
+        fileName, _ = QFileDialog.getSaveFileName(
+            self, "Export isotope scores", "", "TSV Files (*.tsv)"
+        )
+        if not fileName:
             return
+        # scored in the background, the progress dialog can cancel it
+        self.startLoader(
+            {"isotope scores": (fileName, self.writeScoreFile)},
+            self.onScoresExported
+        )
+
+    def writeScoreFile(self, file_path, progress=None):
+        masses = np.array(self.total_mass_keys, dtype=np.float64)
+        structs = [self.total_masses[m] for m in self.total_mass_keys]
+        results = scoreExperiment(
+            self.ms_experiment,
+            masses,
+            np.array([mds.startRT for mds in structs], dtype=np.float64),
+            np.array([mds.endRT for mds in structs], dtype=np.float64),
+            self.cs_range,
+            self.tolerance,
+            progress=progress,
+        )
+        writeScores(file_path, results)
+        return file_path
 
-        mass = i.text()
-        checked = i.checkState() == Qt.Checked
+    def onScoresExported(self, data):
+        print("isotope scores written to %s" % data["isotope scores"])
 
+    def check_check_state(self, mass, checked):
+        mass = str(mass)
         if mass in self._data_visible:
             if not checked:
                 self._data_visible.remove(str(mass))
@@ -538,7 +763,7 @@ class ControllerWidget(QWidget):
         new_mass = self.massLineEdit.text()
         self.massLineEdit.clear()
         try:
-            new_mass = float(new_mass)
+            new_mass = self.mlc.toMonoisotopic(float(new_mass))
         except Exception:
             return
         new_mass_str = self.mlc.addNewMass(
@@ -547,15 +772,17 @@ class ControllerWidget(QWidget):
 
         # redraw
         self._updatePlot()
-        self.setListViewWithMass(new_mass, new_mass_str)
 
 
 class ScanBrowserWidget_FDV(ScanBrowserWidget):
     def updateController(self):  # overriding from ScanBrowserWidget
         self.controller.updateMassTableView(self.scan_widget.curr_spec.getRT())
 
-    def annotation_FLASHDeconv(self, mass_path):
-        self.controller = ControllerWidget(mass_path, self.spectrum_widget)
+    def annotation_FLASHDeconv(self, mass_path, tolerance=DEFAULT_TOL,
+                               is_avg=False):
+        self.controller = ControllerWidget(
+            mass_path, self.spectrum_widget, tolerance=tolerance,
+            ms_experiment=self.scan_widget.ms_experiment, is_avg=is_avg)
         self.isAnnoOn = True
         # annotate first scan
         self.redrawPlot()
@@ -678,6 +905,7 @@ class App_FDV(App):
         if self.windowLay.count() > 0:
             self.clearLayout(self.windowLay)
         self.scanbrowser = ScanBrowserWidget_FDV(self)
+        self.scanbrowser.experimentBackend = self.experimentBackend
         self.windowLay.addWidget(self.scanbrowser)
 
     def setToolMenu(self):  # overriding from App
@@ -692,15 +920,19 @@ class App_FDV(App):
         if inputDlg.exec_():  # data accepted
             self.mzmlPath = inputDlg.mzmlFileLineEdit.text()
             self.massPath = inputDlg.massFileLineEdit.text()
-            self.tol = inputDlg.tolerance.text()
+            self.tol = float(inputDlg.tolerance.text())
             self.isAvg = inputDlg.mTypeButton2.isChecked()
 
-            if self.isAvg:
-                print("Calculate with AVG mass")
-
             self.setOpenMSWidget()
-            self.scanbrowser.loadFile(self.mzmlPath)
-            self.scanbrowser.annotation_FLASHDeconv(self.massPath)
+            self.startLoader(
+                {"mzML": (self.mzmlPath, self.scanbrowser.readMS)},
+                self.onFLASHDeconvFilesLoaded
+            )
+
+    def onFLASHDeconvFilesLoaded(self, data):
+        self.scanbrowser.setMSExperiment(data["mzML"])
+        self.scanbrowser.annotation_FLASHDeconv(
+            self.massPath, self.tol, self.isAvg)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import os
 import sys
 from collections import namedtuple
+from functools import partial
 
 import pyqtgraph as pg
 from PyQt5.QtWidgets import (
@@ -11,10 +12,16 @@ from PyQt5.QtWidgets import (
     QDesktopWidget,
     QAction,
     QFileDialog,
+    QDialog,
+    QFormLayout,
+    QDoubleSpinBox,
+    QComboBox,
+    QDialogButtonBox,
 )
 
 sys.path.insert(0, "../view")
 from ControllerWidget import ControllerWidget
+from FileLoader import FileLoaderMixin
 
 # structure for annotation (here for reference)
 PeakAnnoStruct = namedtuple(
@@ -32,10 +39,16 @@ pg.setConfigOption("background", "w")  # white background
 pg.setConfigOption("foreground", "k")  # black peaks
 
 
-class App(QMainWindow):
+class App(QMainWindow, FileLoaderMixin):
     def __init__(self):
         QMainWindow.__init__(self)
         self.resize(1000, 1000)  # window size
+        self.loader = None
+        self.mzmlPath = None
+        self.idxmlPath = None
+        self.experimentBackend = "memory"
+        self.fragmentTolerance = 20.0
+        self.isFragmentTolPPM = True
         self.initUI()
 
     def initUI(self):
@@ -55,6 +68,9 @@ class App(QMainWindow):
         if self.windowLay.count() > 0:
             self.clearLayout(self.windowLay)
         self.widgets = ControllerWidget(self)
+        self.widgets.experimentBackend = self.experimentBackend
+        self.widgets.setFragmentTolerance(
+            self.fragmentTolerance, self.isFragmentTolPPM)
         self.windowLay.addWidget(self.widgets)
 
     def setMainMenu(self):
@@ -81,9 +97,38 @@ class App(QMainWindow):
         mzmlOpenAct.triggered.connect(self.openFileDialog)
         self.fileMenu.addAction(mzmlOpenAct)
 
+        # read the peaks on demand from a disk cache of the mzML file
+        cacheAct = QAction("Cache spectra on disk", self)
+        cacheAct.setCheckable(True)
+        cacheAct.setStatusTip(
+            "Convert mzML files once into a cache, spectra are read on demand")
+        cacheAct.toggled.connect(self.setCacheSpectra)
+        self.fileMenu.addAction(cacheAct)
+
+    def setCacheSpectra(self, checked):
+        self.experimentBackend = "cached" if checked else "memory"
+
     def setToolMenu(self):
-        # for overriding
-        return
+        # precompute the annotations of all PSMs
+        annotateAct = QAction("Annotate all PSMs", self)
+        annotateAct.setStatusTip(
+            "Align theoretical spectra of all PSMs and cache the result")
+        annotateAct.triggered.connect(self.annotateAllPSMs)
+        self.toolMenu.addAction(annotateAct)
+
+        # tolerance of the fragment matching and of the annotations
+        toleranceAct = QAction("Fragment tolerance", self)
+        toleranceAct.setStatusTip(
+            "Set the fragment tolerance and annotate all PSMs again")
+        toleranceAct.triggered.connect(self.openToleranceDialog)
+        self.toolMenu.addAction(toleranceAct)
+
+        # run-level QC view of the mass errors
+        densityAct = QAction("Mass error density", self)
+        densityAct.setStatusTip(
+            "Show fragment and precursor mass errors of the whole run")
+        densityAct.triggered.connect(self.showMassErrorDensity)
+        self.toolMenu.addAction(densityAct)
 
     def clearLayout(self, layout):
         for i in reversed(range(layout.count())):
@@ -96,8 +141,58 @@ class App(QMainWindow):
         if fileName:
             print("opening...", fileName)
             self.setWidgets()
-            self.widgets.loadFileMzML(os.path.splitext(fileName)[0] + ".mzML")
-            self.widgets.loadFileIdXML(fileName)
+            self.mzmlPath = os.path.splitext(fileName)[0] + ".mzML"
+            self.idxmlPath = fileName
+            # mzML and idXML are parsed concurrently in the background
+            self.startLoader(
+                {
+                    "mzML": (self.mzmlPath, self.widgets.readMS),
+                    "idXML": (self.idxmlPath, self.widgets.readIdXML),
+                    "annotations": (self.idxmlPath,
+                                    self.widgets.readAnnotationCache),
+                },
+                self.onFilesLoaded
+            )
+
+    def annotateAllPSMs(self):
+        if self.widgets.scans is None or not self.idxmlPath:
+            return
+        self.widgets.resetMassErrorDensity()
+        self.startLoader(
+            {
+                "annotations": (
+                    self.idxmlPath,
+                    partial(self.widgets.annotateAllPSMs, self.mzmlPath),
+                )
+            },
+            self.onAnnotationsLoaded
+        )
+
+    def openToleranceDialog(self):
+        dialog = ToleranceDialog(
+            self.fragmentTolerance, self.isFragmentTolPPM, self)
+        if dialog.exec_() == QDialog.Accepted:
+            self.setFragmentTolerance(*dialog.tolerance())
+
+    def setFragmentTolerance(self, tolerance, is_ppm):
+        self.fragmentTolerance = tolerance
+        self.isFragmentTolPPM = is_ppm
+        # the annotations (and their cache) of the old tolerance are
+        # outdated, they are aligned again with the new one
+        if self.widgets.setFragmentTolerance(tolerance, is_ppm) and \
+                self.widgets.psmStore.spectrumIndices():
+            self.annotateAllPSMs()
+
+    def showMassErrorDensity(self):
+        self.widgets.showMassErrorDensity()
+
+    def onFilesLoaded(self, data):
+        self.widgets.setMSExperiment(data["mzML"])
+        self.widgets.setIdData(data["idXML"])
+        self.widgets.setPSMAnnotations(data["annotations"])
+
+    def onAnnotationsLoaded(self, data):
+        self.widgets.setPSMAnnotations(data["annotations"])
 
     def center(self):
         qr = self.frameGeometry()
@@ -116,6 +211,33 @@ class App(QMainWindow):
         event.accept()
 
 
+class ToleranceDialog(QDialog):
+    def __init__(self, tolerance, is_ppm, parent=None):
+        super(ToleranceDialog, self).__init__(parent)
+        self.setWindowTitle("Fragment tolerance")
+
+        self.toleranceBox = QDoubleSpinBox()
+        self.toleranceBox.setDecimals(4)
+        self.toleranceBox.setRange(0.0001, 10000.0)
+        self.toleranceBox.setValue(tolerance)
+        self.unitBox = QComboBox()
+        self.unitBox.addItems(["ppm", "Da"])
+        self.unitBox.setCurrentIndex(0 if is_ppm else 1)
+
+        buttonBox = QDialogButtonBox(
+            QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttonBox.accepted.connect(self.accept)
+        buttonBox.rejected.connect(self.reject)
+
+        layout = QFormLayout(self)
+        layout.addRow("Tolerance", self.toleranceBox)
+        layout.addRow("Unit", self.unitBox)
+        layout.addRow(buttonBox)
+
+    def tolerance(self):
+        return self.toleranceBox.value(), self.unitBox.currentIndex() == 0
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     ex = App()
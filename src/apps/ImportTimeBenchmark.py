@@ -0,0 +1,93 @@
+"""
+Measures the cold-start import time of the viewer apps with
+python -X importtime, each import runs in a fresh interpreter:
+
+    ImportTimeBenchmark.py [--repeats 5] [--top 10] [app ...]
+
+Reports the median total import time of each app and the modules with the
+largest cumulative import time.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+APPS = ("SpecViewer", "IDViewer", "FLASHDeconvViewer")
+
+# "import time: self [us] | cumulative | imported package"
+_LINE_PATTERN = re.compile(
+    r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measureImport(app, apps_dir):
+    """
+    Imports an app module in a new interpreter and parses the importtime
+    report.
+
+    Parameters
+    ----------
+    app : str
+        The module name of the app (e.g. "SpecViewer")
+
+    apps_dir : str
+        The directory of the app modules, used as working directory
+
+    Returns
+    -------
+    int, dict
+        The total import time in microseconds and the cumulative time of
+        every imported module by name
+
+    """
+    env = dict(os.environ)
+    repo_root = os.path.dirname(os.path.dirname(apps_dir))
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (repo_root, env.get("PYTHONPATH")) if p)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + app],
+        cwd=apps_dir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError("Importing %s failed:\n%s" % (app, result.stderr))
+
+    total = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if match is None:
+            continue
+        cumulative = int(match.group(2))
+        modules[match.group(4)] = cumulative
+        if len(match.group(3)) == 1:  # top level import
+            total += cumulative
+    return total, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measures the cold-start import time of the apps.")
+    parser.add_argument("apps", nargs="*", default=APPS,
+                        help="app modules to measure")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10,
+                        help="number of slowest modules listed per app")
+    args = parser.parse_args(argv)
+
+    apps_dir = os.path.dirname(os.path.abspath(__file__))
+    for app in args.apps:
+        runs = [measureImport(app, apps_dir) for _ in range(args.repeats)]
+        totals = [total for total, _ in runs]
+        print("%s: %.1f ms (median of %d, min %.1f ms)" % (
+            app, statistics.median(totals) / 1000, args.repeats,
+            min(totals) / 1000))
+        # the slowest modules of the median run
+        _, modules = sorted(runs, key=lambda r: r[0])[len(runs) // 2]
+        slowest = sorted(modules.items(), key=lambda m: -m[1])[:args.top]
+        for name, cumulative in slowest:
+            print("    %8.1f ms  %s" % (cumulative / 1000, name))
+
+
+if __name__ == "__main__":
+    main()
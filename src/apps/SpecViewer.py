@@ -13,6 +13,7 @@ from PyQt5.QtWidgets import (
 )
 
 sys.path.insert(0, "../view")
+from FileLoader import FileLoaderMixin
 from ScanBrowserWidget import ScanBrowserWidget
 
 # structure for annotation (here for reference)
@@ -31,10 +32,12 @@ pg.setConfigOption("background", "w")  # white background
 pg.setConfigOption("foreground", "k")  # black peaks
 
 
-class App(QMainWindow):
+class App(QMainWindow, FileLoaderMixin):
     def __init__(self):
         QMainWindow.__init__(self)
         self.resize(1000, 700)  # window size
+        self.loader = None
+        self.experimentBackend = "memory"
         self.initUI()
 
     def initUI(self):
@@ -54,6 +57,7 @@ class App(QMainWindow):
         if self.windowLay.count() > 0:
             self.clearLayout(self.windowLay)
         self.scanbrowser = ScanBrowserWidget(self)
+        self.scanbrowser.experimentBackend = self.experimentBackend
         self.windowLay.addWidget(self.scanbrowser)
 
     def setMainMenu(self):
@@ -80,6 +84,17 @@ class App(QMainWindow):
         mzmlOpenAct.triggered.connect(self.openFileDialog)
         self.fileMenu.addAction(mzmlOpenAct)
 
+        # read the peaks on demand from a disk cache of the mzML file
+        cacheAct = QAction("Cache spectra on disk", self)
+        cacheAct.setCheckable(True)
+        cacheAct.setStatusTip(
+            "Convert mzML files once into a cache, spectra are read on demand")
+        cacheAct.toggled.connect(self.setCacheSpectra)
+        self.fileMenu.addAction(cacheAct)
+
+    def setCacheSpectra(self, checked):
+        self.experimentBackend = "cached" if checked else "memory"
+
     def setToolMenu(self):
         # for overriding
         return
@@ -95,7 +110,13 @@ class App(QMainWindow):
         if fileName:
             print("opening...", fileName)
             self.setScanBrowserWidget()
-            self.scanbrowser.loadFile(fileName)
+            self.startLoader(
+                {"mzML": (fileName, self.scanbrowser.readMS)},
+                self.onFilesLoaded
+            )
+
+    def onFilesLoaded(self, data):
+        self.scanbrowser.setMSExperiment(data["mzML"])
 
     def center(self):
         qr = self.frameGeometry()
@@ -0,0 +1,27 @@
+import sys
+
+import numpy as np
+from GUI_EXAMPLE_BASE import GUI_EXAMPLE_BASE
+from PyQt5.QtWidgets import QApplication
+
+sys.path.insert(0, "../view")
+from MassErrorDensityWidget import MassErrorDensityWidget
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    ex = GUI_EXAMPLE_BASE()  # plain QMainWindow with basic layout and menu bar
+
+    # add example widget to window
+    example_widget = MassErrorDensityWidget(ex)
+    example_widget.setRanges(mz_max=2000, rt_max=3600, ppm_max=20)
+
+    # one million fragment errors with a calibration drift over RT
+    n = 1000000
+    rts = np.random.uniform(0, 3600, n)
+    mzs = np.random.uniform(150, 2000, n)
+    ppm = np.random.normal(2.0 + rts / 1200, 2.5, n)
+    example_widget.addErrors("fragment", mzs, rts, ppm)
+
+    ex.setExampleWidget(example_widget)
+    ex.show()
+    sys.exit(app.exec_())
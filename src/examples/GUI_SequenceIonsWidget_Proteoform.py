@@ -0,0 +1,26 @@
+import sys
+
+import numpy as np
+from GUI_EXAMPLE_BASE import GUI_EXAMPLE_BASE
+from PyQt5.QtWidgets import QApplication
+
+sys.path.insert(0, "../view")
+from SequenceIonsWidget import SequenceIonsWidget
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    ex = GUI_EXAMPLE_BASE()  # plain QMainWindow with basic layout and menu bar
+    example_widget = SequenceIonsWidget(ex)
+
+    # random proteoform of 2000 aa with dense fragment annotation
+    rng = np.random.default_rng(0)
+    seq = "".join(rng.choice(list("ACDEFGHIKLMNPQRSTVWY"), 2000))
+    example_widget.setPeptide(seq)
+    example_widget.setPrefix(
+        {int(i): ["b%d" % i] for i in rng.choice(np.arange(1, 2000), 600)})
+    example_widget.setSuffix(
+        {int(i): ["y%d" % i, "z%d" % i]
+         for i in rng.choice(np.arange(1, 2000), 600)})
+    ex.setExampleWidget(example_widget)
+    ex.show()
+    sys.exit(app.exec_())
@@ -1,18 +1,26 @@
-import json
 import re
 from collections import namedtuple
 
 import numpy as np
-import pyopenms
 from ErrorWidget import ErrorWidget
-from PyQt5.QtCore import Qt, QModelIndex
+from PyQt5.QtCore import Qt, QModelIndex, pyqtSignal
 from PyQt5.QtWidgets import QHBoxLayout, QWidget, QSplitter
+from ExperimentBackend import openExperiment
+from MassErrorDensityWidget import MassErrorDensityWidget
+from PeakMatching import matchNearestPeaks
+from PSMAnnotationCache import (
+    PSMAnnotation,
+    PSMAnnotations,
+    annotateRun,
+    annotationCachePath,
+)
+from PSMStore import PeptideIdStruct, PSMStore, PSMStruct, SpectrumIndex
 from ScanTableWidget import ScanTableWidget
 from SequenceIonsWidget import SequenceIonsWidget
 from SpectrumWidget import SpectrumWidget
 from TICWidget import TICWidget
 
-from typing import Tuple
+from typing import Optional, Tuple
 
 PeakAnnoStruct = namedtuple(
     "PeakAnnoStruct",
@@ -31,10 +39,18 @@ class ControllerWidget(QWidget):
     Used to merge spectrum, table, TIC,
     error plot and sequenceIons widgets together.
 
-
+    ===============================  =========================================
+    **Signals:**
+    sigAnnotationsAdded              Emitted with a PSMAnnotations object for
+                                     every chunk of PSMs annotated by
+                                     annotateAllPSMs (from the worker
+                                     thread).
+    ===============================  =========================================
 
     """
 
+    sigAnnotationsAdded = pyqtSignal(object)
+
     def __init__(self, *args, **kwargs):
         QWidget.__init__(self, *args, **kwargs)
         self.mainlayout = QHBoxLayout(self)
@@ -44,22 +60,34 @@ class ControllerWidget(QWidget):
         self.mzs = np.array([])
         self.ppm = np.array([])
         self.colors = np.array([])
-        self.scanIDDict = {}
+        self.peptideIds = []
+        self.psmStore = PSMStore()
+        self.psmAnnotations = None
+        self.scans = None
         self.curr_table_index = None
         self.filteredIonFragments = []
         self.peakAnnoData = None
+        self.fragmentTolerance = 20.0
+        self.isFragmentTolPPM = True
+        self.density_widget = None
+        self.spectrumRTs = None
+        self.experimentBackend = "memory"  # see ExperimentBackend
+        # queued to the main thread, chunks arrive from the worker thread
+        self.sigAnnotationsAdded.connect(self.addMassErrorDensity)
 
     def clearLayout(self, layout):
         for i in reversed(range(layout.count())):
             layout.itemAt(i).widget().setParent(None)
 
     def loadFileMzML(self, file_path):
+        self.setMSExperiment(self.readMS(file_path))
+
+    def setMSExperiment(self, scans):
         self.isAnnoOn = False
+        self.scans = scans
+        self.spectrumRTs = None
         self.msexperimentWidget = QSplitter(Qt.Vertical)
 
-        # data processing
-        scans = self.readMS(file_path)
-
         # set Widgets
         self.spectrum_widget = SpectrumWidget()
         self.scan_widget = ScanTableWidget(scans)
@@ -94,67 +122,237 @@ class ControllerWidget(QWidget):
         self.scan_widget.table_view.selectRow(0)
 
     def loadFileIdXML(self, file_path):
+        self.setIdData(self.readIdXML(file_path))
+
+    def readIdXML(self, file_path, progress=None) -> list:
+        """
+        Reads the PSMs of an idXML file without touching any widget, so it
+        can run in a background thread.
+
+        Parameters
+        ----------
+        file_path : str
+            The path of the idXML file
+
+        progress : LoadProgress or None
+            Optional callback reporting the processed identifications. The
+            parsing of the file reports no progress, it is shown as
+            indeterminate and can only be cancelled after it finished.
+
+        Returns
+        -------
+        list
+            List of PeptideIdStructs, each containing all hits as PSMStructs
+
+        """
+        import pyopenms  # imported on first use, slow to import
+
         prot_ids = []
         pep_ids = []
+        if progress is not None:
+            progress(0, 0)
         pyopenms.IdXMLFile().load(file_path, prot_ids, pep_ids)
-        Ions = {}
+        peptide_ids = []
 
         # extract ID data from file
-        for peptide_id in pep_ids:
+        for pep_num, peptide_id in enumerate(pep_ids):
+            if progress is not None:
+                progress(pep_num, len(pep_ids))
             pep_mz = peptide_id.getMZ()
             pep_rt = peptide_id.getRT()
+            psms = []
 
             for hit in peptide_id.getHits():
-                pep_seq = str(hit.getSequence().toString())
+                aa_seq = str(hit.getSequence().toString())
+                pep_seq = aa_seq
                 if "." in pep_seq:
                     pep_seq = pep_seq[3:-1]
                 else:
                     pep_seq = pep_seq[2:-1]
 
-                for anno in hit.getPeakAnnotations():
-                    ion_charge = anno.charge
-                    ion_mz = anno.mz
-                    ion_label = anno.annotation
-
-                    Ions[ion_label] = [ion_mz, ion_charge]
+                # keep all hits, ordered as in the file (best hit first)
+                psms.append(
+                    PSMStore.createPSM(
+                        pep_seq, aa_seq, hit.getCharge(), pep_mz,
+                        hit.getPeakAnnotations()
+                    )
+                )
 
-                self.scanIDDict[round(pep_rt, 3)] = {
-                    "m/z": pep_mz,
-                    "PepSeq": pep_seq,
-                    "PepIons": Ions,
-                }
-                Ions = {}
+            peptide_ids.append(
+                PeptideIdStruct(
+                    spectrum_reference=self.getSpectrumReference(peptide_id),
+                    rt=pep_rt,
+                    mz=pep_mz,
+                    psms=psms,
+                )
+            )
+        return peptide_ids
+
+    def getSpectrumReference(self, peptide_id) -> str:
+        # spectrum reference is a meta value in older pyOpenMS versions
+        if hasattr(peptide_id, "getSpectrumReference"):
+            ref = peptide_id.getSpectrumReference()
+        elif peptide_id.metaValueExists("spectrum_reference"):
+            ref = peptide_id.getMetaValue("spectrum_reference")
+        else:
+            return ""
+        if isinstance(ref, bytes):
+            ref = ref.decode()
+        return str(ref)
 
+    def setIdData(self, peptide_ids: list) -> None:
+        self.peptideIds = peptide_ids
         self.saveIdData()
+        # redraw the selected row with the new ID data
+        index = self.scan_widget.table_view.currentIndex()
+        if index.isValid():
+            self.updateWidgetDataFromRow(index)
 
     def saveIdData(self):
-        # save ID data in table (correct rows) for later usage
-        rows = self.scan_widget.table_model.rowCount(self.scan_widget)
+        # save ID data in the PSM store, the table only displays the sequence
+        self.psmStore.clear()
+        unmatched = self.psmStore.addIdentifications(
+            SpectrumIndex(self.scans), self.peptideIds)
+        if unmatched:
+            print("%d peptide identifications without spectrum" % unmatched)
+
+        # source model rows are ordered by spectrum index, rows without
+        # PSM are reset to drop the IDs of a previously loaded file
+        model = self.scan_widget.table_model
+        sequences = {row: "-" for row in range(model.rowCount(None))}
+        sequences.update({
+            spec_index: self.psmStore.getPSM(spec_index).sequence
+            for spec_index in self.psmStore.spectrumIndices()
+        })
+        model.setColumnData(6, sequences)
+
+    def readAnnotationCache(self, file_path,
+                            progress=None) -> Optional[PSMAnnotations]:
+        # load precomputed annotations of the idXML file, if still valid
+        if progress is not None:
+            progress(0, 1)
+        annotations = PSMAnnotations.load(
+            annotationCachePath(file_path),
+            self.fragmentTolerance, self.isFragmentTolPPM
+        )
+        if progress is not None:
+            progress(1, 1)
+        return annotations
 
-        for row in range(0, rows - 1):
-            tableRT = round(
-                self.scan_widget.table_model.index(row, 2).data(), 3)
-            if tableRT in self.scanIDDict:
-                index_seq = self.scan_widget.table_model.index(row, 6)
-                self.scan_widget.table_model.setData(
-                    index_seq, self.scanIDDict[tableRT]["PepSeq"],
-                    Qt.DisplayRole
-                )
+    def annotateAllPSMs(self, mzml_path, idxml_path,
+                        progress=None) -> PSMAnnotations:
+        """
+        Aligns the theoretical spectra of all PSMs of the run against their
+        spectra in a process pool and stores the result next to the idXML
+        file. Does not touch any widget, so it can run in a background
+        thread.
 
-                index_ions = self.scan_widget.table_model.index(row, 7)
-                # data needs to be a string, but reversible ->
-                # using json.dumps()
-                self.scan_widget.table_model.setData(
-                    index_ions,
-                    json.dumps(self.scanIDDict[tableRT]["PepIons"]),
-                    Qt.DisplayRole,
-                )
+        Parameters
+        ----------
+        mzml_path : str
+            The path of the loaded mzML file
+
+        idxml_path : str
+            The path of the loaded idXML file
 
-    def readMS(self, file_path):
-        # read MzML files
-        exp = pyopenms.MSExperiment()
-        pyopenms.MzMLFile().load(file_path, exp)
-        return exp
+        progress : LoadProgress or None
+            Optional callback reporting the number of annotated PSMs
+
+        Returns
+        -------
+        PSMAnnotations
+            The annotations of all PSMs of the run
+
+        """
+        annotations = annotateRun(
+            self.scans, self.psmStore, [mzml_path, idxml_path],
+            self.fragmentTolerance, self.isFragmentTolPPM, progress,
+            on_chunk=self.sigAnnotationsAdded.emit
+        )
+        try:
+            annotations.save(annotationCachePath(idxml_path))
+        except OSError:
+            # e.g. a read-only directory, the run stays annotated
+            print("Could not write the annotation cache of %s" % idxml_path)
+        return annotations
+
+    def setPSMAnnotations(self,
+                          annotations: Optional[PSMAnnotations]) -> None:
+        self.psmAnnotations = annotations
+        # replace the incrementally added chunks by the complete run
+        self.resetMassErrorDensity()
+        if annotations is not None:
+            self.addMassErrorDensity(annotations)
+        index = self.scan_widget.table_view.currentIndex()
+        if index.isValid():
+            self.updateWidgetDataFromRow(index)
+
+    def showMassErrorDensity(self) -> None:
+        # run-level QC view of all fragment and precursor mass errors
+        if self.scans is None:
+            return
+        if self.density_widget is None:
+            self.density_widget = MassErrorDensityWidget()
+        self.resetMassErrorDensity()
+        if self.psmAnnotations is not None:
+            self.addMassErrorDensity(self.psmAnnotations)
+        self.density_widget.show()
+        self.density_widget.raise_()
+
+    def resetMassErrorDensity(self) -> None:
+        if self.density_widget is None or self.scans is None:
+            return
+        max_mz = self.scans.getMaxMZ()
+        max_rt = self.scans.getMaxRT()
+        if self.isFragmentTolPPM:
+            ppm_max = max(2 * self.fragmentTolerance, 20.0)
+        else:
+            ppm_max = 50.0
+        self.density_widget.setRanges(
+            max_mz if max_mz > 0 else 2000.0,
+            max_rt if max_rt > 0 else 3600.0,
+            ppm_max,
+        )
+
+    def addMassErrorDensity(self, annotations: PSMAnnotations) -> None:
+        """
+        Adds the mass errors of the best hit of each annotated spectrum
+        to the density widget, if it is open.
+
+        Parameters
+        ----------
+        annotations : PSMAnnotations
+            The annotations of the complete run or of one annotated chunk
+
+        """
+        if self.density_widget is None or self.scans is None:
+            return
+        if self.spectrumRTs is None:
+            self.spectrumRTs = np.array(
+                [spec.getRT() for spec in self.scans], dtype=np.float64)
+        a = annotations.arrays
+        best = a["psm_rank"] == 0
+        psm_rts = self.spectrumRTs[a["psm_spectrum_index"]]
+        ion_counts = np.diff(a["psm_offsets"])
+        ion_best = np.repeat(best, ion_counts)
+        ion_rts = np.repeat(psm_rts, ion_counts)
+
+        self.density_widget.addErrors(
+            "fragment",
+            a["ion_exp_mzs"][ion_best],
+            ion_rts[ion_best],
+            a["ion_ppm"][ion_best],
+        )
+        self.density_widget.addErrors(
+            "precursor",
+            a["psm_precursor_mz"][best],
+            psm_rts[best],
+            a["psm_precursor_ppm"][best],
+        )
+
+    def readMS(self, file_path, progress=None):
+        # read MzML files, lazily for indexed or cached files
+        return openExperiment(file_path, self.experimentBackend, progress)
 
     def drawTic(self, scans):
         self.tic_widget.setTIC(scans.getTIC())
@@ -181,29 +379,108 @@ class ControllerWidget(QWidget):
                 except ValueError:
                     print("could not found ModelIndex of row")
 
-    # for the future calculate ppm and add it to the table
-    def errorData(self, ions_data: dict) -> None:
-        if ions_data not in "-":
-            ions_data_dict = json.loads(ions_data)
-            if ions_data_dict != {}:
-                self.colors, self.mzs = self.filterColorsMZIons(ions_data_dict)
-                mzs_size = len(self.mzs)
-                self.ppm = np.random.randint(0, 3, size=mzs_size)
-                self.error_widget.setMassErrors(
-                    self.mzs, self.ppm, self.colors
-                )  # works for a static np.array
-            else:
-                self.error_widget.clear()
+    def setFragmentTolerance(self, tolerance: float, is_ppm=True) -> bool:
+        """
+        Sets the tolerance of the fragment matching. Annotations aligned
+        with another tolerance are dropped, the displayed spectrum is
+        matched again.
+
+        Returns
+        -------
+        bool
+            True if the tolerance changed
+
+        """
+        if (tolerance, is_ppm) == \
+                (self.fragmentTolerance, self.isFragmentTolPPM):
+            return False
+        self.fragmentTolerance = tolerance
+        self.isFragmentTolPPM = is_ppm
+        if self.scans is not None:
+            self.setPSMAnnotations(None)
+        return True
+
+    def errorData(self, psm: Optional[PSMStruct],
+                  annotation: Optional[PSMAnnotation] = None) -> None:
+        """
+        Matches the theoretical ion m/z values of the PSM against the peaks
+        of the displayed spectrum and plots the mass errors (ppm) of the
+        matched ions. Only matched ions are used for the peak annotations.
+        If a precomputed annotation is given, its matches are used directly.
+
+        Parameters
+        ----------
+        psm : PSMStruct or None
+            The PSM of the current MS2 spectrum
+
+        annotation : PSMAnnotation or None
+            The precomputed annotation of the PSM
+
+        """
+        self.peakAnnoData = None
+        if annotation is not None:
+            ion_annotations = annotation.ion_annotations
+            ion_mzs = annotation.theo_mzs
+        elif psm is not None:
+            ion_annotations = psm.ion_annotations
+            ion_mzs = psm.ion_mzs
+        else:
+            self.error_widget.clear()
+            return
+        if ion_annotations.size == 0:
+            self.error_widget.clear()
+            return
+
+        theo_colors, theo_mzs = self.filterColorsMZIons(
+            ion_annotations, ion_mzs)
+        if annotation is not None:
+            # whole-run alignment already matched the ions to the peaks
+            positions = np.array(
+                [frag[0] for frag in self.filteredIonFragments], dtype=int)
+            peak_indices = annotation.peak_indices[positions]
+            ppm = annotation.ppm[positions]
         else:
+            peak_indices, ppm = matchNearestPeaks(
+                theo_mzs, self.spectrum_widget._mzs,
+                self.fragmentTolerance, self.isFragmentTolPPM
+            )
+        matched = np.flatnonzero(peak_indices >= 0)
+        if matched.size == 0:
             self.error_widget.clear()
+            return
+
+        # ErrorWidget expects the experimental m/z values sorted
+        exp_mzs = self.spectrum_widget._mzs[peak_indices[matched]]
+        order = np.argsort(exp_mzs, kind="stable")
+        self.mzs = exp_mzs[order]
+        self.ppm = ppm[matched][order]
+        self.colors = theo_colors[matched][order]
+
+        # key is ion annotation (e.g. b2):
+        # [mz, color distinguishing prefix, suffix]
+        self.peakAnnoData = {}
+        for i, exp_mz in zip(matched, exp_mzs):
+            self.peakAnnoData[self.filteredIonFragments[i][1]] = [
+                exp_mz, tuple(int(c) for c in theo_colors[i])]
+
+        self.error_widget.setMassErrors(self.mzs, self.ppm, self.colors)
 
     def filterColorsMZIons(self,
-                           ions_data_dict: dict) -> Tuple[np.ndarray,
-                                                          np.ndarray]:
+                           ion_annotations: np.ndarray,
+                           ion_mzs: np.ndarray) -> Tuple[np.ndarray,
+                                                         np.ndarray]:
         """
         Filters the ion information and distinguishes between prefix and
         suffix ions. The data is stored in two arrays (color, m/z)
 
+        Parameters
+        ----------
+        ion_annotations : np.ndarray
+            The ion annotations of the current PSM
+
+        ion_mzs : np.ndarray
+            The m/z values belonging to the ion annotations
+
         Returns
         -------
         Tuple[np.ndarray, np.ndarray]
@@ -212,27 +489,20 @@ class ControllerWidget(QWidget):
 
         """
         # create color/mz array by distinguishing between prefix & suffix ions
-        self.peakAnnoData: dict = {}
-        # key is ion annotation (e.g. b2):
-        # [mz, color distinguishing prefix, suffix]
-        colors = []
-        mzs = []
         col_red = (255, 0, 0)  # suffix
         col_blue = (0, 0, 255)  # prefix
 
-        for fragData in self.filteredIonFragments:
-            anno = fragData[0]
-            if anno[0] in "abc":
-                colors.append(col_blue)
-                mzs.append(ions_data_dict[anno][0])
-                self.peakAnnoData[fragData[1]] = [
-                    ions_data_dict[anno][0], col_blue]
-            elif anno[0] in "xyz":
-                colors.append(col_red)
-                mzs.append(ions_data_dict[anno][0])
-                self.peakAnnoData[fragData[1]] = [
-                    ions_data_dict[anno][0], col_red]
-        return np.array(colors), np.array(mzs)
+        if not self.filteredIonFragments:
+            return np.empty((0, 3), dtype=int), np.array([])
+
+        # positions of the filtered ions inside the PSM ion arrays
+        ion_indices = np.array([frag[0] for frag in self.filteredIonFragments])
+        # casting to a one-char string dtype keeps the ion type letter
+        ion_types = ion_annotations[ion_indices].astype("U1")
+        is_prefix = np.isin(ion_types, ["a", "b", "c"])
+        colors = np.where(is_prefix[:, None], col_blue, col_red)
+        mzs = ion_mzs[ion_indices]
+        return colors, mzs
 
     def updateWidgetDataFromRow(self, index: QModelIndex) -> None:
         """
@@ -246,6 +516,11 @@ class ControllerWidget(QWidget):
 
         """
         self.seleTableRT = round(index.siblingAtColumn(2).data(), 3)
+        spec_index = index.siblingAtColumn(1).data()
+        psm = self.psmStore.getPSM(spec_index)
+        annotation = None
+        if self.psmAnnotations is not None:
+            annotation = self.psmAnnotations.getAnnotation(spec_index)
 
         # set new spectrum with setting that all peaks should be displayed
         self.spectrum_widget.setSpectrum(
@@ -254,11 +529,8 @@ class ControllerWidget(QWidget):
 
         # only draw sequence with given ions for MS2 and error plot
         if index.siblingAtColumn(0).data() == "MS2":
-            self.drawSeqIons(
-                index.siblingAtColumn(
-                    6).data(), index.siblingAtColumn(7).data()
-            )
-            self.errorData(index.siblingAtColumn(7).data())
+            self.drawSeqIons(psm, annotation)
+            self.errorData(psm, annotation)
             if (
                     self.peakAnnoData is not None
             ):  # peakAnnoData created with existing ions in errorData
@@ -313,32 +585,35 @@ class ControllerWidget(QWidget):
         idx = (np.abs(array - value)).argmin()
         return idx
 
-    def drawSeqIons(self, seq: str, ions: dict) -> None:
+    def drawSeqIons(self, psm: Optional[PSMStruct],
+                    annotation: Optional[PSMAnnotation] = None) -> None:
         """
         Paints the peptide sequence inside the SequenceIons widget with the
         existing ions.
 
         Parameters
         ----------
-        seq : str
-            Peptide sequence for the given MS2 spectrum
+        psm : PSMStruct or None
+            The PSM of the given MS2 spectrum, containing the peptide sequence
+            and the ion arrays
 
-        ions : dict
-            Raw ion data information packed into a dictionary
+        annotation : PSMAnnotation or None
+            The precomputed annotation of the PSM, its matched ions are used
+            instead of the ions stored in the PSM
 
         """
-        seq = re.sub(
-            r"\([^)]*\)", "", seq
-        )  # remove content in brackets -> easier usage
-
         # only draw sequence for M2 with peptide and ion data
-        if seq not in "-" and ions not in "-":
+        if psm is not None and psm.sequence not in "-":
+            seq = re.sub(
+                r"\([^)]*\)", "", psm.sequence
+            )  # remove content in brackets -> easier usage
             self.seqIons_widget.setPeptide(seq)
-            # transform string data back to a dict
-            ions_dict = json.loads(ions)
-            if ions_dict != {}:
+            ion_annotations = psm.ion_annotations
+            if annotation is not None:
+                ion_annotations = annotation.ion_annotations
+            if ion_annotations.size != 0:
                 self.suffix, self.prefix = self.filterIonsPrefixSuffixData(
-                    ions_dict)
+                    ion_annotations)
                 self.seqIons_widget.setPrefix(self.prefix)
                 self.seqIons_widget.setSuffix(self.suffix)
             else:  # no ions data
@@ -350,15 +625,16 @@ class ControllerWidget(QWidget):
             self.seqIons_widget.clear()
             self.peakAnnoData = None
 
-    def filterIonsPrefixSuffixData(self, ions: dict) -> Tuple[dict, dict]:
+    def filterIonsPrefixSuffixData(self,
+                                   ions: np.ndarray) -> Tuple[dict, dict]:
         """
         Returns prefix and suffix dictionaries with the ion anntations and
         indices.
 
         Parameters
         ----------
-        ions : dict
-            Raw ion data information packed into a dictionary
+        ions : np.ndarray
+            Raw ion annotations of the PSM
 
         Returns
         -------
@@ -369,13 +645,13 @@ class ControllerWidget(QWidget):
         suffix: dict = {}
         prefix: dict = {}
 
-        ions_anno: list = list(ions.keys())
-        # annotation(s) of raw ion data (used as key(s))
+        # (position in ion arrays, short annotation) of the valid ions
         self.filteredIonFragments: list = []
 
-        for anno in ions_anno:
-            if anno[1].isdigit() and anno[0] in "abcyxz":
+        for pos, anno in enumerate(ions):
+            if len(anno) > 1 and anno[1].isdigit() and anno[0] in "abcyxz":
                 index, anno_short = self.filterAnnotationIon(anno)
+                self.filteredIonFragments.append((pos, anno_short))
                 if (
                         (index in suffix) and
                         (anno[0] in "yxz") and
@@ -412,5 +688,4 @@ class ControllerWidget(QWidget):
         """
         index = [s for s in re.findall(r"-?\d+\.?\d*", fragment_anno)][0]
         ion_anno = fragment_anno.split(index)[0] + index
-        self.filteredIonFragments.append((fragment_anno, ion_anno))
         return int(index), ion_anno
@@ -2,8 +2,10 @@ import numpy as np
 import pyqtgraph as pg
 from PyQt5.QtCore import QPointF
 from pyqtgraph import PlotWidget
-from nptyping import NDArray, Float, Int64
-from typing import List, Any
+from typing import List, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:  # evaluating the nptyping annotations is slow
+    from nptyping import NDArray, Float, Int64
 
 pg.setConfigOption("background", "w")  # white background
 pg.setConfigOption("foreground", "k")  # black peaks
@@ -40,6 +42,8 @@ class ErrorWidget(PlotWidget):
 
     """
 
+    _brushes: dict = {}  # color tuple -> QBrush
+
     def __init__(self, *args):
         PlotWidget.__init__(self)
 
@@ -52,9 +56,9 @@ class ErrorWidget(PlotWidget):
         self.getViewBox().sigXRangeChanged.connect(self._autoscaleYAxis)
         self.setMouseEnabled(x=True, y=False)
 
-    def setMassErrors(self, mz: NDArray[(Any, ...), Float],
-                      ppm: NDArray[(Any, ...), Float],
-                      colors: NDArray[(Any, ...), Int64]) -> None:
+    def setMassErrors(self, mz: "NDArray[(Any, ...), Float]",
+                      ppm: "NDArray[(Any, ...), Float]",
+                      colors: "NDArray[(Any, ...), Int64]") -> None:
         """
         Creates an error plot with mass spectrometry data.
 
@@ -89,17 +93,31 @@ class ErrorWidget(PlotWidget):
         self._plotMassErrors()
 
     def _plotMassErrors(self):
+        """
+        Draws all mass errors with one setData call. Each point gets the
+        brush of its ion series from a lookup over the unique colors.
+
+        """
+        if self._ppm.size == 0:
+            return
+        colors = np.asarray(self._color_lib).reshape(self._ppm.size, -1)
+        unique_colors, series = np.unique(
+            colors, axis=0, return_inverse=True)
+        brush_lookup = np.empty(len(unique_colors), dtype=object)
+        for i, color in enumerate(unique_colors):
+            brush_lookup[i] = self._getBrush(tuple(int(c) for c in color))
+
         scattergraph = pg.ScatterPlotItem()
-        points = []
-        for i in range(0, self._ppm.size):
-            points.append(
-                {
-                    "pos": (self._mzs[i], self._ppm[i]),
-                    "brush": pg.mkBrush(self._color_lib[i]),
-                }
-            )
-            scattergraph.addPoints(points)
-            self.addItem(scattergraph)
+        scattergraph.setData(
+            x=self._mzs, y=self._ppm, brush=brush_lookup[series.reshape(-1)]
+        )
+        self.addItem(scattergraph)
+
+    def _getBrush(self, color: tuple):
+        # brushes are shared by all plots, one per ion series color
+        if color not in ErrorWidget._brushes:
+            ErrorWidget._brushes[color] = pg.mkBrush(color)
+        return ErrorWidget._brushes[color]
 
     def _plotHorizontalLine(self):
         horizontalLine = pg.InfiniteLine(
@@ -115,7 +133,7 @@ class ErrorWidget(PlotWidget):
         if self.currMaxY:
             self.setYRange(self.currMaxY * (-1), self.currMaxY, update=False)
 
-    def _getMaxMassErrorInRange(self, xrange: List[float]) -> Int64:
+    def _getMaxMassErrorInRange(self, xrange: List[float]) -> "Int64":
         """
         Finds the maximum mass error point in either experimental or
         theoretical data.
@@ -0,0 +1,323 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from FileLoader import LoaderCancelled, loadMzML
+
+SPECTRUM_CACHE_SIZE = 64  # spectra with peaks kept by the lazy backends
+INDEX_OFFSET_TAG = b"<indexListOffset>"
+
+
+def mzMLCachePath(file_path):
+    # meta data of the cache, the peaks are stored in path + ".cached"
+    return file_path + ".cache.mzML"
+
+
+def isIndexedMzML(file_path):
+    """
+    Checks for the offset of the index at the end of an indexed mzML file,
+    only indexed files can be opened with random access.
+
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 1024))
+        return INDEX_OFFSET_TAG in f.read()
+
+
+def isMzMLCacheValid(file_path):
+    cache_path = mzMLCachePath(file_path)
+    if not (os.path.exists(cache_path) and
+            os.path.exists(cache_path + ".cached")):
+        return False
+    # the meta data is written last, it is only newer for complete caches
+    return os.path.getmtime(cache_path) >= os.path.getmtime(file_path)
+
+
+class LazyExperiment:
+    """
+    Read-only experiment whose peaks stay on disk. The meta data of all
+    spectra (MS level, RT, precursors, ...) is held in memory, the peaks
+    of a spectrum are read when it is requested. Provides the parts of the
+    MSExperiment interface used by the viewers.
+
+    ...
+
+    Methods
+    -------
+    getSpectrum(index=int)
+        Returns the spectrum with its peaks, recently used spectra are kept
+        in memory. Safe to call from the loader threads, the file handle and
+        the spectrum cache are shared under a lock
+
+    getMetaData()
+        Returns the spectra and chromatograms without peaks
+
+    getTIC()
+        Returns the total ion current chromatogram of the MS1 spectra
+
+    getMaxMZ(), getMaxRT()
+        Returns the largest m/z and RT of the run
+
+    """
+
+    def __init__(self, source, meta_data):
+        self._source = source
+        self._meta = meta_data
+        self._spectra = OrderedDict()
+        self._lock = threading.Lock()
+        self._tic = None
+        self._max_mz = None
+
+    def __len__(self):
+        return self._meta.size()
+
+    def __iter__(self):
+        # iterates the spectra without peaks
+        return iter(self._meta)
+
+    def size(self):
+        return self._meta.size()
+
+    def getNrSpectra(self):
+        return self._meta.size()
+
+    def getNrChromatograms(self):
+        return self._meta.getNrChromatograms()
+
+    def getMetaData(self):
+        return self._meta
+
+    def getSpectrum(self, index):
+        with self._lock:
+            spec = self._spectra.get(index)
+            if spec is None:
+                spec = self._source.getSpectrum(index)
+                self._spectra[index] = spec
+                if len(self._spectra) > SPECTRUM_CACHE_SIZE:
+                    self._spectra.popitem(last=False)
+            else:
+                self._spectra.move_to_end(index)
+            return spec
+
+    def getChromatogram(self, index):
+        with self._lock:
+            return self._source.getChromatogram(index)
+
+    def updateRanges(self):
+        return
+
+    def getMaxRT(self):
+        return max((spec.getRT() for spec in self._meta), default=0.0)
+
+    def getMaxMZ(self):
+        if self._max_mz is None:
+            self._max_mz = max(
+                (self._metaValue(index, spec, "highest observed m/z",
+                                 lambda mzs, ints: np.max(mzs, initial=0.0))
+                 for index, spec in enumerate(self._meta)),
+                default=0.0)
+        return self._max_mz
+
+    def getTIC(self):
+        import pyopenms  # imported on first use, slow to import
+
+        if self._tic is None:
+            rts, tic = [], []
+            for index, spec in enumerate(self._meta):
+                if spec.getMSLevel() == 1:
+                    rts.append(spec.getRT())
+                    tic.append(self._metaValue(
+                        index, spec, "total ion current",
+                        lambda mzs, ints: np.sum(ints)))
+            self._tic = (np.array(rts, dtype=np.float64),
+                         np.array(tic, dtype=np.float64))
+        chrom = pyopenms.MSChromatogram()
+        chrom.set_peaks(self._tic)
+        return chrom
+
+    def _metaValue(self, index, spec, name, from_peaks):
+        # most converters write TIC and m/z range into the meta data, the
+        # peaks are only read from disk if the value is missing
+        if spec.metaValueExists(name):
+            return float(spec.getMetaValue(name))
+        return float(from_peaks(*self.getSpectrum(index).get_peaks()))
+
+
+class CacheWritingConsumer:
+    """
+    Consumer for MzMLFile.transform which writes the peaks into the binary
+    cache file and collects the meta data, so the file is never held in
+    memory as a whole.
+
+    """
+
+    def __init__(self, cache_path, progress=None):
+        import pyopenms  # imported on first use, slow to import
+
+        self.cacher = pyopenms.MSDataCachedConsumer(cache_path + ".cached")
+        self.meta = pyopenms.MSExperiment()
+        self.progress = progress
+        self.total = 0
+        self.done = 0
+        self.cancelled = False
+
+    def setExperimentalSettings(self, settings):
+        self.cacher.setExperimentalSettings(settings)
+
+    def setExpectedSize(self, nr_spectra, nr_chromatograms):
+        self.cacher.setExpectedSize(nr_spectra, nr_chromatograms)
+        self.total = nr_spectra + nr_chromatograms
+
+    def consumeSpectrum(self, spec):
+        self.cacher.consumeSpectrum(spec)
+        spec.clear(False)
+        self.meta.addSpectrum(spec)
+        self._report()
+
+    def consumeChromatogram(self, chrom):
+        self.cacher.consumeChromatogram(chrom)
+        chrom.clear(False)
+        self.meta.addChromatogram(chrom)
+        self._report()
+
+    def _report(self):
+        self.done += 1
+        if self.progress is None:
+            return
+        try:
+            self.progress(self.done, self.total)
+        except LoaderCancelled:
+            self.cancelled = True
+            raise
+
+
+def writeMzMLCache(file_path, progress=None):
+    """
+    Streams an mzML file into a cached mzML (the meta data as small mzML
+    file and the peaks as binary file), which is opened within seconds
+    afterwards. A cancelled or failed conversion leaves no cache behind,
+    an OSError is raised before parsing if the cache cannot be written.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the mzML file
+
+    progress : LoadProgress or None
+        Optional callback reporting the number of converted spectra
+
+    Returns
+    -------
+    str
+        The path of the cache
+
+    """
+    import pyopenms  # imported on first use, slow to import
+
+    cache_path = mzMLCachePath(file_path)
+    # pyopenms does not report unwritable paths as OSError, probe first
+    open(cache_path + ".cached", "wb").close()
+    consumer = CacheWritingConsumer(cache_path, progress)
+    try:
+        pyopenms.MzMLFile().transform(file_path, consumer)
+        consumer.cacher = None  # closes the binary file
+        pyopenms.CachedMzMLHandler().writeMetadata(consumer.meta, cache_path)
+    except Exception:
+        consumer.cacher = None
+        for path in (cache_path, cache_path + ".cached"):
+            if os.path.exists(path):
+                os.remove(path)
+        if consumer.cancelled:
+            raise LoaderCancelled(progress.name)
+        raise
+    return cache_path
+
+
+def openInMemory(file_path, progress=None):
+    # reads all peaks, streamed with progress report if requested
+    if progress is not None:
+        return loadMzML(file_path, progress)
+    import pyopenms  # imported on first use, slow to import
+
+    exp = pyopenms.MSExperiment()
+    pyopenms.MzMLFile().load(file_path, exp)
+    return exp
+
+
+def openOnDisc(file_path, progress=None):
+    # random access to an indexed mzML file, only the meta data is parsed
+    import pyopenms  # imported on first use, slow to import
+
+    if not isIndexedMzML(file_path):
+        raise ValueError("%s is not an indexed mzML file" % file_path)
+    if progress is not None:
+        progress(0, 1)
+    source = pyopenms.OnDiscMSExperiment()
+    if not source.openFile(file_path):
+        raise ValueError("Could not open %s" % file_path)
+    exp = LazyExperiment(source, source.getMetaData())
+    if progress is not None:
+        progress(1, 1)
+    return exp
+
+
+def openCached(file_path, progress=None):
+    # the cache is written on first use and reused until the file changes
+    import pyopenms  # imported on first use, slow to import
+
+    if not isMzMLCacheValid(file_path):
+        try:
+            writeMzMLCache(file_path, progress)
+        except OSError:
+            # e.g. a read-only directory, the file is read without cache
+            print("Could not write the spectrum cache of %s" % file_path)
+            return openInMemory(file_path, progress)
+    source = pyopenms.CachedmzML()
+    pyopenms.CachedmzML.load(mzMLCachePath(file_path), source)
+    return LazyExperiment(source, source.getMetaData())
+
+
+# backend name -> open function(file_path, progress)
+EXPERIMENT_BACKENDS = {
+    "memory": openInMemory,
+    "ondisc": openOnDisc,
+    "cached": openCached,
+}
+
+
+def openExperiment(file_path, backend="memory", progress=None):
+    """
+    Opens an mzML file with one of the EXPERIMENT_BACKENDS, by default the
+    whole file is read into memory. The lazy backends are only used when
+    requested; "auto" picks an existing up-to-date cache, then random
+    access for indexed files and reads other files into memory.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the mzML file
+
+    backend : str
+        "auto" or a key of EXPERIMENT_BACKENDS
+
+    progress : LoadProgress or None
+        Optional callback reporting the loading progress
+
+    Returns
+    -------
+    MSExperiment or LazyExperiment
+        The opened experiment
+
+    """
+    if backend == "auto":
+        if isMzMLCacheValid(file_path):
+            backend = "cached"
+        elif isIndexedMzML(file_path):
+            backend = "ondisc"
+        else:
+            backend = "memory"
+    if backend not in EXPERIMENT_BACKENDS:
+        raise ValueError("Unknown experiment backend: %s" % backend)
+    return EXPERIMENT_BACKENDS[backend](file_path, progress)
@@ -0,0 +1,336 @@
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtWidgets import QMessageBox, QProgressDialog
+from typing import Callable, Dict
+
+
+class LoaderCancelled(Exception):
+    """Raised inside a load function when the user cancelled loading."""
+
+
+class LoadProgress:
+    """
+    Progress callback handed to the load functions. Calling it reports the
+    number of processed items and raises LoaderCancelled once the loading
+    was cancelled, so load functions stop at the next report. A total of 0
+    reports an indeterminate state, for steps without progress information.
+
+    """
+
+    def __init__(self, name: str, signals: "LoaderSignals",
+                 cancel_event: threading.Event):
+        self.name = name
+        self._signals = signals
+        self._cancel_event = cancel_event
+        self._last_percent = None
+
+    def isCancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def __call__(self, done: int, total: int) -> None:
+        if self._cancel_event.is_set():
+            raise LoaderCancelled(self.name)
+        # only emit if the percentage changed to keep the event queue small
+        percent = int(100 * done / total) if total > 0 else -1
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self._signals.sigProgress.emit(self.name, done, total)
+
+
+class ProgressConsumer:
+    """
+    Consumer for MzMLFile.transform which collects the spectra and
+    chromatograms into an MSExperiment and reports the progress.
+
+    """
+
+    def __init__(self, progress: LoadProgress):
+        import pyopenms  # imported on first use, slow to import
+
+        self.exp = pyopenms.MSExperiment()
+        self.progress = progress
+        self.total = 0
+        self.done = 0
+        self.cancelled = False
+
+    def setExperimentalSettings(self, settings):
+        return
+
+    def setExpectedSize(self, nr_spectra, nr_chromatograms):
+        self.total = nr_spectra + nr_chromatograms
+
+    def consumeSpectrum(self, spec):
+        self.exp.addSpectrum(spec)
+        self._report()
+
+    def consumeChromatogram(self, chrom):
+        self.exp.addChromatogram(chrom)
+        self._report()
+
+    def _report(self):
+        self.done += 1
+        try:
+            self.progress(self.done, self.total)
+        except LoaderCancelled:
+            # pyOpenMS may wrap exceptions raised in callbacks
+            self.cancelled = True
+            raise
+
+
+def loadMzML(file_path: str, progress: LoadProgress):
+    """
+    Streams an mzML file into an MSExperiment while reporting progress.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the mzML file
+
+    progress : LoadProgress
+        The progress callback of the running task
+
+    Returns
+    -------
+    MSExperiment
+        The loaded experiment
+
+    """
+    import pyopenms  # imported on first use, slow to import
+
+    consumer = ProgressConsumer(progress)
+    try:
+        pyopenms.MzMLFile().transform(file_path, consumer)
+    except Exception:
+        if consumer.cancelled:
+            raise LoaderCancelled(progress.name)
+        raise
+    consumer.exp.updateRanges()
+    return consumer.exp
+
+
+class LoaderSignals(QObject):
+    """
+    Signals of the load tasks, QRunnable itself can not emit signals.
+
+    ===============================  =========================================
+    **Signals:**
+    sigProgress                      Emitted with task name, processed and
+                                     total number of items.
+
+    sigFinished                      Emitted with task name and the loaded
+                                     data structure.
+
+    sigFailed                        Emitted with task name and error text.
+
+    sigCancelled                     Emitted with task name after the task
+                                     stopped due to a cancel request.
+    ===============================  =========================================
+    """
+
+    sigProgress = pyqtSignal(str, int, int)
+    sigFinished = pyqtSignal(str, object)
+    sigFailed = pyqtSignal(str, str)
+    sigCancelled = pyqtSignal(str)
+
+
+class LoadTask(QRunnable):
+    """
+    Runs a load function load_func(file_path, progress) in the thread pool.
+
+    """
+
+    def __init__(self, name: str, file_path: str, load_func: Callable,
+                 signals: LoaderSignals, cancel_event: threading.Event):
+        QRunnable.__init__(self)
+        self.name = name
+        self.file_path = file_path
+        self.load_func = load_func
+        self.signals = signals
+        self.progress = LoadProgress(name, signals, cancel_event)
+
+    def run(self):
+        try:
+            result = self.load_func(self.file_path, self.progress)
+        except LoaderCancelled:
+            self.signals.sigCancelled.emit(self.name)
+        except Exception as e:
+            self.signals.sigFailed.emit(self.name, str(e))
+        else:
+            if self.progress.isCancelled():
+                self.signals.sigCancelled.emit(self.name)
+            else:
+                self.signals.sigFinished.emit(self.name, result)
+
+
+class FileLoader(QObject):
+    """
+    Loads several files concurrently in the global QThreadPool.
+    The loaded data structures are handed over in one dictionary
+    (task name -> data) after all tasks finished, the signal is delivered
+    in the main thread so widgets can be created directly.
+
+    ===============================  =========================================
+    **Signals:**
+    sigProgress                      Emitted with the overall progress in
+                                     percent (-1 if unknown) and a status
+                                     text.
+
+    sigFinished                      Emitted with the dictionary of loaded
+                                     data after all tasks finished.
+
+    sigFailed                        Emitted with the error text if a task
+                                     failed, the remaining tasks are
+                                     cancelled.
+
+    sigCancelled                     Emitted after all tasks stopped due to a
+                                     cancel request.
+    ===============================  =========================================
+    """
+
+    sigProgress = pyqtSignal(int, str)
+    sigFinished = pyqtSignal(dict)
+    sigFailed = pyqtSignal(str)
+    sigCancelled = pyqtSignal()
+
+    def __init__(self, parent=None):
+        QObject.__init__(self, parent)
+        self._tasks: Dict[str, LoadTask] = {}
+        self._results: Dict[str, object] = {}
+        self._fractions: Dict[str, float] = {}
+        self._running = set()
+        self._indeterminate = set()
+        self._error = None
+        self._cancel_event = threading.Event()
+        self._signals = LoaderSignals(self)
+        self._signals.sigProgress.connect(self._onTaskProgress)
+        self._signals.sigFinished.connect(self._onTaskFinished)
+        self._signals.sigFailed.connect(self._onTaskFailed)
+        self._signals.sigCancelled.connect(self._onTaskCancelled)
+
+    def addTask(self, name: str, file_path: str,
+                load_func: Callable) -> None:
+        self._tasks[name] = LoadTask(
+            name, file_path, load_func, self._signals, self._cancel_event
+        )
+
+    def start(self) -> None:
+        pool = QThreadPool.globalInstance()
+        for name, task in self._tasks.items():
+            self._running.add(name)
+            self._fractions[name] = 0.0
+            pool.start(task)
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def isRunning(self) -> bool:
+        return len(self._running) > 0
+
+    def _onTaskProgress(self, name: str, done: int, total: int) -> None:
+        if name not in self._running:
+            return  # queued report of a task which already ended
+        if total > 0:
+            self._indeterminate.discard(name)
+            self._fractions[name] = done / total
+        else:
+            self._indeterminate.add(name)
+        percent = int(
+            100 * sum(self._fractions.values()) / len(self._fractions))
+        if self._running and self._running <= self._indeterminate:
+            percent = -1  # no running task reports its progress
+        self.sigProgress.emit(percent, "loading %s ..." % name)
+
+    def _onTaskFinished(self, name: str, result: object) -> None:
+        self._results[name] = result
+        self._fractions[name] = 1.0
+        self._taskEnded(name)
+
+    def _onTaskFailed(self, name: str, error: str) -> None:
+        if self._error is None:
+            self._error = "%s: %s" % (name, error)
+        self.cancel()
+        self._taskEnded(name)
+
+    def _onTaskCancelled(self, name: str) -> None:
+        self._taskEnded(name)
+
+    def _taskEnded(self, name: str) -> None:
+        self._running.discard(name)
+        self._indeterminate.discard(name)
+        if self._running:
+            return
+        if self._error is not None:
+            self.sigFailed.emit(self._error)
+        elif self._cancel_event.is_set():
+            self.sigCancelled.emit()
+        else:
+            self.sigFinished.emit(self._results)
+        self._results = {}
+
+
+class FileLoaderDialog(QProgressDialog):
+    """
+    Progress dialog for a FileLoader, the cancel button cancels all tasks.
+
+    """
+
+    def __init__(self, loader: FileLoader, parent=None):
+        QProgressDialog.__init__(
+            self, "loading ...", "Cancel", 0, 100, parent)
+        self.setWindowTitle("Open file")
+        self.setWindowModality(Qt.WindowModal)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.setMinimumDuration(0)
+        self.loader = loader
+        self.canceled.connect(self.loader.cancel)
+        self.loader.sigProgress.connect(self.onProgress)
+        self.loader.sigFinished.connect(self.close)
+        self.loader.sigFailed.connect(self.close)
+        self.loader.sigCancelled.connect(self.close)
+
+    def onProgress(self, percent: int, text: str) -> None:
+        if percent < 0:
+            self.setRange(0, 0)  # busy indicator
+        else:
+            self.setRange(0, 100)
+            self.setValue(percent)
+        self.setLabelText(text)
+
+
+class FileLoaderMixin:
+    """
+    Background loading for the main windows of the apps, the loader and
+    its progress dialog are kept in self.loader and self.loaderDialog.
+
+    """
+
+    loader = None
+
+    def startLoader(self, tasks, on_finished):
+        """
+        Loads the given files in the background, the main window stays
+        responsive and shows the progress.
+
+        Parameters
+        ----------
+        tasks : dict
+            Task name -> (file path, load function(file_path, progress))
+
+        on_finished : callable
+            Called in the main thread with the dictionary of loaded data
+
+        """
+        if self.loader is not None and self.loader.isRunning():
+            self.loader.cancel()
+        self.loader = FileLoader(self)
+        for name, (file_path, load_func) in tasks.items():
+            self.loader.addTask(name, file_path, load_func)
+        self.loader.sigFinished.connect(on_finished)
+        self.loader.sigFailed.connect(self.onLoadFailed)
+        self.loaderDialog = FileLoaderDialog(self.loader, self)
+        self.loader.start()
+
+    def onLoadFailed(self, error):
+        QMessageBox.critical(self, "ERROR", "Could not load file.\n" + error)
@@ -0,0 +1,187 @@
+from collections import namedtuple
+
+import numpy as np
+
+ISOTOPE_RATE = 0.00055  # expected 13C atoms per Da of an averagine protein
+MAX_ISOTOPES = 200
+
+# per mass scores, all arrays have the length of the scored masses
+IsotopeScoreStruct = namedtuple(
+    "IsotopeScoreStruct",
+    "cosine charge_score score",
+)
+
+
+class AveragineModel:
+    """
+    Averagine isotope distributions, precomputed per mass bin. The 13C
+    count of a protein is modelled as Poisson distribution with mean
+    mass * ISOTOPE_RATE, the distribution of a mass is read from the
+    table row of its bin. The table grows on demand to the largest mass
+    requested.
+
+    ...
+
+    Methods
+    -------
+    distributions(masses=ndarray, n_isotopes=int)
+        Returns the isotope distributions of the masses, normalized to a
+        maximum of 1
+
+    """
+
+    def __init__(self, bin_size=10.0, max_isotopes=MAX_ISOTOPES):
+        self.bin_size = bin_size
+        self.max_isotopes = max_isotopes
+        self._table = np.zeros((0, max_isotopes), dtype=np.float64)
+
+    def _extendTable(self, n_bins):
+        centers = (np.arange(n_bins) + 0.5) * self.bin_size
+        lam = centers[:, None] * ISOTOPE_RATE
+        k = np.arange(self.max_isotopes)[None, :]
+        # Poisson pmf in log space, log(k!) as cumulative sum
+        log_fact = np.concatenate(
+            ([0.0], np.cumsum(np.log(np.arange(1, self.max_isotopes)))))
+        table = np.exp(
+            k * np.log(lam) - lam - log_fact[None, :]
+        )
+        self._table = table / table.max(axis=1, keepdims=True)
+
+    def distributions(self, masses, n_isotopes=None):
+        masses = np.asarray(masses, dtype=np.float64)
+        bins = np.maximum((masses / self.bin_size).astype(np.int64), 0)
+        if bins.size and bins.max() >= self._table.shape[0]:
+            # grow in larger steps to avoid rebuilding for every new maximum
+            self._extendTable(max(int(bins.max()) + 1,
+                                  2 * self._table.shape[0]))
+        n_isotopes = n_isotopes or self.max_isotopes
+        return self._table[bins, :n_isotopes]
+
+
+def supportedCharges(mass_index, charges, isotopes):
+    """
+    Marks the matched peaks of supported charge states. A charge state of
+    a mass is supported by two adjacent matched isotopes, single hits
+    within wide high charge envelopes are mostly random.
+
+    Parameters
+    ----------
+    mass_index, charges, isotopes : numpy arrays of ints
+        The mass, charge state and isotope index of each matched peak
+
+    Returns
+    -------
+    numpy array of bools
+        True for every peak of a supported charge state
+
+    """
+    mass_index = np.asarray(mass_index, dtype=np.int64)
+    charges = np.asarray(charges, dtype=np.int64)
+    isotopes = np.asarray(isotopes, dtype=np.int64)
+    if mass_index.size == 0:
+        return np.zeros(0, dtype=bool)
+    key = mass_index * (int(charges.max()) + 1) + charges
+    order = np.lexsort((isotopes, key))
+    k, iso = key[order], isotopes[order]
+    adjacent = (k[1:] == k[:-1]) & (iso[1:] - iso[:-1] == 1)
+    return np.isin(key, k[1:][adjacent])
+
+
+def scoreMatches(model, masses, iso_counts, mass_index, charges, isotopes,
+                 intensities):
+    """
+    Scores how well the peaks matched to each mass in a spectrum support
+    it, for all masses at once.
+
+    The cosine compares the isotope profile summed over all supporting
+    charge states with the averagine distribution of the mass (missing
+    isotopes count as zero). The charge score is the intensity share of
+    the strongest run of consecutive supporting charge states, real
+    signals form a continuous charge envelope. The score is their product.
+
+    Parameters
+    ----------
+    model : AveragineModel
+        The isotope distribution model
+
+    masses : numpy array of floats
+        The monoisotopic masses
+
+    iso_counts : numpy array of ints
+        The number of isotopes considered per mass
+
+    mass_index : numpy array of ints
+        The mass of each matched peak (index into masses)
+
+    charges : numpy array of ints
+        The charge state of each matched peak
+
+    isotopes : numpy array of ints
+        The isotope index of each matched peak
+
+    intensities : numpy array of floats
+        The intensity of each matched peak
+
+
+    Returns
+    -------
+    IsotopeScoreStruct
+        The cosine, charge score and combined score of each mass, masses
+        without support score 0
+
+    """
+    masses = np.asarray(masses, dtype=np.float64)
+    iso_counts = np.asarray(iso_counts, dtype=np.int64)
+    n_masses = masses.size
+    cosine = np.zeros(n_masses)
+    charge_score = np.zeros(n_masses)
+    if n_masses == 0 or len(mass_index) == 0:
+        return IsotopeScoreStruct(cosine, charge_score, np.zeros(n_masses))
+
+    mass_index = np.asarray(mass_index, dtype=np.int64)
+    charges = np.asarray(charges, dtype=np.int64)
+    isotopes = np.asarray(isotopes, dtype=np.int64)
+    intensities = np.asarray(intensities, dtype=np.float64)
+
+    # (mass, charge) groups, only supported charge states are scored
+    charge_base = int(charges.max()) + 1
+    key = mass_index * charge_base + charges
+    groups, group_of = np.unique(key, return_inverse=True)
+    supported = supportedCharges(mass_index, charges, isotopes)
+    if not np.any(supported):
+        return IsotopeScoreStruct(cosine, charge_score, np.zeros(n_masses))
+    mass_index, charges = mass_index[supported], charges[supported]
+    isotopes, intensities = isotopes[supported], intensities[supported]
+    group_of = group_of[supported]
+
+    # cosine of the isotope profiles summed over charges
+    n_iso = int(iso_counts.max())
+    model_dist = model.distributions(masses, n_iso)
+    model_dist = np.where(
+        np.arange(n_iso)[None, :] < iso_counts[:, None], model_dist, 0.0)
+    observed = np.zeros((n_masses, n_iso))
+    np.add.at(observed, (mass_index, isotopes), intensities)
+    dot = np.einsum("ij,ij->i", observed, model_dist)
+    norm = np.linalg.norm(observed, axis=1) * \
+        np.linalg.norm(model_dist, axis=1)
+    np.divide(dot, norm, out=cosine, where=norm > 0)
+
+    # intensity share of the strongest consecutive charge run
+    group_int = np.bincount(group_of, weights=intensities,
+                            minlength=groups.size)
+    present = np.unique(group_of)  # sorted by mass, then charge
+    g_mass = groups[present] // charge_base
+    g_charge = groups[present] % charge_base
+    g_int = group_int[present]
+    new_run = np.ones(present.size, dtype=bool)
+    new_run[1:] = (g_mass[1:] != g_mass[:-1]) | \
+        (g_charge[1:] - g_charge[:-1] != 1)
+    run_id = np.cumsum(new_run) - 1
+    run_int = np.bincount(run_id, weights=g_int)
+    run_mass = g_mass[new_run]
+    best_run = np.zeros(n_masses)
+    np.maximum.at(best_run, run_mass, run_int)
+    total = np.bincount(g_mass, weights=g_int, minlength=n_masses)
+    np.divide(best_run, total, out=charge_score, where=total > 0)
+
+    return IsotopeScoreStruct(cosine, charge_score, cosine * charge_score)
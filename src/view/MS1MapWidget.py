@@ -1,5 +1,4 @@
 import numpy as np
-import pyopenms
 import pyqtgraph as pg
 from pyqtgraph import PlotWidget
 
@@ -24,6 +23,8 @@ class MS1MapWidget(PlotWidget):
         # create regular spaced data to turn spectra into an image
         """se_comment: max_intensity was never used"""
         """max_intensity = msexperiment.getMaxInt()"""
+        import pyopenms  # imported on first use, slow to import
+
         bilip = pyopenms.BilinearInterpolation()
         tmp = bilip.getData()
         tmp.resize(int(rows), int(cols), float())
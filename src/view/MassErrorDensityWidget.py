@@ -0,0 +1,192 @@
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import QRectF, QTimer
+from PyQt5.QtWidgets import QComboBox, QVBoxLayout, QWidget
+from typing import Dict, Tuple
+
+pg.setConfigOption("background", "w")  # white background
+pg.setConfigOption("foreground", "k")  # black peaks
+
+
+class MassErrorDensityWidget(QWidget):
+    """
+    Run-level QC view of mass errors. All matched fragment and precursor
+    errors of a run are binned into fixed 2D histograms (ppm against m/z
+    and against RT), shown as an image with marginal distributions.
+    Errors can be added incrementally, no graphics item is created per
+    point.
+
+    ...
+
+    Attributes
+    ----------
+    VIEWS : Tuple[Tuple[str, str, str], ...]
+        The selectable views as (label, error kind, x axis)
+
+
+    Methods
+    -------
+    setRanges(mz_max=float, rt_max=float, ppm_max=float)
+        Sets the histogram ranges and resets all counts
+
+    addErrors(kind=str, mzs=ndarray, rts=ndarray, ppm=ndarray)
+        Adds the errors of one kind ("fragment" or "precursor") to the
+        histograms
+
+    clear()
+        Resets all counts
+
+    """
+
+    VIEWS = (
+        ("Fragment ppm vs m/z", "fragment", "m/z"),
+        ("Fragment ppm vs RT", "fragment", "RT"),
+        ("Precursor ppm vs m/z", "precursor", "m/z"),
+        ("Precursor ppm vs RT", "precursor", "RT"),
+    )
+
+    def __init__(self, *args, x_bins=400, ppm_bins=200):
+        QWidget.__init__(self, *args)
+        self.setWindowTitle("Mass error density")
+        self._x_bins = x_bins
+        self._ppm_bins = ppm_bins
+        self._ranges = {"m/z": (0.0, 2000.0), "RT": (0.0, 3600.0)}
+        self._ppm_max = 20.0
+        self._counts: Dict[Tuple[str, str], np.ndarray] = {}
+
+        layout = QVBoxLayout(self)
+        self.viewBox = QComboBox()
+        self.viewBox.addItems([view[0] for view in self.VIEWS])
+        self.viewBox.currentIndexChanged.connect(self.redraw)
+        layout.addWidget(self.viewBox)
+
+        self.graphics = pg.GraphicsLayoutWidget()
+        layout.addWidget(self.graphics)
+        self._initPlots()
+
+        # coalesce redraws while many chunks arrive
+        self._redrawTimer = QTimer(self)
+        self._redrawTimer.setSingleShot(True)
+        self._redrawTimer.setInterval(200)
+        self._redrawTimer.timeout.connect(self.redraw)
+
+        self.clear()
+
+    def _initPlots(self):
+        self.xMarginal = self.graphics.addPlot(row=0, col=0)
+        self.xMarginal.setMaximumHeight(120)
+        self.xMarginal.hideAxis("bottom")
+        self.xMarginal.setLabel("left", "count")
+
+        self.densityPlot = self.graphics.addPlot(row=1, col=0)
+        self.densityPlot.setLabel("left", "ppm")
+        self.image = pg.ImageItem()
+        self.densityPlot.addItem(self.image)
+        self.densityPlot.addItem(
+            pg.InfiniteLine(pos=0.0, angle=0, pen=pg.mkPen("k", width=1)))
+
+        self.ppmMarginal = self.graphics.addPlot(row=1, col=1)
+        self.ppmMarginal.setMaximumWidth(120)
+        self.ppmMarginal.hideAxis("left")
+        self.ppmMarginal.setLabel("bottom", "count")
+
+        self.xMarginal.setXLink(self.densityPlot)
+        self.ppmMarginal.setYLink(self.densityPlot)
+
+        self.xCurve = self.xMarginal.plot(
+            stepMode=True, fillLevel=0, brush=(0, 0, 200, 120))
+        self.ppmCurve = self.ppmMarginal.plot(pen=pg.mkPen((0, 0, 200)))
+
+        pos = np.array([0.0, 0.01, 0.3, 1.0])
+        color = np.array(
+            [
+                (255, 255, 255, 255),
+                (0, 0, 255, 255),
+                (255, 0, 0, 255),
+                (255, 255, 0, 255),
+            ],
+            dtype=np.ubyte,
+        )
+        cmap = pg.ColorMap(pos, color)
+        self.image.setLookupTable(cmap.getLookupTable(0.0, 1.0, 256))
+
+    def setRanges(self, mz_max: float, rt_max: float,
+                  ppm_max: float = 20.0) -> None:
+        self._ranges = {"m/z": (0.0, float(mz_max)),
+                        "RT": (0.0, float(rt_max))}
+        self._ppm_max = float(ppm_max)
+        self.clear()
+
+    def clear(self) -> None:
+        self._counts = {
+            (view[1], view[2]): np.zeros(
+                (self._x_bins, self._ppm_bins), dtype=np.int64)
+            for view in self.VIEWS
+        }
+        self.redraw()
+
+    def addErrors(self, kind: str, mzs: np.ndarray, rts: np.ndarray,
+                  ppm: np.ndarray) -> None:
+        """
+        Adds mass errors to the histograms of the given kind.
+
+        Parameters
+        ----------
+        kind : str
+            Either "fragment" or "precursor"
+
+        mzs : numpy array of floats
+            The m/z values of the matched ions
+
+        rts : numpy array of floats
+            The retention times (seconds) of the spectra of the ions
+
+        ppm : numpy array of floats
+            The mass errors in ppm
+
+        """
+        ppm = np.asarray(ppm, dtype=np.float64)
+        for x_axis, values in (("m/z", mzs), ("RT", rts)):
+            self._counts[(kind, x_axis)] += self._histogram(
+                np.asarray(values, dtype=np.float64), ppm, x_axis)
+        self._redrawTimer.start()
+
+    def _histogram(self, x: np.ndarray, ppm: np.ndarray,
+                   x_axis: str) -> np.ndarray:
+        # bincount on flat bin indices is faster than histogram2d
+        x_min, x_max = self._ranges[x_axis]
+        # unmatched ions have NaN errors, they have no bin
+        finite = np.isfinite(x) & np.isfinite(ppm)
+        x, ppm = x[finite], ppm[finite]
+        # far outside values are clipped before the cast, then dropped
+        ix = np.floor(np.clip(
+            (x - x_min) / (x_max - x_min) * self._x_bins,
+            -1, self._x_bins)).astype(np.int64)
+        iy = np.floor(np.clip(
+            (ppm + self._ppm_max) / (2 * self._ppm_max) * self._ppm_bins,
+            -1, self._ppm_bins)).astype(np.int64)
+        valid = (ix >= 0) & (ix < self._x_bins) & \
+            (iy >= 0) & (iy < self._ppm_bins)
+        flat = ix[valid] * self._ppm_bins + iy[valid]
+        return np.bincount(
+            flat, minlength=self._x_bins * self._ppm_bins
+        ).reshape(self._x_bins, self._ppm_bins)
+
+    def redraw(self) -> None:
+        _, kind, x_axis = self.VIEWS[self.viewBox.currentIndex()]
+        counts = self._counts[(kind, x_axis)]
+        x_min, x_max = self._ranges[x_axis]
+        x_unit = "RT (sec)" if x_axis == "RT" else "m/z"
+        self.densityPlot.setLabel("bottom", x_unit)
+
+        # log scale keeps sparse regions visible next to dense ones
+        self.image.setImage(np.log1p(counts), autoLevels=True)
+        self.image.setRect(
+            QRectF(x_min, -self._ppm_max, x_max - x_min, 2 * self._ppm_max))
+
+        x_edges = np.linspace(x_min, x_max, self._x_bins + 1)
+        ppm_centers = np.linspace(
+            -self._ppm_max, self._ppm_max, self._ppm_bins, endpoint=False
+        ) + self._ppm_max / self._ppm_bins
+        self.xCurve.setData(x_edges, counts.sum(axis=1))
+        self.ppmCurve.setData(counts.sum(axis=0), ppm_centers)
@@ -0,0 +1,707 @@
+import os
+import sys
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PeakMatching import matchNearestPeaks
+from IsotopeScoring import ISOTOPE_RATE, AveragineModel, scoreMatches
+
+# import pyopenms.Constants
+# define Constant locally until bug in pyOpenMS is fixed
+PROTON_MASS_U = 1.0072764667710
+C13C12_MASSDIFF_U = 1.0033548378
+
+# averagine unit (Senko et al. 1995): atoms, monoisotopic and average mass
+AVERAGINE = (
+    ("C", 4.9384, 12.0, 12.0107),
+    ("H", 7.7583, 1.00782503207, 1.00794),
+    ("N", 1.3577, 14.0030740048, 14.0067),
+    ("O", 1.4773, 15.99491461956, 15.9994),
+    ("S", 0.0417, 31.97207100, 32.065),
+)
+
+# structure for each input masses
+# mz_theo_arr : charges x isotopes m/z array, rows match charges
+MassDataStruct = namedtuple(
+    "MassDataStruct",
+    "mz_theo_arr charges \
+                            startRT endRT maxIntensity scanCount \
+                            color marker",
+)
+#                            isMono isAvg
+
+PeakMatchStruct = namedtuple(
+    "PeakMatchStruct",
+    "mass_index charges isotopes peak_index mz intensity ppm",
+)
+DEFAULT_TOL = 10.0  # ppm
+THEO_CACHE_SIZE = 100000  # memoized (mass, charge range) m/z arrays
+THEO_CHUNK_SIZE = 1024  # masses per broadcast, bounds the tensor size
+SCORE_CHUNK_SIZE = 16  # spectra per process pool job of the score export
+SCORE_MAX_PENDING = 8  # jobs in flight per worker, bounds the memory
+
+# columns of a FLASHDeconv result file (*.tsv) with their types
+FD_RESULT_DTYPES = {
+    "FeatureIndex": np.int64,
+    "FileName": str,
+    "MonoisotopicMass": np.float64,
+    "AverageMass": np.float64,
+    "MassCount": np.int64,
+    "StartRetentionTime": np.float64,
+    "EndRetentionTime": np.float64,
+    "RetentionTimeDuration": np.float64,
+    "ApexRetentionTime": np.float64,
+    "SumIntensity": np.float64,
+    "MaxIntensity": np.float64,
+    "FeatureQuantity": np.float64,
+    "MinCharge": np.int64,
+    "MaxCharge": np.int64,
+    "ChargeCount": np.int64,
+    "IsotopeCosineScore": np.float64,
+}
+FD_REQUIRED_COLUMNS = (
+    "MonoisotopicMass",
+    "AverageMass",
+    "StartRetentionTime",
+    "EndRetentionTime",
+)
+# columns used by the viewer
+FD_VIEWER_COLUMNS = FD_REQUIRED_COLUMNS + ("MassCount", "MaxIntensity")
+
+# marker symbols and colors of the masses, by row
+SymbolSet = ("o", "s", "t", "t1", "t2", "t3", "d", "p", "star")
+RGBs = [
+    [0, 0, 200],
+    [0, 128, 0],
+    [19, 234, 201],
+    [195, 46, 212],
+    [237, 177, 32],
+    [54, 55, 55],
+    [0, 114, 189],
+    [217, 83, 25],
+    [126, 47, 142],
+    [119, 172, 48],
+]
+
+
+def averagineOffsetTable(max_mass=1000000.0, n_points=20000):
+    """
+    Average minus monoisotopic mass of averagine compositions with whole
+    numbers of atoms, tabulated over the average mass range.
+
+    Returns
+    -------
+    avg_masses : numpy array of floats
+        The average masses, ascending
+
+    offsets : numpy array of floats
+        The average to monoisotopic mass offset at each average mass
+
+    """
+    atoms = np.array([a[1] for a in AVERAGINE])
+    mono = np.array([a[2] for a in AVERAGINE])
+    avg = np.array([a[3] for a in AVERAGINE])
+    units = np.linspace(0.0, max_mass / atoms.dot(avg), n_points)
+    counts = np.round(units[:, None] * atoms[None, :])
+    avg_masses = counts.dot(avg)
+    order = np.argsort(avg_masses, kind="stable")
+    return avg_masses[order], (avg_masses - counts.dot(mono))[order]
+
+
+AVG_OFFSET_TABLE = averagineOffsetTable()
+
+
+def averageToMonoisotopic(avg_masses):
+    """
+    Converts average masses to monoisotopic masses by interpolating the
+    averagine offset table.
+
+    """
+    avg_masses = np.asarray(avg_masses, dtype=np.float64)
+    return avg_masses - np.interp(avg_masses, *AVG_OFFSET_TABLE)
+
+
+def isotopeCounts(masses):
+    """
+    Number of isotope peaks to consider per mass. The C13 count of a
+    protein is roughly Poisson distributed with mean mass * ISOTOPE_RATE,
+    the peaks up to mean + 3 standard deviations are kept.
+
+    """
+    lam = np.asarray(masses, dtype=np.float64) * ISOTOPE_RATE
+    return (np.ceil(lam + 3 * np.sqrt(lam)) + 1).astype(np.int64).clip(4, 200)
+
+
+def calculateTheoMzTensor(masses, cs_range):
+    """
+    Calculates the m/z of all isotope peaks of all masses in all charge
+    states with one broadcast.
+
+    Parameters
+    ----------
+    masses : numpy array of floats
+        The monoisotopic masses
+
+    cs_range : list of two ints
+        The minimum and maximum charge state
+
+    Returns
+    -------
+    charges : numpy array of ints
+        The charge states
+
+    mz : numpy array of floats
+        masses x charges x isotopes m/z tensor, isotopes beyond the
+        isotope count of a mass are NaN
+
+    iso_counts : numpy array of ints
+        The isotope count of each mass
+
+    """
+    masses = np.asarray(masses, dtype=np.float64)
+    charges = np.arange(cs_range[0], cs_range[1] + 1)
+    iso_counts = isotopeCounts(masses)
+    n_iso = int(iso_counts.max()) if masses.size else 0
+    isotopes = np.arange(n_iso)
+
+    cs = charges[None, :, None].astype(np.float64)
+    mz = (masses[:, None, None] + isotopes[None, None, :] * C13C12_MASSDIFF_U
+          + cs * PROTON_MASS_U) / cs
+    missing = isotopes[None, None, :] >= iso_counts[:, None, None]
+    mz[np.broadcast_to(missing, mz.shape)] = np.nan
+    return charges, mz, iso_counts
+
+
+def massTableCachePath(file_path):
+    return file_path + ".columns.npy"
+
+
+def readMassTableHeader(file_path):
+    with open(file_path) as f:
+        return f.readline().rstrip("\r\n").split("\t")
+
+
+def _loadMassTableCache(file_path, names):
+    # the cache is valid if newer than the file and has all columns
+    cache_path = massTableCachePath(file_path)
+    try:
+        if os.stat(cache_path).st_mtime_ns < os.stat(file_path).st_mtime_ns:
+            return None
+        table = np.load(cache_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if table.dtype.names is None or \
+            not all(name in table.dtype.names for name in names):
+        return None
+    return {name: table[name] for name in names}
+
+
+def readMassTable(file_path, usecols=None):
+    """
+    Reads the columns of a FLASHDeconv result file or a plain mass list
+    (tab separated, with header) into numpy arrays. Result columns are
+    parsed with the types of FD_RESULT_DTYPES, columns of other files as
+    floats. The parsed columns are cached as structured array next to
+    the file, later reads memory-map the cache instead of parsing again.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the mass file
+
+    usecols : list of str or None
+        The columns to read (if present), all columns if None
+
+    Returns
+    -------
+    Dict[str, numpy array]
+        The column arrays by name, in the order of the file
+
+    """
+    header = readMassTableHeader(file_path)
+    names = [n for n in header if usecols is None or n in usecols]
+    columns = _loadMassTableCache(file_path, names)
+    if columns is not None:
+        return columns
+
+    if all(name in header for name in FD_REQUIRED_COLUMNS):
+        dtype = {n: FD_RESULT_DTYPES[n] for n in names
+                 if n in FD_RESULT_DTYPES}
+    else:
+        dtype = {n: np.float64 for n in names}
+    import pandas as pd  # imported on first use, slow to import
+
+    df = pd.read_csv(file_path, sep="\t", header=0, usecols=names,
+                     dtype=dtype)
+    arrays = []
+    for name in names:
+        values = df[name].to_numpy()
+        if values.dtype == object:  # fixed width strings can be mapped
+            values = values.astype(str)
+        arrays.append(values)
+    table = np.empty(len(df), dtype=[
+        (name, values.dtype) for name, values in zip(names, arrays)])
+    for name, values in zip(names, arrays):
+        table[name] = values
+    try:
+        np.save(massTableCachePath(file_path), table)
+    except OSError:
+        print("Could not write the cache of %s" % file_path)
+    return {name: table[name] for name in names}
+
+
+def matchTheoreticalPeaks(mass_structs, exp_mzs, exp_ints, tolerance):
+    """
+    Matches the isotope peaks of all charge states of all masses against
+    the peaks of a spectrum in one searchsorted pass.
+
+    Parameters
+    ----------
+    mass_structs : list of MassDataStruct
+        The masses to match, mass_index refers to this order
+
+    exp_mzs : numpy array of floats
+        The m/z values of the spectrum
+
+    exp_ints : numpy array of floats
+        The intensities of the spectrum
+
+    tolerance : float
+        The maximal m/z deviation in ppm
+
+    Returns
+    -------
+    PeakMatchStruct
+        Parallel arrays with one entry per matched theoretical peak (ppm
+        is the error of the experimental against the theoretical m/z),
+        theoretical peaks without a peak of non-zero intensity within the
+        tolerance are left out
+
+    """
+    exp_mzs = np.asarray(exp_mzs, dtype=np.float64)
+    exp_ints = np.asarray(exp_ints, dtype=np.float64)
+    if exp_mzs.size > 1 and np.any(exp_mzs[1:] < exp_mzs[:-1]):
+        order = np.argsort(exp_mzs, kind="stable")
+        exp_mzs, exp_ints = exp_mzs[order], exp_ints[order]
+
+    theo_mzs, mass_index, charges, isotopes = [], [], [], []
+    for index, mds in enumerate(mass_structs):
+        n_cs, n_iso = mds.mz_theo_arr.shape
+        theo_mzs.append(mds.mz_theo_arr.ravel())
+        mass_index.append(np.full(n_cs * n_iso, index, dtype=np.int64))
+        charges.append(np.repeat(mds.charges, n_iso))
+        isotopes.append(np.tile(np.arange(n_iso), n_cs))
+    if not theo_mzs:
+        empty = np.array([], dtype=np.int64)
+        return PeakMatchStruct(empty, empty, empty, empty,
+                               np.array([]), np.array([]), np.array([]))
+
+    theo_mzs = np.concatenate(theo_mzs)
+    # most high charge and isotope positions fall outside of the spectrum
+    matched = np.zeros(theo_mzs.size, dtype=bool)
+    if exp_mzs.size:
+        margin = tolerance * 1e-6
+        matched = (theo_mzs >= exp_mzs[0] * (1 - margin)) & \
+            (theo_mzs <= exp_mzs[-1] * (1 + margin))
+    in_range = np.nonzero(matched)[0]
+    peak_index, ppm = matchNearestPeaks(
+        theo_mzs[in_range], exp_mzs, tolerance, True)
+    found = peak_index >= 0
+    found[found] = exp_ints[peak_index[found]] > 0
+    matched[in_range] = found
+    peak_index = peak_index[found]
+    return PeakMatchStruct(
+        mass_index=np.concatenate(mass_index)[matched],
+        charges=np.concatenate(charges)[matched],
+        isotopes=np.concatenate(isotopes)[matched],
+        peak_index=peak_index,
+        mz=exp_mzs[peak_index],
+        intensity=exp_ints[peak_index],
+        ppm=ppm[found],
+    )
+
+
+def getTheoMassStructs(masses, cs_range):
+    """
+    MassDataStructs holding only the theoretical m/z arrays and charges,
+    for matching without a MassList (e.g. in worker processes).
+
+    """
+    mass_structs = []
+    for start in range(0, len(masses), THEO_CHUNK_SIZE):
+        charges, mz, iso_counts = calculateTheoMzTensor(
+            masses[start:start + THEO_CHUNK_SIZE], cs_range)
+        mass_structs.extend(
+            MassDataStruct(arr[:, :n], charges, 0, 0, 0, 0, None, None)
+            for arr, n in zip(mz, iso_counts)
+        )
+    return mass_structs
+
+
+def scoreMassStructs(model, masses, mass_structs, matches):
+    """
+    Isotope pattern scores of the masses of one spectrum, see
+    IsotopeScoring.scoreMatches.
+
+    """
+    return scoreMatches(
+        model, masses,
+        [mds.mz_theo_arr.shape[1] for mds in mass_structs],
+        matches.mass_index, matches.charges, matches.isotopes,
+        matches.intensity,
+    )
+
+
+_match_worker: dict = {}
+
+
+def initMatchWorker(masses, starts, ends, cs_range, tolerance):
+    """
+    Initializer of the process pool workers of the score export and the
+    batch annotation, the masses and their elution windows are sent once
+    per worker.
+
+    """
+    _match_worker["masses"] = masses
+    _match_worker["index"] = RTIntervalIndex(starts, ends)
+    _match_worker["cs_range"] = cs_range
+    _match_worker["tolerance"] = tolerance
+    _match_worker["model"] = AveragineModel()
+
+
+def matchSpectrum(rt, mzs, ints):
+    """
+    Matches and scores the masses eluting at rt against the peaks of one
+    spectrum, runs in a worker set up by initMatchWorker.
+
+    Returns
+    -------
+    masses : numpy array of floats
+        The masses eluting at rt
+
+    matches : PeakMatchStruct
+        The matched isotope peaks, mass_index refers to masses
+
+    scores : IsotopeScoreStruct
+        The isotope pattern scores of the masses
+
+    """
+    w = _match_worker
+    masses = w["masses"][w["index"].query(rt)]
+    mass_structs = getTheoMassStructs(masses, w["cs_range"])
+    matches = matchTheoreticalPeaks(mass_structs, mzs, ints, w["tolerance"])
+    scores = scoreMassStructs(w["model"], masses, mass_structs, matches)
+    return masses, matches, scores
+
+
+def _scoreChunk(jobs):
+    # scores the masses eluting at each spectrum, runs in a worker process
+    results = []
+    for spec_index, rt, mzs, ints in jobs:
+        masses, _, scores = matchSpectrum(rt, mzs, ints)
+        results.append((spec_index, rt, masses, scores))
+    return results
+
+
+def scoreExperiment(exp, masses, starts, ends, cs_range=(2, 100),
+                    tolerance=DEFAULT_TOL, max_workers=None, progress=None,
+                    ms_level=1):
+    """
+    Scores every mass in every spectrum of one MS level in its elution
+    window inside a process pool.
+
+    Parameters
+    ----------
+    exp : MSExperiment or LazyExperiment
+        The spectra to score, read one by one
+
+    masses : numpy array of floats
+        The monoisotopic masses
+
+    starts, ends : numpy arrays of floats
+        The elution window (RT) of each mass
+
+    cs_range : list of two ints
+        The minimum and maximum charge state
+
+    tolerance : float
+        The m/z tolerance in ppm
+
+    max_workers : int or None
+        Number of worker processes, default is the number of CPUs
+
+    progress : LoadProgress or None
+        Optional callback reporting the number of scored spectra
+
+    ms_level : int
+        Only spectra of this MS level are scored
+
+    Returns
+    -------
+    list of tuples
+        (spectrum index, RT, masses, IsotopeScoreStruct) per spectrum
+
+    """
+    # the MS level is read without peaks from lazy experiments
+    scans = [spec_index for spec_index, spec in enumerate(exp)
+             if spec.getMSLevel() == ms_level]
+
+    def chunks():
+        jobs = []
+        for spec_index in scans:
+            # lazy experiments read the peaks only here
+            spec = exp.getSpectrum(spec_index)
+            mzs, ints = spec.get_peaks()
+            jobs.append((spec_index, spec.getRT(),
+                         np.asarray(mzs), np.asarray(ints)))
+            if len(jobs) == SCORE_CHUNK_SIZE:
+                yield jobs
+                jobs = []
+        if jobs:
+            yield jobs
+
+    results = []
+    pending = deque()
+    max_pending = SCORE_MAX_PENDING * (max_workers or os.cpu_count() or 1)
+
+    def collectNext():
+        results.extend(pending.popleft().result())
+        if progress is not None:
+            progress(len(results), len(scans))
+
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=initMatchWorker,
+        initargs=(np.asarray(masses, dtype=np.float64), starts, ends,
+                  tuple(cs_range), tolerance),
+    )
+    try:
+        for jobs in chunks():
+            pending.append(executor.submit(_scoreChunk, jobs))
+            # results are collected in order, the oldest job is waited for
+            while len(pending) > max_pending:
+                collectNext()
+        while pending:
+            collectNext()
+    finally:
+        # on cancel, pending chunks are dropped
+        executor.shutdown(wait=True, cancel_futures=True)
+    return results
+
+
+def writeScores(file_path, results):
+    with open(file_path, "w") as out:
+        out.write("ScanIndex\tRetentionTime\tMonoisotopicMass\t"
+                  "IsotopeCosine\tChargeScore\tScore\n")
+        for spec_index, rt, masses, scores in results:
+            for i in range(masses.size):
+                out.write("%d\t%.2f\t%.6f\t%.4f\t%.4f\t%.4f\n" % (
+                    spec_index, rt, masses[i], scores.cosine[i],
+                    scores.charge_score[i], scores.score[i]))
+
+
+class MassList:
+    """
+    Input masses of the FLASHDeconv viewer. The columns of a FLASHDeconv
+    result file are kept as numpy arrays (one entry per row) and a hash
+    index maps each mass to its row, so looking up the data of a mass
+    does not search the list. Plain mass lists of average masses (isAvg)
+    are converted to monoisotopic masses on loading.
+
+    """
+
+    def __init__(self, file_path, isAvg=False):
+        self.isAvg = isAvg
+        self.columns = dict()
+        self.mass_index = dict()  # mass -> row in the file
+        self.added_index = dict()  # mass added by the user -> marker index
+        self._theo_cache = OrderedDict()
+        self.isFDresult = False
+        if not file_path:
+            self.mass_list = []
+            return
+
+        self.setRTMassDict(file_path)
+        self.setMassList()
+
+    def setMassList(self):
+        if self.isFDresult:  # parsing a result file from FLASHDeconv
+            self.mass_list = self.columns["MonoisotopicMass"].tolist()
+        else:
+            masses = np.column_stack(
+                [np.asarray(c, dtype=np.float64)
+                 for c in self.columns.values()]).ravel()
+            if self.isAvg:
+                masses = averageToMonoisotopic(masses)
+            self.mass_list = masses.tolist()
+        # first row of each mass, like list.index
+        for index, mass in enumerate(self.mass_list):
+            self.mass_index.setdefault(mass, index)
+
+    def setMassStruct(self, cs_range=[2, 100]):
+        return self.getMassStruct(self.mass_list, cs_range)
+
+    def getMassStruct(self, masslist, cs_range=[2, 100]):
+        mds_dict = {}
+        masslist = list(masslist)
+        theo_mzs = self.getTheoMzArrays(masslist, cs_range)
+        charges = np.arange(cs_range[0], cs_range[1] + 1)
+
+        for mass, theo_mz in zip(masslist, theo_mzs):
+            if mass in mds_dict:
+                continue
+            mNum = self.mass_index.get(mass)
+            if mNum is None:
+                mNum = self.added_index[mass]
+            mds_dict[mass] = self.setMassDataStructItem(
+                mNum, mass, cs_range, theo_mz, charges)
+        return mds_dict
+
+    def setMassDataStructItem(self, index, mass, cs_range, theo_mz=None,
+                              charges=None):
+        marker = SymbolSet[index % len(SymbolSet)]
+        color = RGBs[index % len(RGBs)]
+        if theo_mz is None:
+            theo_mz = self.calculateTheoMzList(mass, cs_range)
+        if charges is None:
+            charges = np.arange(cs_range[0], cs_range[1] + 1)
+        rt_s = 0
+        rt_e = sys.maxsize
+        mi = 0
+        c = 0
+        row = self.mass_index.get(mass)
+        if self.isFDresult and row is not None:
+            rt_s = float(self.columns["StartRetentionTime"][row])
+            rt_e = float(self.columns["EndRetentionTime"][row])
+            mi = float(self.columns["MaxIntensity"][row])
+            c = int(self.columns["MassCount"][row])
+
+        return MassDataStruct(
+            mz_theo_arr=theo_mz,
+            charges=charges,
+            startRT=rt_s,
+            endRT=rt_e,
+            maxIntensity=mi,
+            scanCount=c,
+            marker=marker,
+            color=color,
+        )
+
+    def calculateTheoMzList(self, mass, cs_range, mz_range=(0, 0)):
+        return self.getTheoMzArrays([mass], cs_range)[0]
+
+    def getTheoMzArrays(self, masses, cs_range):
+        """
+        Returns the charges x isotopes m/z array of each mass. The arrays
+        are memoized per (mass, charge range) with LRU eviction, missing
+        masses are calculated together in broadcasts of THEO_CHUNK_SIZE.
+
+        Parameters
+        ----------
+        masses : list of floats
+            The monoisotopic masses
+
+        cs_range : list of two ints
+            The minimum and maximum charge state
+
+        Returns
+        -------
+        list of numpy arrays
+            The m/z arrays in the order of the masses
+
+        """
+        cache = self._theo_cache
+        cs_key = (int(cs_range[0]), int(cs_range[1]))
+        missing = sorted({m for m in masses if (m, cs_key) not in cache})
+
+        for start in range(0, len(missing), THEO_CHUNK_SIZE):
+            chunk = missing[start:start + THEO_CHUNK_SIZE]
+            _, mz, iso_counts = calculateTheoMzTensor(chunk, cs_key)
+            for mass, arr, n in zip(chunk, mz, iso_counts):
+                cache[(mass, cs_key)] = arr[:, :n].copy()
+
+        result = []
+        for mass in masses:
+            key = (mass, cs_key)
+            cache.move_to_end(key)
+            result.append(cache[key])
+        while len(cache) > THEO_CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+
+    def toMonoisotopic(self, mass):
+        # masses entered by the user have the type of the input list
+        if self.isAvg and not self.isFDresult:
+            return float(averageToMonoisotopic(mass))
+        return mass
+
+    def addNewMass(self, new_mass, index, cs_range):
+        # added masses have no row, their index only selects marker/color
+        self.added_index.setdefault(new_mass, index)
+        return self.setMassDataStructItem(index, new_mass, cs_range)
+
+    def isValidFLASHDeconvFile(self):
+        return all(name in self.columns for name in FD_REQUIRED_COLUMNS)
+
+    def setRTMassDict(self, file_path):
+        # columnar store, rows as in mass_list. Of result files only the
+        # columns used by the viewer are read
+        header = readMassTableHeader(file_path)
+        if all(name in header for name in FD_REQUIRED_COLUMNS):
+            self.columns = readMassTable(file_path, FD_VIEWER_COLUMNS)
+        else:
+            self.columns = readMassTable(file_path)
+        self.isFDresult = self.isValidFLASHDeconvFile()
+
+
+class RTIntervalIndex:
+    """
+    Static centered interval tree over the elution windows [startRT,
+    endRT] of the masses. Each node keeps the windows containing its
+    center sorted by start and by end, so a query visits O(log n) nodes
+    and slices the k active windows with searchsorted.
+
+    """
+
+    def __init__(self, starts, ends):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.root = self._build(np.arange(self.starts.size))
+
+    def _build(self, idx):
+        if idx.size == 0:
+            return None
+        s, e = self.starts[idx], self.ends[idx]
+        center = float(np.median((s + e) / 2))
+        left = idx[e < center]
+        right = idx[s > center]
+        node_idx = idx[(s <= center) & (e >= center)]
+
+        by_start = node_idx[np.argsort(self.starts[node_idx], kind="stable")]
+        by_end = node_idx[np.argsort(self.ends[node_idx], kind="stable")]
+        return (
+            center,
+            by_start, self.starts[by_start],
+            by_end, self.ends[by_end],
+            self._build(left), self._build(right),
+        )
+
+    def query(self, rt):
+        """returns the sorted indices of all windows containing rt"""
+        parts = []
+        node = self.root
+        while node is not None:
+            center, by_start, starts, by_end, ends, left, right = node
+            if rt < center:
+                parts.append(by_start[:np.searchsorted(starts, rt, "right")])
+                node = left
+            elif rt > center:
+                parts.append(by_end[np.searchsorted(ends, rt, "left"):])
+                node = right
+            else:
+                parts.append(by_start)
+                break
+        if not parts:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(parts))
@@ -0,0 +1,369 @@
+import os
+import re
+
+import numpy as np
+from typing import Dict, List, Optional
+
+CHUNK_SIZE = 10000  # rows per section converted at once
+NULL_VALUES = ("null", "")
+
+# header line prefix -> row line prefix of the mzTab table sections
+SECTIONS = {"PRH": "PRT", "PSH": "PSM", "PEH": "PEP", "SMH": "SML"}
+# always text, numeric accessions (e.g. GI numbers) must not become ints
+TEXT_COLUMNS = ("accession", "ambiguity_members")
+
+
+class _ColumnBuilder:
+    """
+    Collects the values of one column chunk by chunk. The text of every
+    cell is kept as it is in the file, dictionary encoded as int32 codes
+    into a list of unique strings, so repeated strings are stored once.
+    Columns stay numeric ("int" or "float") as long as every value can
+    be converted, their numbers are kept next to the text for sorting and
+    filtering. Columns created with is_text=True are never numeric.
+
+    """
+
+    def __init__(self, is_text: bool = False):
+        self.kind: Optional[str] = "str" if is_text else None
+        self.codes: List[np.ndarray] = []
+        self.numbers: List[np.ndarray] = []
+        self.lookup: Dict[str, int] = {}
+
+    def add(self, values: List[str]) -> None:
+        self.codes.append(self._encode(values))
+        if self.kind == "str":
+            return
+        kind, numbers = self._inferKind(values)
+        if kind == "str":
+            # a chunk contains text, the numbers of earlier chunks are
+            # dropped
+            self.kind = "str"
+            self.numbers = []
+            return
+        if self.kind != "float":
+            self.kind = kind
+        self.numbers.append(numbers)
+
+    @staticmethod
+    def _inferKind(values: List[str]):
+        try:
+            numbers = np.array(
+                ["nan" if v in NULL_VALUES else v for v in values], dtype=str
+            ).astype(np.float64)
+        except ValueError:
+            return "str", None
+        if np.all(np.isfinite(numbers)) and \
+                np.all(numbers == np.round(numbers)):
+            try:
+                # parsed again, ints above 2**53 are exact only as int64
+                return "int", np.array(values, dtype=str).astype(np.int64)
+            except (ValueError, OverflowError):  # e.g. "1.0" or "1e5"
+                pass
+        return "float", numbers
+
+    def _encode(self, values: List[str]) -> np.ndarray:
+        lookup = self.lookup
+        return np.fromiter(
+            (lookup.setdefault(v, len(lookup)) for v in values),
+            dtype=np.int32, count=len(values),
+        )
+
+    def finish(self):
+        kind = self.kind or "str"
+        codes = np.concatenate(self.codes) if self.codes else \
+            np.array([], dtype=np.int32)
+        numbers = None
+        if kind == "int":
+            numbers = np.concatenate(self.numbers).astype(np.int64)
+        elif kind == "float":
+            numbers = np.concatenate(self.numbers).astype(np.float64)
+        categories = np.empty(len(self.lookup), dtype=object)
+        categories[:] = list(self.lookup.keys())
+        return kind, codes, categories, numbers
+
+
+class MzTabSection:
+    """
+    Typed columnar storage of one mzTab table section (PRT, PSM, PEP or
+    SML). The cells of every column are int32 codes into an array of the
+    unique strings of the file, values are shown exactly as written.
+    Numeric columns also hold their values as numpy array. Rows are only
+    assembled as strings when they are accessed.
+
+    ...
+
+    Attributes
+    ----------
+    header : List[str]
+        The column names (without the line prefix)
+
+    kinds : List[str]
+        The type of each column: "int", "float" or "str"
+
+
+    Methods
+    -------
+    row(index=int)
+        Returns the values of a row as strings
+
+    value(index=int, column=int)
+        Returns a single value as string
+
+    columnValues(column=int or str)
+        Returns the values of a whole column, numeric or as object array
+
+    columnCodes(column=int or str)
+        Returns the codes and the unique strings of a column
+
+    columnIndex(name=str)
+        Returns the position of a column by name
+
+    constantColumns()
+        Returns a boolean array marking the columns with only one value
+
+    """
+
+    def __init__(self, header: List[str], kinds: List[str],
+                 codes: List[np.ndarray], categories: List[np.ndarray],
+                 numbers: Optional[List[Optional[np.ndarray]]] = None):
+        self.header = header
+        self.kinds = kinds
+        self._codes = codes
+        self._categories = categories
+        # per column: the parsed values of numeric columns, else None
+        self._numbers = numbers or [None] * len(header)
+        self._size = codes[0].size if codes else 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> List[str]:
+        return self.row(index)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self.row(index)
+
+    def columnCount(self) -> int:
+        return len(self.header)
+
+    def columnIndex(self, name: str) -> int:
+        return self.header.index(name)
+
+    def row(self, index: int) -> List[str]:
+        return [self.value(index, col) for col in range(len(self.header))]
+
+    def value(self, index: int, column: int) -> str:
+        return self._categories[column][self._codes[column][index]]
+
+    def columnValues(self, column) -> np.ndarray:
+        if isinstance(column, str):
+            column = self.columnIndex(column)
+        if self.kinds[column] == "str":
+            return self._categories[column][self._codes[column]]
+        return self._numbers[column]
+
+    def columnCodes(self, column):
+        if isinstance(column, str):
+            column = self.columnIndex(column)
+        return self._codes[column], self._categories[column]
+
+    def constantColumns(self) -> np.ndarray:
+        """
+        Finds the columns in which all rows have the same value, with one
+        vectorized comparison against the first value per column. Text
+        columns are compared on their codes, null values are equal.
+
+        Returns
+        -------
+        numpy array of bools
+            True for every constant column
+
+        """
+        constant = np.ones(len(self.header), dtype=bool)
+        if self._size == 0:
+            return constant
+        for col, kind in enumerate(self.kinds):
+            data = self._codes[col] if kind == "str" else self._numbers[col]
+            if kind == "float" and np.isnan(data[0]):
+                constant[col] = bool(np.all(np.isnan(data)))
+            else:
+                constant[col] = bool(np.all(data == data[0]))
+        return constant
+
+
+class _SectionBuilder:
+    def __init__(self, header: List[str]):
+        self.header = header
+        self.rows: List[List[str]] = []
+        self.builders = [_ColumnBuilder(name in TEXT_COLUMNS)
+                         for name in header]
+
+    def addRow(self, fields: List[str]) -> None:
+        n = len(self.header)
+        if len(fields) < n:
+            fields = fields + ["null"] * (n - len(fields))
+        self.rows.append(fields[:n])
+        if len(self.rows) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        # convert the pending rows column-wise, the strings are released
+        if not self.rows:
+            return
+        for col, values in enumerate(zip(*self.rows)):
+            self.builders[col].add(list(values))
+        self.rows = []
+
+    def finish(self) -> MzTabSection:
+        self.flush()
+        kinds, codes, categories, numbers = [], [], [], []
+        for builder in self.builders:
+            kind, data, cats, values = builder.finish()
+            kinds.append(kind)
+            codes.append(data)
+            categories.append(cats)
+            numbers.append(values)
+        return MzTabSection(self.header, kinds, codes, categories, numbers)
+
+
+def readMzTab(file_path: str, progress=None,
+              skip_protein_details: bool = True) -> Dict[str, MzTabSection]:
+    """
+    Streams an mzTab file and stores the PRT, PSM, PEP and SML sections in
+    typed columnar form, the file is converted in chunks of CHUNK_SIZE rows.
+
+    Parameters
+    ----------
+    file_path : str
+        The path of the mzTab file
+
+    progress : LoadProgress or None
+        Optional callback reporting the number of bytes read
+
+    skip_protein_details : bool
+        Skips PRT lines of protein group members ("protein_details")
+
+    Returns
+    -------
+    Dict[str, MzTabSection]
+        The sections found in the file by row prefix (e.g. "PSM") and the
+        metadata as "MTD" -> list of (key, value)
+
+    """
+    total = os.path.getsize(file_path)
+    sections: Dict[str, _SectionBuilder] = {}
+    metadata = []
+    done = 0
+    with open(file_path, newline="") as inp:
+        for n, line in enumerate(inp):
+            done += len(line)
+            if progress is not None and n % CHUNK_SIZE == 0:
+                progress(done, total)
+            line = line.rstrip("\r\n")
+            prefix = line[:3]
+            if prefix in SECTIONS:
+                sections[SECTIONS[prefix]] = _SectionBuilder(
+                    line.split("\t")[1:])
+            elif prefix in sections:
+                if skip_protein_details and prefix == "PRT" and \
+                        line.endswith("protein_details"):
+                    continue
+                sections[prefix].addRow(line.split("\t")[1:])
+            elif prefix == "MTD":
+                fields = line.split("\t")
+                metadata.append((fields[1] if len(fields) > 1 else "",
+                                 fields[2] if len(fields) > 2 else ""))
+    if progress is not None:
+        progress(total, total)
+
+    result: Dict[str, object] = {
+        prefix: builder.finish() for prefix, builder in sections.items()
+    }
+    result["MTD"] = metadata
+    return result
+
+
+class AccessionIndex:
+    """
+    Bidirectional index between protein accessions and the rows of a
+    section, built once after parsing. Entries listing several
+    accessions (";" separated, or "," in ambiguity_members) are linked to
+    each of them. The rows of each distinct column value are stored
+    consecutively (CSR layout), so a lookup only touches the k matching
+    rows.
+
+    ...
+
+    Methods
+    -------
+    rows(accession=str)
+        Returns the sorted row indices linked to an accession
+
+    rowsForAccessions(accessions=iterable)
+        Returns the sorted row indices linked to any of the accessions
+
+    accessions(rows=array)
+        Returns the accessions of the given rows
+
+    """
+
+    def __init__(self, section: MzTabSection,
+                 columns=("accession", "ambiguity_members")):
+        self._row_codes = []  # per column: codes of each row
+        self._code_accessions = []  # per column: accessions of each code
+        self._order = []
+        self._offsets = []
+        self._lookup: Dict[str, List[tuple]] = {}
+
+        for column in columns:
+            if column not in section.header or \
+                    section.kinds[section.columnIndex(column)] != "str":
+                continue
+            col = len(self._row_codes)
+            codes, categories = section.columnCodes(column)
+            # group the rows by code
+            order = np.argsort(codes, kind="stable")
+            offsets = np.zeros(categories.size + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=categories.size),
+                      out=offsets[1:])
+            code_accessions = [_splitAccessions(c) for c in categories]
+            for code, accessions in enumerate(code_accessions):
+                for accession in accessions:
+                    self._lookup.setdefault(accession, []).append((col, code))
+            self._row_codes.append(codes)
+            self._code_accessions.append(code_accessions)
+            self._order.append(order)
+            self._offsets.append(offsets)
+
+    def __contains__(self, accession: str) -> bool:
+        return accession in self._lookup
+
+    def rows(self, accession: str) -> np.ndarray:
+        return self.rowsForAccessions([accession])
+
+    def rowsForAccessions(self, accessions) -> np.ndarray:
+        parts = []
+        for accession in accessions:
+            for col, code in self._lookup.get(accession, []):
+                offsets = self._offsets[col]
+                parts.append(
+                    self._order[col][offsets[code]:offsets[code + 1]])
+        if not parts:
+            return np.array([], dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def accessions(self, rows) -> List[str]:
+        result = set()
+        rows = np.asarray(rows, dtype=np.int64)
+        for col, codes in enumerate(self._row_codes):
+            for code in np.unique(codes[rows]):
+                result.update(self._code_accessions[col][code])
+        return sorted(result)
+
+
+def _splitAccessions(value: str) -> List[str]:
+    if value in NULL_VALUES:
+        return []
+    return [a.strip() for a in re.split(r"[;,]", value) if a.strip()]
@@ -0,0 +1,351 @@
+import os
+import re
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+CACHE_VERSION = 2
+CHUNK_SIZE = 64  # PSMs per process pool job
+MAX_PENDING = 8  # jobs in flight per worker, bounds the memory
+
+# matched ions of one PSM, all arrays have the same length
+PSMAnnotation = namedtuple(
+    "PSMAnnotation",
+    "ion_annotations theo_mzs exp_mzs ppm peak_indices coverage",
+)
+
+_ION_PATTERN = re.compile(r"^([abcxyz])(\d+)")
+_worker: dict = {}
+
+
+def annotationCachePath(idxml_path: str) -> str:
+    return idxml_path + ".annotations.npz"
+
+
+def _initWorker(tolerance: float, is_ppm: bool) -> None:
+    # generator and alignment are created once per worker process
+    import pyopenms  # imported on first use, slow to import
+
+    tsg = pyopenms.TheoreticalSpectrumGenerator()
+    p = tsg.getParameters()
+    p.setValue(b"add_b_ions", b"true", b"Add peaks of b-ions to the spectrum")
+    p.setValue(b"add_metainfo", b"true", "")
+    tsg.setParameters(p)
+
+    spa = pyopenms.SpectrumAlignment()
+    p = spa.getParameters()
+    p.setValue(b"tolerance", float(tolerance))
+    p.setValue(b"is_relative_tolerance", b"true" if is_ppm else b"false")
+    spa.setParameters(p)
+
+    _worker["tsg"] = tsg
+    _worker["spa"] = spa
+
+
+def _sequenceCoverage(labels: List[str], length: int) -> float:
+    """
+    Fraction of backbone cleavage sites explained by at least one ion.
+
+    """
+    if length < 2:
+        return 0.0
+    sites = set()
+    for label in labels:
+        match = _ION_PATTERN.match(label)
+        if match is None:
+            continue
+        pos = int(match.group(2))
+        # prefix ions count from the N-, suffix ions from the C-terminus
+        sites.add(pos if match.group(1) in "abc" else length - pos)
+    return len(sites & set(range(1, length))) / (length - 1)
+
+
+def _annotateChunk(jobs: list) -> list:
+    """
+    Generates the theoretical spectrum of each PSM and aligns it to the
+    experimental peaks. Runs inside a worker process.
+
+    """
+    import pyopenms
+
+    tsg = _worker["tsg"]
+    spa = _worker["spa"]
+    results = []
+    for psm_row, aa_sequence, charge, precursor_mz, mzs, ints in jobs:
+        seq = pyopenms.AASequence.fromString(aa_sequence)
+        theo_precursor = seq.getMZ(max(1, charge))
+        theo_spectrum = pyopenms.MSSpectrum()
+        tsg.getSpectrum(theo_spectrum, seq, 1, max(1, min(charge - 1, 2)))
+        spectrum = pyopenms.MSSpectrum()
+        spectrum.set_peaks((mzs, ints))
+
+        alignment = []
+        spa.getSpectrumAlignment(alignment, theo_spectrum, spectrum)
+
+        theo_mzs, _ = theo_spectrum.get_peaks()
+        names = theo_spectrum.getStringDataArrays()[0]
+        theo_idx = np.array([a[0] for a in alignment], dtype=np.int64)
+        exp_idx = np.array([a[1] for a in alignment], dtype=np.int64)
+        labels = [
+            n.decode() if isinstance(n, bytes) else n
+            for n in (names[i] for i in theo_idx)
+        ]
+        theo = theo_mzs[theo_idx].astype(np.float64)
+        exp = np.asarray(mzs, dtype=np.float64)[exp_idx]
+        results.append(
+            (
+                psm_row,
+                labels,
+                theo,
+                exp,
+                (exp - theo) / theo * 1e6,
+                exp_idx,
+                _sequenceCoverage(labels, seq.size()),
+                precursor_mz,
+                (precursor_mz - theo_precursor) / theo_precursor * 1e6,
+            )
+        )
+    return results
+
+
+class PSMAnnotations:
+    """
+    Matched fragment ions, ppm errors and sequence coverage of all PSMs of a
+    run. The ions of all PSMs are stored in flat numpy arrays, the ions of
+    PSM i are ions[offsets[i]:offsets[i + 1]].
+
+    ...
+
+    Methods
+    -------
+    getAnnotation(spectrum_index=int, rank=int)
+        Returns the PSMAnnotation of a spectrum's hit or None
+
+    save(path=str)
+        Stores the annotations as uncompressed npz file
+
+    load(path=str, tolerance=float, is_ppm=bool)
+        Loads the annotations if the cache is valid for the current source
+        files and tolerance, otherwise returns None
+
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self._rows: Dict[Tuple[int, int], int] = {
+            (int(s), int(r)): i
+            for i, (s, r) in enumerate(
+                zip(arrays["psm_spectrum_index"], arrays["psm_rank"]))
+        }
+
+    def __len__(self) -> int:
+        return self.arrays["psm_spectrum_index"].size
+
+    def getAnnotation(self, spectrum_index: int,
+                      rank: int = 0) -> Optional[PSMAnnotation]:
+        row = self._rows.get((spectrum_index, rank))
+        if row is None:
+            return None
+        a = self.arrays
+        start, end = a["psm_offsets"][row], a["psm_offsets"][row + 1]
+        return PSMAnnotation(
+            ion_annotations=a["ion_annotations"][start:end],
+            theo_mzs=a["ion_theo_mzs"][start:end],
+            exp_mzs=a["ion_exp_mzs"][start:end],
+            ppm=a["ion_ppm"][start:end],
+            peak_indices=a["ion_peak_indices"][start:end],
+            coverage=float(a["psm_coverage"][row]),
+        )
+
+    def save(self, path: str) -> None:
+        try:
+            with open(path, "wb") as f:
+                np.savez(f, **self.arrays)
+        except OSError:
+            # no partial cache is left behind (e.g. on a full disk)
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, tolerance: float,
+             is_ppm: bool) -> Optional["PSMAnnotations"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                arrays = {key: data[key] for key in data.files}
+            if (
+                    int(arrays["version"]) != CACHE_VERSION or
+                    float(arrays["tolerance"]) != tolerance or
+                    bool(arrays["is_ppm"]) != is_ppm or
+                    not np.array_equal(
+                        _sourceStamps(arrays["source_files"]),
+                        arrays["source_stamps"])
+            ):
+                return None  # outdated cache
+        except (OSError, EOFError, TypeError, ValueError, KeyError,
+                zipfile.BadZipFile):
+            return None  # truncated or foreign file, rebuilt like stale
+        return cls(arrays)
+
+
+def _sourceStamps(source_files) -> np.ndarray:
+    # size and modification time of each source file, -1 if missing
+    stamps = []
+    for path in source_files:
+        try:
+            st = os.stat(str(path))
+            stamps.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamps.append((-1, -1))
+    return np.array(stamps, dtype=np.int64)
+
+
+def annotateRun(exp, psm_store, source_files: List[str],
+                tolerance: float = 20.0, is_ppm: bool = True,
+                progress=None, max_workers=None,
+                on_chunk=None) -> PSMAnnotations:
+    """
+    Annotates every PSM of a run with TheoreticalSpectrumGenerator and
+    SpectrumAlignment inside a process pool.
+
+    Parameters
+    ----------
+    exp : MSExperiment or LazyExperiment
+        The experiment containing the identified spectra, the peaks are
+        read spectrum by spectrum while the pool works
+
+    psm_store : PSMStore
+        All PSMs of the run, keyed by spectrum index
+
+    source_files : List[str]
+        The mzML and idXML files, used to validate the cache
+
+    tolerance : float
+        The fragment tolerance for the alignment
+
+    is_ppm : bool
+        The tolerance is given in ppm if true, otherwise in Da
+
+    progress : LoadProgress or None
+        Optional callback reporting the number of annotated PSMs
+
+    max_workers : int or None
+        Number of worker processes, default is the number of CPUs
+
+    on_chunk : callable or None
+        Optional callback, called with a PSMAnnotations object holding the
+        PSMs of each finished chunk
+
+
+    Returns
+    -------
+    PSMAnnotations
+        The annotations of all PSMs
+
+    """
+    spectra = sorted(psm_store.spectrumIndices())
+    spectrum_indices, ranks = [], []
+    for spec_index in spectra:
+        n_psms = len(psm_store.getPSMs(spec_index))
+        spectrum_indices.extend([spec_index] * n_psms)
+        ranks.extend(range(n_psms))
+
+    def chunks():
+        jobs = []
+        row = 0
+        for spec_index in spectra:
+            # lazy experiments read the peaks only here
+            mzs, ints = exp.getSpectrum(spec_index).get_peaks()
+            mzs, ints = np.asarray(mzs), np.asarray(ints)
+            for psm in psm_store.getPSMs(spec_index):
+                jobs.append((row, psm.aa_sequence, psm.charge,
+                             psm.precursor_mz, mzs, ints))
+                row += 1
+                if len(jobs) == CHUNK_SIZE:
+                    yield jobs
+                    jobs = []
+        if jobs:
+            yield jobs
+
+    results: list = [None] * len(spectrum_indices)
+    pending = deque()
+    max_pending = MAX_PENDING * (max_workers or os.cpu_count() or 1)
+    done = 0
+
+    def collectNext():
+        nonlocal done
+        chunk_results = pending.popleft().result()
+        for result in chunk_results:
+            results[result[0]] = result
+        done += len(chunk_results)
+        if on_chunk is not None:
+            rows = [r[0] for r in chunk_results]
+            on_chunk(PSMAnnotations(_psmArrays(
+                chunk_results,
+                [spectrum_indices[i] for i in rows],
+                [ranks[i] for i in rows],
+            )))
+        if progress is not None:
+            progress(done, len(results))
+
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_initWorker,
+        initargs=(tolerance, is_ppm),
+    )
+    try:
+        for jobs in chunks():
+            pending.append(executor.submit(_annotateChunk, jobs))
+            # results are collected in order, the oldest job is waited for
+            while len(pending) > max_pending:
+                collectNext()
+        while pending:
+            collectNext()
+    finally:
+        # on cancel, pending chunks are dropped
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    arrays = {
+        "version": np.array(CACHE_VERSION),
+        "tolerance": np.array(tolerance, dtype=np.float64),
+        "is_ppm": np.array(is_ppm),
+        "source_files": np.array(source_files, dtype=str),
+        "source_stamps": _sourceStamps(source_files),
+    }
+    arrays.update(_psmArrays(results, spectrum_indices, ranks))
+    return PSMAnnotations(arrays)
+
+
+def _psmArrays(results: list, spectrum_indices: List[int],
+               ranks: List[int]) -> Dict[str, np.ndarray]:
+    # flattens the worker results into the psm_* and ion_* arrays
+    counts = np.array([len(r[1]) for r in results], dtype=np.int64)
+    offsets = np.zeros(len(results) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    def _concat(pos, dtype):
+        if not results:
+            return np.array([], dtype=dtype)
+        return np.concatenate(
+            [np.asarray(r[pos], dtype=dtype) for r in results])
+
+    return {
+        "psm_spectrum_index": np.array(spectrum_indices, dtype=np.int32),
+        "psm_rank": np.array(ranks, dtype=np.int16),
+        "psm_coverage": np.array([r[6] for r in results], dtype=np.float32),
+        "psm_precursor_mz": np.array(
+            [r[7] for r in results], dtype=np.float64),
+        "psm_precursor_ppm": np.array(
+            [r[8] for r in results], dtype=np.float32),
+        "psm_offsets": offsets,
+        "ion_annotations": _concat(1, str),
+        "ion_theo_mzs": _concat(2, np.float64),
+        "ion_exp_mzs": _concat(3, np.float64),
+        "ion_ppm": _concat(4, np.float32),
+        "ion_peak_indices": _concat(5, np.int32),
+    }
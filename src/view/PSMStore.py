@@ -0,0 +1,293 @@
+import re
+from collections import namedtuple
+
+import numpy as np
+from typing import Dict, List, Optional
+
+# typed PSM record, ion information is kept as parallel numpy arrays
+PSMStruct = namedtuple(
+    "PSMStruct",
+    "sequence aa_sequence charge precursor_mz \
+                            ion_annotations ion_mzs ion_charges",
+)
+# peptide identification with all its hits, before matching to a spectrum
+PeptideIdStruct = namedtuple(
+    "PeptideIdStruct",
+    "spectrum_reference rt mz psms",
+)
+
+# fragment ion label, e.g. "b3", "y5-H2O1+" or "y7++"
+_ION_LABEL_PATTERN = re.compile(
+    r"^([abcxyz])(\d+)((?:-[A-Z][A-Za-z0-9]*)*)\+*$")
+
+
+def theoreticalIonMZs(aa_sequence: str, labels: List[str],
+                      charges: List[int]) -> np.ndarray:
+    """
+    Calculates the theoretical m/z of fragment ions from the peptide
+    sequence, the ion labels (type, position and neutral losses) and the
+    ion charges.
+
+    Parameters
+    ----------
+    aa_sequence : str
+        The full sequence of the hit (incl. modifications), readable by
+        AASequence.fromString
+
+    labels : List[str]
+        The ion annotations, e.g. "b3" or "y5-H2O1+"
+
+    charges : List[int]
+        The charge of each ion
+
+    Returns
+    -------
+    numpy array of floats
+        The theoretical m/z of each ion, NaN for labels which are no
+        a/b/c/x/y/z ions (e.g. immonium ions) or exceed the sequence
+
+    """
+    import pyopenms  # imported on first use, slow to import
+
+    mzs = np.full(len(labels), np.nan)
+    matches = [_ION_LABEL_PATTERN.match(label) for label in labels]
+    if not any(matches):
+        return mzs
+    seq = pyopenms.AASequence.fromString(aa_sequence)
+    ion_types = {
+        "a": pyopenms.Residue.ResidueType.AIon,
+        "b": pyopenms.Residue.ResidueType.BIon,
+        "c": pyopenms.Residue.ResidueType.CIon,
+        "x": pyopenms.Residue.ResidueType.XIon,
+        "y": pyopenms.Residue.ResidueType.YIon,
+        "z": pyopenms.Residue.ResidueType.ZIon,
+    }
+    for i, (match, charge) in enumerate(zip(matches, charges)):
+        if match is None:
+            continue
+        ion, pos = match.group(1), int(match.group(2))
+        charge = max(1, int(charge))
+        if pos < 1 or pos > seq.size():
+            continue
+        fragment = seq.getPrefix(pos) if ion in "abc" else seq.getSuffix(pos)
+        mz = fragment.getMZ(charge, ion_types[ion])
+        for loss in match.group(3).split("-")[1:]:
+            mz -= pyopenms.EmpiricalFormula(loss).getMonoWeight() / charge
+        mzs[i] = mz
+    return mzs
+
+
+class PSMStore:
+    """
+    Side-store for the peptide spectrum matches (PSMs) of an identification
+    file, keyed by the index of the matched spectrum in the MSExperiment.
+
+    The scan table only displays strings, the widgets read the typed
+    ion arrays directly from the store.
+
+    ...
+
+    Methods
+    -------
+    addPSM(spectrum_index=int, psm=PSMStruct)
+        Adds a PSM to the given spectrum index
+
+    getPSM(spectrum_index=int)
+        Returns the first (best) PSM of a spectrum or None
+
+    getPSMs(spectrum_index=int)
+        Returns all PSMs of a spectrum
+
+    createPSM(sequence=str, aa_sequence=str, charge=int, precursor_mz=float,
+              annotations=list)
+        Creates a PSMStruct from the peak annotations of a PeptideHit
+
+    """
+
+    def __init__(self):
+        self._psms: Dict[int, List[PSMStruct]] = {}
+
+    def __len__(self) -> int:
+        return len(self._psms)
+
+    def __contains__(self, spectrum_index: int) -> bool:
+        return spectrum_index in self._psms
+
+    def clear(self) -> None:
+        self._psms = {}
+
+    def addPSM(self, spectrum_index: int, psm: PSMStruct) -> None:
+        self._psms.setdefault(spectrum_index, []).append(psm)
+
+    def getPSM(self, spectrum_index: int) -> Optional[PSMStruct]:
+        psms = self._psms.get(spectrum_index)
+        if not psms:
+            return None
+        return psms[0]
+
+    def getPSMs(self, spectrum_index: int) -> List[PSMStruct]:
+        return self._psms.get(spectrum_index, [])
+
+    def spectrumIndices(self) -> List[int]:
+        return list(self._psms.keys())
+
+    @staticmethod
+    def createPSM(sequence: str,
+                  aa_sequence: str,
+                  charge: int,
+                  precursor_mz: float,
+                  annotations: list) -> PSMStruct:
+        """
+        Creates a PSMStruct from the peak annotations of a PeptideHit.
+
+        Parameters
+        ----------
+        sequence : str
+            The peptide sequence of the hit used for display
+
+        aa_sequence : str
+            The full sequence of the hit (incl. modifications), readable by
+            AASequence.fromString
+
+        charge : int
+            The charge state of the hit
+
+        precursor_mz : float
+            The precursor mass-to-charge ratio (m/z) of the identification
+
+        annotations : list
+            List of PeptideHit.PeakAnnotation objects
+
+        Returns
+        -------
+        PSMStruct
+            The PSM with its ions stored as numpy arrays (annotation codes,
+            theoretical m/z and charge)
+
+        """
+        # keep the last annotation per label like the former ion dictionary
+        ions = {anno.annotation: (anno.mz, anno.charge)
+                for anno in annotations}
+        labels = list(ions.keys())
+        charges = [ions[lb][1] for lb in labels]
+        return PSMStruct(
+            sequence=sequence,
+            aa_sequence=aa_sequence,
+            charge=charge,
+            precursor_mz=precursor_mz,
+            ion_annotations=np.array(labels, dtype=str),
+            # the annotation m/z is the observed peak, matching against
+            # the spectrum needs the theoretical values
+            ion_mzs=theoreticalIonMZs(aa_sequence, labels, charges),
+            ion_charges=np.array(charges, dtype=np.int32),
+        )
+
+    def addIdentifications(self,
+                           spectrum_index: "SpectrumIndex",
+                           peptide_ids: List[PeptideIdStruct]) -> int:
+        """
+        Attaches the PSMs of all peptide identifications to their spectra.
+        Identifications are matched through their spectrum reference and,
+        if that fails, through RT and precursor m/z.
+
+        Parameters
+        ----------
+        spectrum_index : SpectrumIndex
+            The lookup index built once from the experiment
+
+        peptide_ids : List[PeptideIdStruct]
+            The identifications read from the idXML file
+
+
+        Returns
+        -------
+        int
+            The number of identifications that could not be matched
+
+        """
+        unmatched = 0
+        for pep_id in peptide_ids:
+            spec_index = spectrum_index.find(
+                pep_id.spectrum_reference, pep_id.rt, pep_id.mz)
+            if spec_index < 0:
+                unmatched += 1
+                continue
+            for psm in pep_id.psms:
+                self.addPSM(spec_index, psm)
+        return unmatched
+
+
+class SpectrumIndex:
+    """
+    Lookup of spectrum indices for peptide identifications, built once per
+    experiment. Spectrum references are resolved through a hash index of
+    the native IDs (and their scan/index numbers), the fallback uses a
+    sorted RT index of all MSn spectra together with the precursor m/z.
+
+    ...
+
+    Attributes
+    ----------
+    rt_tolerance : float
+        Maximal RT difference (seconds) for the fallback matching
+
+    mz_tolerance : float
+        Maximal precursor m/z difference (Da) for the fallback matching
+
+    """
+
+    _NUMBER_PATTERN = re.compile(r"(scan|index|spectrum)=(\d+)")
+
+    def __init__(self, ms_experiment, rt_tolerance: float = 0.5,
+                 mz_tolerance: float = 0.01):
+        self.rt_tolerance = rt_tolerance
+        self.mz_tolerance = mz_tolerance
+        self._native_ids: Dict[str, int] = {}
+        self._numbers: Dict[tuple, int] = {}
+        rts, prec_mzs, indices = [], [], []
+
+        for index, spec in enumerate(ms_experiment):
+            native_id = spec.getNativeID()
+            if isinstance(native_id, bytes):
+                native_id = native_id.decode()
+            self._native_ids[native_id] = index
+            for key in self._NUMBER_PATTERN.findall(native_id):
+                self._numbers.setdefault(key, index)
+            if spec.getMSLevel() > 1 and len(spec.getPrecursors()) > 0:
+                rts.append(spec.getRT())
+                prec_mzs.append(spec.getPrecursors()[0].getMZ())
+                indices.append(index)
+
+        order = np.argsort(rts, kind="stable")
+        self._rts = np.asarray(rts, dtype=np.float64)[order]
+        self._prec_mzs = np.asarray(prec_mzs, dtype=np.float64)[order]
+        self._indices = np.asarray(indices, dtype=np.int64)[order]
+
+    def find(self, spectrum_reference: str, rt: float, mz: float) -> int:
+        """
+        Returns the index of the spectrum of an identification or -1.
+
+        """
+        if spectrum_reference:
+            index = self._native_ids.get(spectrum_reference)
+            if index is not None:
+                return index
+            # e.g. "scan=1893" referencing a full Thermo native ID
+            for key in self._NUMBER_PATTERN.findall(spectrum_reference):
+                index = self._numbers.get(key)
+                if index is not None:
+                    return index
+        return self._findByRT(rt, mz)
+
+    def _findByRT(self, rt: float, mz: float) -> int:
+        left = np.searchsorted(self._rts, rt - self.rt_tolerance, "left")
+        right = np.searchsorted(self._rts, rt + self.rt_tolerance, "right")
+        if left == right:
+            return -1
+        candidates = np.arange(left, right)
+        mz_ok = np.abs(self._prec_mzs[candidates] - mz) <= self.mz_tolerance
+        candidates = candidates[mz_ok]
+        if candidates.size == 0:
+            return -1
+        best = candidates[np.argmin(np.abs(self._rts[candidates] - rt))]
+        return int(self._indices[best])
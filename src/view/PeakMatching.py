@@ -0,0 +1,61 @@
+import numpy as np
+from typing import Tuple
+
+
+def matchNearestPeaks(theo_mzs: np.ndarray,
+                      exp_mzs: np.ndarray,
+                      tolerance: float = 20.0,
+                      is_ppm: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matches each theoretical m/z to its nearest experimental peak in a single
+    searchsorted pass.
+
+    Parameters
+    ----------
+    theo_mzs : numpy array of floats
+        The theoretical mass-to-charge ratios (m/z), in any order
+
+    exp_mzs : numpy array of floats
+        The experimental mass-to-charge ratios (m/z) of the spectrum, sorted
+        ascending
+
+    tolerance : float
+        The maximal allowed distance between theoretical and experimental m/z
+
+    is_ppm : bool
+        The tolerance is given in ppm if true, otherwise in Da
+
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The index of the matched experimental peak for each theoretical m/z
+        (-1 if no peak is within tolerance) and the mass error in ppm
+        (NaN if not matched)
+
+    """
+    theo_mzs = np.asarray(theo_mzs, dtype=np.float64)
+    exp_mzs = np.asarray(exp_mzs, dtype=np.float64)
+    peak_indices = np.full(theo_mzs.shape, -1, dtype=np.int64)
+    ppm = np.full(theo_mzs.shape, np.nan)
+    if theo_mzs.size == 0 or exp_mzs.size == 0:
+        return peak_indices, ppm
+
+    # the nearest peak is either the first larger or the last smaller one
+    right = np.searchsorted(exp_mzs, theo_mzs, side="left")
+    left = np.clip(right - 1, 0, exp_mzs.size - 1)
+    right = np.clip(right, 0, exp_mzs.size - 1)
+    use_left = \
+        np.abs(theo_mzs - exp_mzs[left]) <= np.abs(exp_mzs[right] - theo_mzs)
+    nearest = np.where(use_left, left, right)
+
+    diff = exp_mzs[nearest] - theo_mzs
+    if is_ppm:
+        max_diff = tolerance * theo_mzs * 1e-6
+    else:
+        max_diff = np.full(theo_mzs.shape, tolerance)
+    matched = np.abs(diff) <= max_diff
+
+    peak_indices[matched] = nearest[matched]
+    ppm[matched] = diff[matched] / theo_mzs[matched] * 1e6
+    return peak_indices, ppm
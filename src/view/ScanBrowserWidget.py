@@ -1,4 +1,3 @@
-import pyopenms
 from PyQt5.QtCore import (
     Qt,
 )
@@ -7,6 +6,7 @@ from PyQt5.QtWidgets import (
     QWidget,
     QSplitter,
 )
+from ExperimentBackend import openExperiment
 from ScanTableWidget import ScanTableWidget
 
 from src.view.SpectrumWidget import SpectrumWidget
@@ -17,18 +17,19 @@ class ScanBrowserWidget(QWidget):
         QWidget.__init__(self, *args, **kwargs)
         self.mainlayout = QHBoxLayout(self)
         self.isAnnoOn = False
+        self.experimentBackend = "memory"  # see ExperimentBackend
 
     def clearLayout(self, layout):
         for i in reversed(range(layout.count())):
             layout.itemAt(i).widget().setParent(None)
 
     def loadFile(self, file_path):
+        self.setMSExperiment(self.readMS(file_path))
+
+    def setMSExperiment(self, scans):
         self.isAnnoOn = False
         self.msexperimentWidget = QSplitter(Qt.Vertical)
 
-        # data processing
-        scans = self.readMS(file_path)
-
         # set Widgets
         self.spectrum_widget = SpectrumWidget()
         self.scan_widget = ScanTableWidget(scans)
@@ -40,11 +41,9 @@ class ScanBrowserWidget(QWidget):
         # default : first row selected.
         self.scan_widget.table_view.selectRow(0)
 
-    def readMS(self, file_path):
+    def readMS(self, file_path, progress=None):
         # Later: process other types of file
-        exp = pyopenms.MSExperiment()
-        pyopenms.MzMLFile().load(file_path, exp)
-        return exp
+        return openExperiment(file_path, self.experimentBackend, progress)
 
     def redrawPlot(self):
         # set new spectrum and redraw
@@ -74,7 +74,6 @@ class ScanTableWidget(QWidget):
         "charge",
         "ID",
         "PeptideSeq",
-        "PeptideIons",
     ]
 
     def __init__(self, ms_experiment, *args):
@@ -114,9 +113,6 @@ class ScanTableWidget(QWidget):
         layout.addWidget(self.table_view)
         self.setLayout(layout)
 
-        # hide column 7 with the PepIon data, intern information usage
-        self.table_view.setColumnHidden(7, True)
-
         # Add rt in minutes for better TIC interaction
         self.table_view.setItemDelegateForColumn(2, RTUnitDelegate(self))
         self.table_view.setColumnWidth(2, 160)
@@ -221,7 +217,6 @@ class ScanTableModel(QAbstractTableModel):
                 prec_mz = spec.getPrecursors()[0].getMZ()
                 charge = spec.getPrecursors()[0].getCharge()
             PeptideSeq = "-"
-            PeptideIons = "-"
 
             scanArr.append(
                 [
@@ -232,7 +227,6 @@ class ScanTableModel(QAbstractTableModel):
                     charge,
                     native_id,
                     PeptideSeq,
-                    PeptideIons,
                 ]
             )
         return scanArr
@@ -255,6 +249,30 @@ class ScanTableModel(QAbstractTableModel):
             return value
         return None
 
+    def setColumnData(self, column, values):
+        """
+        Sets the values of one column for many rows at once and emits a
+        single dataChanged signal.
+
+        Parameters
+        ----------
+        column : int
+            The column to fill
+
+        values : dict
+            Row -> new value
+
+        """
+        if not values:
+            return
+        for row, value in values.items():
+            self.scanRows[row][column] = value
+        self.dataChanged.emit(
+            self.index(min(values), column),
+            self.index(max(values), column),
+            {Qt.DisplayRole, Qt.EditRole},
+        )
+
     def flags(self, index):
         if not index.isValid():
             return None
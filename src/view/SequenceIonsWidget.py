@@ -1,14 +1,33 @@
-from PyQt5.QtCore import Qt, QPointF
+from collections import namedtuple
+
+import numpy as np
+from PyQt5.QtCore import Qt, QEvent, QLineF, QPointF
 from PyQt5.QtGui import (
     QFont,
     QFontMetricsF,
     QPainter, QColor,
     QPen, QBrush,
-    QPaintEvent
+    QPaintEvent,
+    QPicture
+)
+
+from PyQt5.QtWidgets import (
+    QAbstractScrollArea,
+    QHBoxLayout,
+    QLabel,
+    QSizePolicy,
+    QSpacerItem,
+    QToolTip,
+    QVBoxLayout,
+    QWidget,
 )
+from typing import Dict, Tuple, Union
 
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QSpacerItem, QSizePolicy
-from typing import Union
+# precomputed geometry of a drawn peptide, positions are (QPointF, text)
+PeptideLayout = namedtuple(
+    "PeptideLayout",
+    "residues lines prefix_ions suffix_ions",
+)
 
 
 class SequenceIonsWidget(QWidget):
@@ -16,6 +35,8 @@ class SequenceIonsWidget(QWidget):
     Used to create a window for a peptide sequence with its given ions,
     which is adjusted to the sequence size.
     To avoid contortions of the window, spaceritems are added.
+    Sequences longer than LONG_SEQUENCE_LENGTH (e.g. proteoforms) are
+    shown wrapped in a scrollable view with a fragment coverage summary.
 
     Attributes
     ----------
@@ -28,6 +49,9 @@ class SequenceIonsWidget(QWidget):
     SUFFIX_HEIGHT : float or int
         The given maximum height over all given (stacked) suffix ions
 
+    LONG_SEQUENCE_LENGTH : int
+        Sequences above this length are shown in the wrapped view
+
 
     Methods
     -------
@@ -52,6 +76,7 @@ class SequenceIonsWidget(QWidget):
     HEIGHT: Union[float, int] = 0.0
     WIDTH: Union[float, int] = 0.0
     SUFFIX_HEIGHT: Union[float, int] = 0.0
+    LONG_SEQUENCE_LENGTH: int = 60
 
     def __init__(self, *args):
         QWidget.__init__(self, *args)
@@ -59,7 +84,8 @@ class SequenceIonsWidget(QWidget):
         self.initUI()
 
     def initUI(self):
-        self.mainlayout = QHBoxLayout(self)
+        self.isLongSequence = False
+        self.mainlayout = QVBoxLayout(self)
         self.mainlayout.setContentsMargins(0, 0, 0, 0)
         self.container = QWidget(self)
         self.container.setStyleSheet("background-color:white;")
@@ -96,6 +122,15 @@ class SequenceIonsWidget(QWidget):
 
         self.setFixedHeight(SequenceIonsWidget.HEIGHT)
         self.mainlayout.addWidget(self.container)
+
+        # wrapped view with coverage summary for long sequences
+        self.coverageLabel = QLabel(self)
+        self.coverageLabel.setStyleSheet("background-color:white;")
+        self._wrapped = wrapped_sequence(self)
+        self.mainlayout.addWidget(self.coverageLabel)
+        self.mainlayout.addWidget(self._wrapped)
+        self.coverageLabel.hide()
+        self._wrapped.hide()
         self.show()
 
     def _resize(self):
@@ -140,18 +175,63 @@ class SequenceIonsWidget(QWidget):
             )
 
     def setPeptide(self, seq):
-        self._pep.setSequence(seq)
-        self.updateWindowSize()
+        self._setLongSequence(
+            len(seq) > SequenceIonsWidget.LONG_SEQUENCE_LENGTH)
+        if self.isLongSequence:
+            self._wrapped.setSequence(seq)
+            self._updateCoverage()
+        else:
+            self._pep.setSequence(seq)
+            self.updateWindowSize()
 
     def setSuffix(self, suff):
-        self._pep.setSuffix(suff)
-        self.updateWindowSize()
+        if self.isLongSequence:
+            self._wrapped.setSuffix(suff)
+            self._updateCoverage()
+        else:
+            self._pep.setSuffix(suff)
+            self.updateWindowSize()
 
     def setPrefix(self, pre):
-        self._pep.setPrefix(pre)
-        self.updateWindowSize()
+        if self.isLongSequence:
+            self._wrapped.setPrefix(pre)
+            self._updateCoverage()
+        else:
+            self._pep.setPrefix(pre)
+            self.updateWindowSize()
+
+    def _setLongSequence(self, is_long: bool) -> None:
+        if is_long == self.isLongSequence:
+            return
+        self.isLongSequence = is_long
+        self.container.setVisible(not is_long)
+        self.coverageLabel.setVisible(is_long)
+        self._wrapped.setVisible(is_long)
+        if is_long:
+            self._pep.setSequence("")
+            self._pep.setSuffix({})
+            self._pep.setPrefix({})
+            self.setMinimumHeight(150)
+            self.setMaximumHeight(16777215)  # QWIDGETSIZE_MAX
+        else:
+            self._wrapped.setSequence("")
+            self._wrapped.setSuffix({})
+            self._wrapped.setPrefix({})
+            self.updateWindowSize()
+
+    def _updateCoverage(self):
+        prefix, suffix, covered, sites = self._wrapped.coverage()
+        percent = 100.0 * covered / sites if sites > 0 else 0.0
+        self.coverageLabel.setText(
+            "%d aa, cleavage sites explained: %d of %d (%.1f %%), "
+            "prefix: %d, suffix: %d"
+            % (len(self._wrapped.sequence), covered, sites, percent,
+               prefix, suffix)
+        )
 
     def updateWindowSize(self):
+        if self.isLongSequence:
+            return
         self._resize()
         self._pep.setMinimumSize(
             SequenceIonsWidget.WIDTH, SequenceIonsWidget.HEIGHT)
@@ -159,9 +239,10 @@ class SequenceIonsWidget(QWidget):
         self.update()
 
     def clear(self):
-        self._pep.sequence = ""
-        self._pep.suffix = {}
-        self._pep.prefix = {}
+        self._setLongSequence(False)
+        self._pep.setSequence("")
+        self._pep.setSuffix({})
+        self._pep.setPrefix({})
         self.update()
 
 class observed_peptide(QWidget):
@@ -226,16 +307,30 @@ class observed_peptide(QWidget):
             "red": QColor(255, 0, 0),
             "blue": QColor(0, 0, 255),
         }
+        self._font_pep = self._createFont(30)
+        self._font_ion = self._createFont(10)
+        self._metrics_pep = QFontMetricsF(self._font_pep)
+        self._metrics_ion = QFontMetricsF(self._font_ion)
+        self._picture = None
 
     def setSequence(self, seq: str) -> None:
         self.sequence = seq
         self.seqLength = len(seq)
+        self._invalidateLayout()
 
     def setSuffix(self, lst: dict) -> None:
         self.suffix = lst
+        self._invalidateLayout()
 
     def setPrefix(self, lst: dict) -> None:
         self.prefix = lst
+        self._invalidateLayout()
+
+    def _invalidateLayout(self) -> None:
+        # the layout depends on SUFFIX_HEIGHT, which the parent widget
+        # updates after the setters, so it is rebuilt on the next paint
+        self._picture = None
+        self.update()
 
     def paintEvent(self, event: QPaintEvent) -> None:
         qp = QPainter()
@@ -246,21 +341,56 @@ class observed_peptide(QWidget):
         qp.end()
 
     def _drawPeptide(self, qp: QPainter) -> None:
+        # repaints only replay the recorded picture
+        if self._picture is None:
+            self._picture = self._createPicture()
         qp.setWindow(0, 0, SequenceIonsWidget.WIDTH, SequenceIonsWidget.HEIGHT)
+        qp.drawPicture(0, 0, self._picture)
+
+    def _createPicture(self) -> QPicture:
+        """
+        Records the layout of the sequence into a QPicture. Residues,
+        lines and ions are drawn in groups, so the pen and font are set
+        only once per group.
+
+        Returns
+        -------
+        QPicture
+            The recorded drawing commands of the peptide
+
+        """
+        layout = self._fragmentPeptide()
+        picture = QPicture()
+        qp = QPainter(picture)
+        qp.setRenderHint(QPainter.Antialiasing)
+
         qp.setPen(self.colors["black"])
-        qp.setFont(self.getFont_Pep())
-        self._fragmentPeptide(qp)
+        qp.setFont(self._font_pep)
+        for pos, residue in layout.residues:
+            qp.drawText(pos, residue)
 
-    def _fragmentPeptide(self, qp: QPainter) -> None:
+        qp.setPen(self._getPen(self.colors["black"]))
+        qp.drawLines(layout.lines)
+
+        qp.setFont(self._font_ion)
+        qp.setPen(self._getPen(self.colors["blue"]))
+        for pos, ion in layout.prefix_ions:
+            qp.drawText(pos, ion)
+        qp.setPen(self._getPen(self.colors["red"]))
+        for pos, ion in layout.suffix_ions:
+            qp.drawText(pos, ion)
+        qp.end()
+        return picture
+
+    def _fragmentPeptide(self) -> "PeptideLayout":
         """
-        The sequence will be generated stepwise by drawing each aa of the
-        sequence separately and adding in each step lines and existing ions.
-
-        The procedure can be described in two steps:
-        1. Check if sequence is given, if so
-        then transform seq into a dictionary
-        (with the indices representing the positions of the chars).
-        2. For each char in the sequence:
+        Calculates the positions of all aa's, lines and ions of the
+        sequence. Each aa is placed after the previous one and, where
+        prefix or suffix ions are given, a line with the stacked ions is
+        added between the aa's.
+
+        The procedure can be described as follows.
+        For each char in the sequence:
             Firstly, calculate start position of char
             (be aware that the char rect is created
             at the left bottom corner of
@@ -276,210 +406,85 @@ class observed_peptide(QWidget):
             space from the starting point after each new char.
 
             Third, if prefix or suffix ions are given,
-            then distinguish between suffix and prefix to draw the vertical
+            then distinguish between suffix and prefix to add the vertical
             line with either left or right line or both.
 
-            Because of changing the fonts for the ions,
-            the fonts needs to be reset.
+        The bounding rects are measured once per distinct aa and ion.
 
-        Parameters
-        ----------
-        qp : QPainter
-            The QPainter class provides functions required to paint within the
-            widget
+        Returns
+        -------
+        PeptideLayout
+            The positions of the aa's, lines, prefix and suffix ions
 
         """
         blankspace: int = 8
+        layout = PeptideLayout([], [], [], [])
+        if self.sequence == "":
+            return layout
+
+        rects = {s: self._metrics_pep.boundingRect(s)
+                 for s in set(self.sequence)}
+        ion_heights = {}
+        for ions in list(self.prefix.values()) + list(self.suffix.values()):
+            for ion in ions:
+                if ion not in ion_heights:
+                    ion_heights[ion] = \
+                        self._metrics_ion.boundingRect(ion).height()
+
+        start_point = 0
+        blank: float = 0
+        for i, s in enumerate(self.sequence):
+            i_rev = self._getReverseIndex(i, self.seqLength)
+            width = rects[s].width()
+            height = rects[s].height()
+
+            # position of char with center indent
+            layout.residues.append(
+                (QPointF(start_point + blank,
+                         SequenceIonsWidget.SUFFIX_HEIGHT + height), s)
+            )
 
-        if self.sequence != "":
-
-            seq = list(self.sequence)
-            dict_seq = {i: seq[i] for i in range(0, len(seq))}
-
-            metrics = QFontMetricsF(self.getFont_Pep())
-
-            blank: int = 0
-            for i, s in dict_seq.items():
-                i_rev = self._getReverseIndex(i, dict_seq)
-
-                width = metrics.boundingRect(s).width()
-                height = metrics.boundingRect(s).height()
-
-                start_point = 0
-
-                # position of char with center indent
-                position = QPointF(
-                    start_point + blank,
-                    SequenceIonsWidget.SUFFIX_HEIGHT + height
-                )
-                qp.drawText(position, s)
-
-                # position lines for possible ions
-                centerOfLine = \
-                    (
-                        SequenceIonsWidget.SUFFIX_HEIGHT + height - height / 4
-                    ) - 1
-
-                start_linePos = QPointF(
-                    start_point + blank - (blankspace / 2),
-                    centerOfLine - height / 2 - 2.5
-                )
-                end_linePos = QPointF(
-                    start_linePos.x(), centerOfLine + height / 2 + 2.5
-                )
-
-                qp.setFont(self.getFont_Ion())
-                metrics_ion = QFontMetricsF(self.getFont_Ion())
-
-                if i in self.prefix:
-                    left_linePos = self._drawIonsLines(
-                        qp, start_linePos, end_linePos, blankspace, "prefix"
-                    )
-                    self._drawPrefixIon(qp, i, metrics_ion, left_linePos)
+            # position lines for possible ions
+            centerOfLine = \
+                (
+                    SequenceIonsWidget.SUFFIX_HEIGHT + height - height / 4
+                ) - 1
 
-                # for given line of existing prefix, expand with given suffix
-                if i in self.prefix and i_rev in self.suffix:
-                    right_linePos = self._drawIonsLines(
-                        qp, start_linePos, end_linePos, blankspace, "suffix"
-                    )
-                    self._drawSuffixIon(
-                        qp, i_rev, metrics_ion, end_linePos, right_linePos
-                    )
+            start_linePos = QPointF(
+                start_point + blank - (blankspace / 2),
+                centerOfLine - height / 2 - 2.5
+            )
+            end_linePos = QPointF(
+                start_linePos.x(), centerOfLine + height / 2 + 2.5
+            )
 
-                elif i_rev in self.suffix and i not in self.prefix:
-                    right_linePos = self._drawIonsLines(
-                        qp, start_linePos, end_linePos, blankspace, "suffix"
+            if i in self.prefix:
+                pos_left = QPointF(
+                    end_linePos.x() - 2 * blankspace, end_linePos.y())
+                layout.lines.append(QLineF(start_linePos, end_linePos))
+                layout.lines.append(QLineF(end_linePos, pos_left))
+                blank_ion: float = 10
+                for ion in sorted(self.prefix[i]):
+                    layout.prefix_ions.append(
+                        (QPointF(pos_left.x(), pos_left.y() + blank_ion), ion)
                     )
-                    self._drawSuffixIon(
-                        qp, i_rev, metrics_ion, start_linePos, right_linePos
+                    blank_ion += ion_heights[ion]
+
+            if i_rev in self.suffix:
+                pos_right = QPointF(
+                    start_linePos.x() + 2 * blankspace, start_linePos.y())
+                layout.lines.append(QLineF(start_linePos, end_linePos))
+                layout.lines.append(QLineF(start_linePos, pos_right))
+                blank_ion = 5
+                for ion in sorted(self.suffix[i_rev], reverse=True):
+                    layout.suffix_ions.append(
+                        (QPointF(start_linePos.x() + 2.5,
+                                 pos_right.y() - blank_ion), ion)
                     )
+                    blank_ion += ion_heights[ion]
 
-                blank += width + blankspace
-                qp.setPen(self._getPen(self.colors["black"]))
-                qp.setFont(self.getFont_Pep())
-
-    def _drawPrefixIon(self,
-                       qp: QPainter,
-                       index: int,
-                       metrics_ion: QFontMetricsF,
-                       pos_left: QPointF) -> None:
-        """
-        Draws existing prefix ion(s) and the left line at this position.
-
-        Parameters
-        ----------
-        qp : QPainter
-            The QPainter class provides functions required to paint within the
-            widget
-
-        index: int
-            The position of the prefix ion(s) within the peptide
-
-        metrics_ion : QFontMetricsF
-            The font metrics of the ion(s) for the given font
-
-        pos_left : QPointF
-            The coordination of the left line provided for the prefix ion(s)
-
-        """
-        qp.setPen(self._getPen(self.colors["blue"]))
-        prefix_ions = sorted(self.prefix[index])
-        blank_ion: int = 10
-
-        for ion in prefix_ions:
-            height_ion: float = metrics_ion.boundingRect(ion).height()
-            pos_ion = QPointF(pos_left.x(), pos_left.y() + blank_ion)
-            qp.drawText(pos_ion, ion)
-            blank_ion += height_ion
-
-    def _drawSuffixIon(self,
-                       qp: QPainter,
-                       index_reverse: int,
-                       metrics_ion: QFontMetricsF,
-                       pos_end: QPointF,
-                       pos_right: QPointF) -> None:
-        """
-        Draws existing suffix ion(s) and the right line at this position.
-
-        Parameters
-        ----------
-        qp : QPainter
-            The QPainter class provides functions required to paint within the
-            widget
-
-        index_reverse: int
-            The position of the suffix ion(s) within the peptide. The
-            positions are in reverse order compared to the prefix ion(s)
-
-        metrics_ion : QFontMetricsF
-            The font metrics of the ion(s) for the given font
-
-        pos_end : QPointF
-            The start position of the right line
-
-        pos_right : QPointF
-            The end position of the right line
-
-        """
-        qp.setPen(self._getPen(self.colors["red"]))
-        suffix_ions = sorted(self.suffix[index_reverse], reverse=True)
-        blank_ion: int = 5
-
-        for ion in suffix_ions:
-            height_ion: float = metrics_ion.boundingRect(ion).height()
-            pos_ion = QPointF(pos_end.x() + 2.5, pos_right.y() - blank_ion)
-            qp.drawText(pos_ion, ion)
-            blank_ion += height_ion
-
-    def _drawIonsLines(self,
-                       qp: QPainter,
-                       pos_start: QPointF,
-                       pos_end: QPointF,
-                       blankspace: int,
-                       iontype: str) -> QPointF:
-        """
-        Draw the middle line between each aa in the peptide.
-
-        Parameters
-        ----------
-        qp : QPainter
-            The QPainter class provides functions required to paint within the
-            widget
-
-        pos_start: QPointF
-            The start position of the line
-
-        pos_end : QPointF
-            The end position of the line
-
-        blankspace : int
-            The extra space of between each aa
-
-        iontype : str
-            The type differentiation between suffix or prefix (ions)
-
-
-        Returns
-        -------
-        QPointF
-            The end position of the left or right line depending on the ion
-            type
-
-        """
-
-        qp.setPen(self._getPen(self.colors["black"]))
-
-        if iontype == "prefix":
-            qp.drawLine(pos_start, pos_end)
-            pos_left = QPointF(pos_end.x() - 2 * blankspace, pos_end.y())
-            qp.drawLine(pos_end, pos_left)
-            return pos_left
-
-        if iontype == "suffix":
-            qp.drawLine(pos_start, pos_end)
-            pos_right = QPointF(pos_start.x() + 2 * blankspace, pos_start.y())
-            qp.drawLine(pos_start, pos_right)
-            return pos_right
+            blank += width + blankspace
+        return layout
 
     def getFont_Pep(self) -> QFont:
         """
@@ -491,10 +496,7 @@ class observed_peptide(QWidget):
             The font is Courier and of size 30
 
         """
-        font = QFont("Courier")
-        font.setStyleHint(QFont.TypeWriter)
-        font.setPixelSize(30)
-        return font
+        return self._font_pep
 
     def getFont_Ion(self) -> QFont:
         """
@@ -506,9 +508,12 @@ class observed_peptide(QWidget):
             The font is Courier and of size 10
 
         """
+        return self._font_ion
+
+    def _createFont(self, pixel_size: int) -> QFont:
         font = QFont("Courier")
         font.setStyleHint(QFont.TypeWriter)
-        font.setPixelSize(10)
+        font.setPixelSize(pixel_size)
         return font
 
     def _getPen(self, color: QColor) -> QPen:
@@ -531,7 +536,7 @@ class observed_peptide(QWidget):
         pen.setStyle(Qt.DashDotLine)
         return pen
 
-    def _getReverseIndex(self, i: int, dict_seq: dict) -> int:
+    def _getReverseIndex(self, i: int, length: int) -> int:
         """
         Calculates the reverse index for a given index.
 
@@ -540,8 +545,8 @@ class observed_peptide(QWidget):
         i : int
             A given index
 
-        dict_seq : dict
-            A dictionary that contains the given ion index
+        length : int
+            The length of the sequence
 
 
         Returns
@@ -552,5 +557,263 @@ class observed_peptide(QWidget):
         """
         i_rev: int = 0
         if i != 0:
-            i_rev = list(dict_seq.keys())[-i]
+            i_rev = length - i
         return i_rev
+
+
+class wrapped_sequence(QAbstractScrollArea):
+    """
+    Used for long sequences, e.g. proteoforms from top-down data.
+    The sequence is wrapped into rows of blocks of ten aa's and only the
+    rows inside the visible area are painted. Each row is recorded once
+    into a QPicture, so scrolling only replays the cached rows.
+    Instead of stacked ion labels, cleavage sites are marked with a
+    prefix (blue, below) or suffix (red, above) tick, the ions of a site
+    are shown in the tooltip of the following aa.
+
+    Attributes
+    ----------
+    sequence : str
+        The protein or proteoform sequence
+
+    suffix : dict
+        Containing all suffix ion information for the given sequence
+
+    prefix : dict
+        Containing all prefix ion information for the given sequence
+
+
+    Methods
+    -------
+    setSequence()
+        Sets the sequence
+
+    setSuffix()
+        Sets the suffix ions from the given sequence
+
+    setPrefix()
+        Sets the prefix ions from the given sequence
+
+    coverage()
+        Returns the number of cleavage sites with prefix, suffix and any
+        ions
+
+    """
+
+    BLOCK_SIZE: int = 10
+    BLANKSPACE: int = 4
+    TICK_HEIGHT: int = 8
+    ROW_SPACING: int = 6
+    MAX_CACHED_ROWS: int = 500
+
+    def __init__(self, *args):
+        QAbstractScrollArea.__init__(self, *args)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.viewport().setStyleSheet("background-color:white;")
+        self.sequence = ""
+        self.suffix = {}
+        self.prefix = {}
+        self.colors = {
+            "black": QColor(0, 0, 0),
+            "red": QColor(255, 0, 0),
+            "blue": QColor(0, 0, 255),
+            "grey": QColor(128, 128, 128),
+        }
+
+        self._font_pep = QFont("Courier")
+        self._font_pep.setStyleHint(QFont.TypeWriter)
+        self._font_pep.setPixelSize(16)
+        self._font_num = QFont("Courier")
+        self._font_num.setStyleHint(QFont.TypeWriter)
+        self._font_num.setPixelSize(10)
+        metrics_pep = QFontMetricsF(self._font_pep)
+        metrics_num = QFontMetricsF(self._font_num)
+
+        # monospace cell, whole blocks are drawn with one drawText call
+        self._char_width = metrics_pep.horizontalAdvance("W")
+        self._cell_width = self._char_width + self.BLANKSPACE
+        self._font_pep.setLetterSpacing(QFont.AbsoluteSpacing,
+                                        self.BLANKSPACE)
+        self._text_height = metrics_pep.height()
+        self._text_ascent = metrics_pep.ascent()
+        self._num_width = metrics_num.horizontalAdvance("00000") + 8
+        self._row_height = \
+            self._text_height + 2 * self.TICK_HEIGHT + self.ROW_SPACING
+
+        self._residues_per_row = self.BLOCK_SIZE
+        self._prefix_sites = np.zeros(0, dtype=bool)
+        self._suffix_sites = np.zeros(0, dtype=bool)
+        self._rowPictures: Dict[int, QPicture] = {}
+
+    def setSequence(self, seq: str) -> None:
+        self.sequence = seq
+        self._updateSites()
+
+    def setSuffix(self, lst: dict) -> None:
+        self.suffix = lst
+        self._updateSites()
+
+    def setPrefix(self, lst: dict) -> None:
+        self.prefix = lst
+        self._updateSites()
+
+    def coverage(self) -> Tuple[int, int, int, int]:
+        """
+        Counts the cleavage sites explained by the given ions.
+
+        Returns
+        -------
+        Tuple[int, int, int, int]
+            The number of cleavage sites with prefix ions, with suffix ions,
+            with any ion and the total number of cleavage sites
+
+        """
+        return (
+            int(self._prefix_sites[1:].sum()),
+            int(self._suffix_sites[1:].sum()),
+            int((self._prefix_sites | self._suffix_sites)[1:].sum()),
+            max(len(self.sequence) - 1, 0),
+        )
+
+    def _updateSites(self) -> None:
+        # site i lies between aa i - 1 and i, the prefix index of a site is
+        # i, the suffix (reverse) index is len - i
+        length = len(self.sequence)
+        sites = np.arange(length)
+        self._prefix_sites = np.isin(
+            sites, np.fromiter(self.prefix.keys(), dtype=np.int64))
+        self._suffix_sites = np.isin(
+            length - sites, np.fromiter(self.suffix.keys(), dtype=np.int64))
+        self._prefix_sites[:1] = False
+        self._suffix_sites[:1] = False
+        self._updateRows()
+
+    def _updateRows(self) -> None:
+        width = self.viewport().width() - self._num_width
+        block_width = self.BLOCK_SIZE * self._cell_width + self._cell_width
+        blocks = max(1, int((width + self._cell_width) // block_width))
+        self._residues_per_row = blocks * self.BLOCK_SIZE
+        self._rowPictures = {}
+
+        rows = -(-len(self.sequence) // self._residues_per_row)
+        self.verticalScrollBar().setRange(
+            0, max(0, int(rows * self._row_height -
+                          self.viewport().height())))
+        self.verticalScrollBar().setPageStep(self.viewport().height())
+        self.verticalScrollBar().setSingleStep(int(self._row_height))
+        self.viewport().update()
+
+    def resizeEvent(self, event) -> None:
+        QAbstractScrollArea.resizeEvent(self, event)
+        self._updateRows()
+
+    def _residueX(self, column: int) -> float:
+        # blocks of ten aa's are separated by one empty cell
+        return self._num_width + \
+            (column + column // self.BLOCK_SIZE) * self._cell_width
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        offset = self.verticalScrollBar().value()
+        first = int(offset // self._row_height)
+        last = int((offset + self.viewport().height()) // self._row_height)
+        rows = -(-len(self.sequence) // self._residues_per_row)
+
+        qp = QPainter(self.viewport())
+        qp.fillRect(event.rect(), QBrush(Qt.white))
+        if len(self._rowPictures) > self.MAX_CACHED_ROWS:
+            self._rowPictures = {}
+        for row in range(first, min(last + 1, rows)):
+            picture = self._rowPictures.get(row)
+            if picture is None:
+                picture = self._createRowPicture(row)
+                self._rowPictures[row] = picture
+            qp.drawPicture(
+                QPointF(0, row * self._row_height - offset), picture)
+        qp.end()
+
+    def _createRowPicture(self, row: int) -> QPicture:
+        """
+        Records one row of the sequence: the number of its first aa, the
+        blocks of aa's and the ticks of the explained cleavage sites.
+
+        Parameters
+        ----------
+        row : int
+            The index of the row
+
+        Returns
+        -------
+        QPicture
+            The recorded drawing commands of the row
+
+        """
+        start = row * self._residues_per_row
+        end = min(start + self._residues_per_row, len(self.sequence))
+        top = self.TICK_HEIGHT
+        bottom = top + self._text_height
+        baseline = top + self._text_ascent
+
+        picture = QPicture()
+        qp = QPainter(picture)
+        qp.setRenderHint(QPainter.Antialiasing)
+
+        qp.setFont(self._font_num)
+        qp.setPen(self.colors["grey"])
+        qp.drawText(QPointF(0, baseline), str(start + 1))
+
+        qp.setFont(self._font_pep)
+        qp.setPen(self.colors["black"])
+        for block in range(start, end, self.BLOCK_SIZE):
+            qp.drawText(
+                QPointF(self._residueX(block - start), baseline),
+                self.sequence[block:min(block + self.BLOCK_SIZE, end)],
+            )
+
+        for sites, color, y_start, y_end, direction in (
+                (self._prefix_sites, "blue", top, bottom + self.TICK_HEIGHT,
+                 -1),
+                (self._suffix_sites, "red", bottom, 0, 1),
+        ):
+            lines = []
+            for site in np.nonzero(sites[start:end])[0]:
+                x = self._residueX(int(site)) - self.BLANKSPACE / 2
+                lines.append(QLineF(x, y_start, x, y_end))
+                lines.append(QLineF(
+                    x, y_end, x + direction * self._cell_width / 2, y_end))
+            if lines:
+                qp.setPen(QPen(self.colors[color], 1.5, Qt.SolidLine))
+                qp.drawLines(lines)
+        qp.end()
+        return picture
+
+    def residueAt(self, pos: QPointF) -> int:
+        """
+        Returns the index of the aa at a viewport position or -1.
+
+        """
+        row = int((pos.y() + self.verticalScrollBar().value())
+                  // self._row_height)
+        cell = int((pos.x() - self._num_width) // self._cell_width)
+        if cell < 0 or (cell + 1) % (self.BLOCK_SIZE + 1) == 0:
+            return -1
+        column = cell - cell // (self.BLOCK_SIZE + 1)
+        if column >= self._residues_per_row:
+            return -1
+        index = row * self._residues_per_row + column
+        return index if index < len(self.sequence) else -1
+
+    def viewportEvent(self, event) -> bool:
+        if event.type() == QEvent.ToolTip:
+            index = self.residueAt(QPointF(event.pos()))
+            if index < 0:
+                QToolTip.hideText()
+                return True
+            ions = sorted(self.prefix.get(index, [])) if index > 0 else []
+            if index > 0:
+                ions += sorted(self.suffix.get(len(self.sequence) - index, []))
+            text = "%s%d" % (self.sequence[index], index + 1)
+            if ions:
+                text += "\n" + ", ".join(ions)
+            QToolTip.showText(event.globalPos(), text, self.viewport())
+            return True
+        return QAbstractScrollArea.viewportEvent(self, event)
@@ -2,9 +2,12 @@ import numpy as np
 import pyqtgraph as pg
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QMouseEvent
-from pyopenms.pyopenms_2 import MSSpectrum
 from pyqtgraph import PlotWidget
 from collections import namedtuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # pyopenms is only imported for type checking
+    from pyopenms.pyopenms_2 import MSSpectrum
 
 # structure for annotation (here for reference)
 PeakAnnoStruct = namedtuple(
@@ -74,7 +77,7 @@ class SpectrumWidget(PlotWidget):
         )
 
     def setSpectrum(self,
-                    spectrum: MSSpectrum,
+                    spectrum: "MSSpectrum",
                     zoomToFullRange: bool=False) -> None:
         """
         Used to set a new spectrum with the given mass-to-charge ratios and
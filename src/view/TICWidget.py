@@ -3,9 +3,11 @@ import pyqtgraph as pg
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QKeySequence, QMouseEvent
 from PyQt5.QtWidgets import QShortcut
-from pyopenms.pyopenms_3 import MSChromatogram
 from pyqtgraph import PlotWidget
-from typing import List
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:  # pyopenms is only imported for type checking
+    from pyopenms.pyopenms_3 import MSChromatogram
 
 
 pg.setConfigOption("background", "w")  # white background
@@ -73,7 +75,7 @@ class TICWidget(PlotWidget):
         if self._rts.size == 0:
             self._existTIC = False
 
-    def setTIC(self, chromatogram: MSChromatogram) -> None:
+    def setTIC(self, chromatogram: "MSChromatogram") -> None:
         """
         Used to set new TIC and with given Information (rts, ints)
 
@@ -4,20 +4,102 @@ mzTabTableWidget
 This script allows the user to transfer information about proteins and psms from a mzTab file into two tables, 
 one containing the proteins, the other one containing the psms.
 
-By clicking on a row, the tables get updated regarding their listed proteins or psms.
-Once you choose a protein/psm, the table displays only those psms/proteins that are linked to one another.
-
-This tool is designed to accept mzTab files. It is required to save those files under '.../examples/data/' or 
-change the path within the InitWindow.
+By clicking on a row, the tables get updated regarding their listed proteins
+or psms. Once you choose a protein/psm, the table displays only those
+psms/proteins that are linked to one another. Entries with several accessions
+are linked to all of them. Filters can be chained with the buttons above the
+tables, e.g. peptide -> proteins -> all psms of these proteins.
+
+This tool is designed to accept mzTab files. The file path is given as first
+command line argument, by default the example file
+'.../examples/data/iPRG2015.mzTab' is opened.
 """
 import sys
 import webbrowser
+
+import numpy as np
 from PyQt5 import QtGui
-from PyQt5.QtWidgets import QApplication, QWidget, QTableWidget, QVBoxLayout, QTableWidgetItem
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import (
+    QApplication,
+    QWidget,
+    QTableView,
+    QVBoxLayout,
+    QHBoxLayout,
+    QPushButton,
+    QAbstractItemView,
+)
+from MzTabReader import AccessionIndex, MzTabSection, readMzTab
+
+
+class MzTabTableModel(QAbstractTableModel):
+    """
+    Table model reading the cells directly from the columnar storage of an
+    mzTab section. A filter is a view on a subset of row indices, no cell
+    data is copied.
+
+    """
+
+    def __init__(self, section: MzTabSection, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self.section = section
+        self.rows = None  # None shows all rows
+
+    def setSection(self, section: MzTabSection) -> None:
+        self.beginResetModel()
+        self.section = section
+        self.rows = None
+        self.endResetModel()
+
+    def setRows(self, rows) -> None:
+        """sets the shown section rows (array of row indices), None shows
+        all rows"""
+        self.beginResetModel()
+        self.rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self.endResetModel()
+
+    def isFiltered(self) -> bool:
+        return self.rows is not None
+
+    def sectionRow(self, row: int) -> int:
+        """maps a table row to the row of the section"""
+        if self.rows is None:
+            return row
+        return int(self.rows[row])
+
+    def value(self, row: int, column: int) -> str:
+        return self.section.value(self.sectionRow(row), column)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.section) if self.rows is None else self.rows.size
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.section.columnCount()
+
+    def headerData(self, col, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.section.header[col]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self.value(index.row(), index.column())
+        return None
 
 
 class Window(QWidget):
-    def __init__(self):
+    def __init__(self, file_path):
         super().__init__()
 
         self.title = "mzTabTableWidget"
@@ -26,24 +108,25 @@ class Window(QWidget):
         self.width = 500
         self.height = 500
         self.tableRows = 5
+        self.filePath = file_path
 
-        self.PRTFull = []
-        self.PSMFull = []
+        empty = MzTabSection([], [], [], [])
+        self.PRTFull = empty
+        self.PSMFull = empty
+        self.PRTIndex = AccessionIndex(empty)
+        self.PSMIndex = AccessionIndex(empty)
 
-        self.PRTFiltered = []
-        self.PSMFiltered = []
-
-        self.PRTColumn = [True]
-        self.PSMColumn = [True]
+        self.PRTColumn = []
+        self.PSMColumn = []
 
         self.selectedPRT = ""
         self.selectedPSM = ""
 
-        self.tablePRTFull = QTableWidget()
-        self.tablePSMFull = QTableWidget()
+        self.modelPRT = MzTabTableModel(empty, self)
+        self.modelPSM = MzTabTableModel(empty, self)
 
-        self.tablePRTFiltered = QTableWidget()
-        self.tablePSMFiltered = QTableWidget()
+        self.tablePRT = QTableView()
+        self.tablePSM = QTableView()
 
         self.vBoxPRT = QVBoxLayout()
         self.vBoxPSM = QVBoxLayout()
@@ -57,36 +140,23 @@ class Window(QWidget):
         self.setWindowTitle(self.title)
         self.setGeometry(self.top, self.left, self.width, self.height)
 
-        self.parser('/home/fabian/Downloads/test1.mzTab')
-
-        self.PRTColumn *= len(self.PRTFull[1])
-        self.PSMColumn *= len(self.PSMFull[1])
+        self.parser(self.filePath)
 
         self.initTables()
-        self.createTable(self.tablePRTFull, self.PRTFull)
-        self.createTable(self.tablePSMFull, self.PSMFull)
-        self.tablePRTFiltered.setHidden(True)
-        self.tablePSMFiltered.setHidden(True)
 
         self.hidePRTColumns()
         self.hidePSMColumns()
 
-        self.tablePRTFull.itemClicked.connect(self.PRTClicked)
-        self.tablePRTFiltered.itemClicked.connect(self.PRTClicked)
-        self.tablePSMFull.itemClicked.connect(self.PSMClicked)
-        self.tablePSMFiltered.itemClicked.connect(self.PSMClicked)
+        self.tablePRT.clicked.connect(self.PRTClicked)
+        self.tablePSM.clicked.connect(self.PSMClicked)
 
-        self.tablePRTFull.itemDoubleClicked.connect(self.browsePRT)
-        self.tablePRTFiltered.itemDoubleClicked.connect(self.browsePRT)
-        self.tablePSMFull.itemDoubleClicked.connect(self.browsePSM)
-        self.tablePSMFiltered.itemDoubleClicked.connect(self.browsePSM)
+        self.tablePRT.doubleClicked.connect(self.browsePRT)
+        self.tablePSM.doubleClicked.connect(self.browsePSM)
 
-        self.vBoxPRT.addWidget(self.tablePRTFull)
-        self.vBoxPRT.addWidget(self.tablePRTFiltered)
-
-        self.vBoxPSM.addWidget(self.tablePSMFull)
-        self.vBoxPSM.addWidget(self.tablePSMFiltered)
+        self.vBoxPRT.addWidget(self.tablePRT)
+        self.vBoxPSM.addWidget(self.tablePSM)
 
+        self.outerVBox.addLayout(self.initFilterButtons())
         self.outerVBox.addLayout(self.vBoxPRT)
         self.outerVBox.addLayout(self.vBoxPSM)
 
@@ -95,186 +165,141 @@ class Window(QWidget):
 
     def parser(self, file):
         """parses the given mzTab file and saves PRT and PSM information
+        as typed columnar sections, rows are only built when accessed
         Parameters
         ----------
         file : str
             The file path of the mzTab file
         """
-
-        with open(file) as inp:
-            for line in inp:
-                if line.startswith("PRH"):
-                    self.PRTFull.append(line.strip().split('\t'))
-                elif line.startswith("PRT") and not line.endswith("protein_details\n"):
-                    self.PRTFull.append(line.strip().split('\t'))
-                elif line.startswith("PSH") or line.startswith("PSM"):
-                    self.PSMFull.append(line.strip().split('\t'))
-
-        for item in self.PRTFull:
-            item.pop(0)
-
-        for item in self.PSMFull:
-            item.pop(0)
-
-
+        sections = readMzTab(file)
+        self.PRTFull = sections.get("PRT", self.PRTFull)
+        self.PSMFull = sections.get("PSM", self.PSMFull)
+
+        # accession <-> row links used by all filters
+        self.PRTIndex = AccessionIndex(self.PRTFull)
+        self.PSMIndex = AccessionIndex(self.PSMFull)
+
+    def initFilterButtons(self):
+        """buttons for chaining and resetting the filters"""
+        hBox = QHBoxLayout()
+        for text, slot in (
+                ("PSMs of listed proteins", self.chainPSM),
+                ("Proteins of listed PSMs", self.chainPRT),
+                ("Reset filters", self.resetFilters),
+        ):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            hBox.addWidget(button)
+        return hBox
 
     def initTables(self):
-        """draws protein and psm tables with headers"""
-
-        self.tablePRTFull.setRowCount(len(self.PRTFull))
-        self.tablePRTFull.setColumnCount(len(self.PRTFull[0]))
-        self.tablePRTFull.setHorizontalHeaderLabels(self.PRTFull[0])
-
-        self.tablePSMFull.setRowCount(len(self.PSMFull))
-        self.tablePSMFull.setColumnCount(len(self.PSMFull[0]))
-        self.tablePSMFull.setHorizontalHeaderLabels(self.PSMFull[0])
-
-        self.tablePRTFiltered.setRowCount(0)
-        self.tablePRTFiltered.setColumnCount(len(self.PRTFull[0]))
-        self.tablePRTFiltered.setHorizontalHeaderLabels(self.PRTFull[0])
-
-        self.tablePSMFiltered.setRowCount(0)
-        self.tablePSMFiltered.setColumnCount(len(self.PSMFull[0]))
-        self.tablePSMFiltered.setHorizontalHeaderLabels(self.PSMFull[0])
-
-        """removes now unnecessary header information from content lists """
-        self.PRTFull.pop(0)
-        self.PSMFull.pop(0)
-
-    def createTable(self, table, content):
-        """parameters: tableWidget to draw content in. Content to be drawn in list form"""
-        """Setting count to zero empties the table. Then table is (re-)filled with specified content"""
-        table.setRowCount(0)
-        table.setRowCount(len(content))
-
-        j = 0
-        k = 0
-
-        for item in content[0:]:
-            while k < (len(content)):
-                while j < (len(item)):
-                    table.setItem(k, j, QTableWidgetItem(item[j]))
-                    j += 1
-                else:
-                    k += 1
-                    j = 0
-                break
+        """sets the protein and psm sections as models of the tables"""
+        for table, model, section in (
+                (self.tablePRT, self.modelPRT, self.PRTFull),
+                (self.tablePSM, self.modelPSM, self.PSMFull),
+        ):
+            model.setSection(section)
+            table.setModel(model)
+            table.setSelectionBehavior(QAbstractItemView.SelectRows)
+            # rows have a fixed height, the view does not measure each row
+            table.verticalHeader().setDefaultSectionSize(
+                table.verticalHeader().minimumSectionSize())
 
     def hidePRTColumns(self):
         """hides constant columns in PRT table by default by checking if every value equals"""
-        i = 0
-        j = 0
-        k = 0
-
-        while i < len(self.PRTFull) - 1:
-            while j < len(self.PRTFull[i]):
-                if self.PRTColumn[j]:
-                    if self.PRTFull[i][j] != self.PRTFull[i + 1][j]:
-                        self.PRTColumn[j] = False
-                j += 1
-            i += 1
-
-        while k < len(self.PRTColumn):
-            if self.PRTColumn[k]:
-                self.tablePRTFull.setColumnHidden(k, True)
-                self.tablePRTFiltered.setColumnHidden(k, True)
-            k += 1
+        self.PRTColumn = self.constantColumns(self.PRTFull)
+        for k, hide in enumerate(self.PRTColumn):
+            self.tablePRT.setColumnHidden(k, hide)
 
     def hidePSMColumns(self):
         """hides constant columns in PSM table by default by checking if every value equals"""
-        i = 0
-        j = 0
-        k = 0
-
-        while i < len(self.PSMFull) - 1:
-            while j < len(self.PSMFull[i]):
-                if self.PSMColumn[j]:
-                    if self.PSMFull[i][j] != self.PSMFull[i + 1][j]:
-                        self.PSMColumn[j] = False
-                j += 1
-            i += 1
-
-        while k < len(self.PSMColumn):
-            if self.PSMColumn[k]:
-                self.tablePSMFull.setColumnHidden(k, True)
-                self.tablePSMFiltered.setColumnHidden(k, True)
-            k += 1
-
-    def PRTClicked(self, item):
-
-        if self.tablePRTFull.isHidden():
-            relevantContent = self.PRTFiltered
-        else:
-            relevantContent = self.PRTFull
+        self.PSMColumn = self.constantColumns(self.PSMFull)
+        for k, hide in enumerate(self.PSMColumn):
+            self.tablePSM.setColumnHidden(k, hide)
+
+    def constantColumns(self, section):
+        """
+        a single row is shown completely, as every column would be constant
+        """
+        if len(section) < 2:
+            return [False] * section.columnCount()
+        return list(section.constantColumns())
 
-        accession = relevantContent[item.row()][0]
+    def PRTClicked(self, index):
+        row = self.modelPRT.sectionRow(index.row())
+        accession = self.PRTFull.value(
+            row, self.PRTFull.columnIndex("accession"))
 
         if self.selectedPSM == accession:
             self.unfilterPSM()
         else:
-            self.filterPSM(accession)
+            self.selectedPSM = accession
+            self.filterPSM(self.PRTIndex.accessions([row]))
 
-    def PSMClicked(self, item):
-
-        if self.tablePSMFull.isHidden():
-            relevantContent = self.PSMFiltered
-        else:
-            relevantContent = self.PSMFull
-
-        accession = relevantContent[item.row()][2]
+    def PSMClicked(self, index):
+        row = self.modelPSM.sectionRow(index.row())
+        accession = self.PSMFull.value(
+            row, self.PSMFull.columnIndex("accession"))
 
         if self.selectedPRT == accession:
             self.unfilterPRT()
         else:
-            self.filterPRT(accession)
+            self.selectedPRT = accession
+            self.filterPRT(self.PSMIndex.accessions([row]))
 
-    def filterPRT(self, accession):
-        self.tablePRTFiltered.setHidden(False)
-        self.tablePRTFull.setHidden(True)
+    def filterPRT(self, accessions):
+        """shows the proteins linked to any of the accessions"""
+        self.modelPRT.setRows(self.PRTIndex.rowsForAccessions(accessions))
 
-        self.selectedPRT = accession
+    def filterPSM(self, accessions):
+        """shows the psms linked to any of the accessions"""
+        self.modelPSM.setRows(self.PSMIndex.rowsForAccessions(accessions))
 
-        self.PRTFiltered = [p for p in self.PRTFull if p[0] == self.selectedPRT]
-        self.createTable(self.tablePRTFiltered, self.PRTFiltered)
+    def shownRows(self, model):
+        if model.isFiltered():
+            return model.rows
+        return np.arange(model.rowCount())
 
-    def filterPSM(self, accession):
-        self.tablePSMFiltered.setHidden(False)
-        self.tablePSMFull.setHidden(True)
+    def chainPSM(self):
+        """shows all psms of the currently listed proteins"""
+        self.selectedPSM = ""
+        self.filterPSM(self.PRTIndex.accessions(self.shownRows(self.modelPRT)))
 
-        self.selectedPSM = accession
+    def chainPRT(self):
+        """shows all proteins of the currently listed psms"""
+        self.selectedPRT = ""
+        self.filterPRT(self.PSMIndex.accessions(self.shownRows(self.modelPSM)))
 
-        self.PSMFiltered = [p for p in self.PSMFull if p[2] == self.selectedPSM]
-        self.createTable(self.tablePSMFiltered, self.PSMFiltered)
+    def resetFilters(self):
+        self.unfilterPRT()
+        self.unfilterPSM()
 
     def unfilterPRT(self):
-        self.tablePRTFiltered.setHidden(True)
-        self.tablePRTFull.setHidden(False)
         self.selectedPRT = ""
-        self.PRTFiltered = []
+        self.modelPRT.setRows(None)
 
     def unfilterPSM(self):
-        self.tablePSMFiltered.setHidden(True)
-        self.tablePSMFull.setHidden(False)
         self.selectedPSM = ""
-        self.PSMFiltered = []
-
-    def browsePRT(self, item):
-        if self.tablePRTFull.isHidden():
-            accession = self.PRTFiltered[item.row()][0].split("|", 2)[1]
-        else:
-            accession = self.PRTFull[item.row()][0].split("|", 2)[1]
-
-        webbrowser.open("https://www.uniprot.org/uniprot/" + accession)
-
-    def browsePSM(self, item):
-        if self.tablePSMFull.isHidden():
-            accession = self.PSMFiltered[item.row()][2].split("|", 2)[1]
-        else:
-            accession = self.PSMFull[item.row()][2].split("|", 2)[1]
-
-        webbrowser.open("https://www.uniprot.org/uniprot/" + accession)
-
-
-App = QApplication(sys.argv)
-window = Window()
-sys.exit(App.exec())
+        self.modelPSM.setRows(None)
+
+    def browsePRT(self, index):
+        accession = self.modelPRT.value(
+            index.row(), self.PRTFull.columnIndex("accession"))
+        webbrowser.open(
+            "https://www.uniprot.org/uniprot/" + accession.split("|", 2)[1])
+
+    def browsePSM(self, index):
+        accession = self.modelPSM.value(
+            index.row(), self.PSMFull.columnIndex("accession"))
+        webbrowser.open(
+            "https://www.uniprot.org/uniprot/" + accession.split("|", 2)[1])
+
+
+if __name__ == "__main__":
+    App = QApplication(sys.argv)
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = "../examples/data/iPRG2015.mzTab"
+    window = Window(path)
+    sys.exit(App.exec())